@@ -0,0 +1,83 @@
+from dataclasses import dataclass
+from typing import Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from detections import DetectionSet
+from metrics import NULL_TIMINGS
+
+# format -> (file extension, media type, OpenCV quality flag)
+ANNOTATED_FORMATS = {
+    "jpeg": (".jpg", "image/jpeg", cv2.IMWRITE_JPEG_QUALITY),
+    "webp": (".webp", "image/webp", cv2.IMWRITE_WEBP_QUALITY),
+}
+
+# BGR colours cycled by class id, chosen to stay distinct on dark station interiors
+_PALETTE = (
+    (56, 56, 255), (151, 157, 255), (31, 112, 255), (29, 178, 255), (49, 210, 207),
+    (10, 249, 72), (23, 204, 146), (134, 219, 61), (211, 188, 0), (255, 115, 100),
+    (255, 56, 132), (133, 0, 82), (255, 56, 203), (200, 149, 255), (199, 55, 255),
+)
+
+
+@dataclass(frozen=True)
+class AnnotateOptions:
+    """Output encoding for a rendered overlay; max_dim bounds the longer side"""
+
+    format: str = "jpeg"
+    quality: int = 85
+    max_dim: int = 1280
+
+    @property
+    def media_type(self) -> str:
+        return ANNOTATED_FORMATS[self.format][1]
+
+    def cache_tag(self) -> str:
+        return f"{self.format}-q{self.quality}-d{self.max_dim}"
+
+    def output_size(self, width: int, height: int) -> Tuple[int, int]:
+        scale = min(1.0, self.max_dim / max(width, height))
+        return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def render_annotated(image: np.ndarray, detections: DetectionSet, original_size: Tuple[int, int],
+                     class_names: Sequence[str], options: AnnotateOptions, timings=NULL_TIMINGS) -> bytes:
+    """
+    Draw boxes and labels on a decoded frame and encode it.
+
+    `image` may have been decoded at reduced scale and `detections` are in
+    original image pixels; the overlay is drawn once, at the output size.
+    """
+    width, height = original_size
+    out_w, out_h = options.output_size(width, height)
+    with timings.stage("render"):
+        if image.shape[1] != out_w or image.shape[0] != out_h:
+            interpolation = cv2.INTER_AREA if image.shape[1] > out_w else cv2.INTER_LINEAR
+            image = cv2.resize(image, (out_w, out_h), interpolation=interpolation)
+        else:
+            image = image.copy()
+
+        scale = np.array([out_w / width, out_h / height, out_w / width, out_h / height], dtype=np.float32)
+        boxes = np.rint(detections.boxes * scale).astype(np.int32)
+        thickness = max(1, round(max(out_w, out_h) / 640))
+        font_scale = 0.4 * thickness
+        for (x1, y1, x2, y2), score, class_id in zip(boxes.tolist(), detections.scores.tolist(),
+                                                      detections.class_ids.tolist()):
+            color = _PALETTE[class_id % len(_PALETTE)]
+            cv2.rectangle(image, (x1, y1), (x2, y2), color, thickness, cv2.LINE_AA)
+            name = class_names[class_id] if 0 <= class_id < len(class_names) else str(class_id)
+            label = f"{name} {score:.2f}"
+            (text_w, text_h), baseline = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)
+            # Label sits above the box, or inside it when the box touches the top edge
+            top = y1 - text_h - baseline if y1 - text_h - baseline >= 0 else y1
+            cv2.rectangle(image, (x1, top), (x1 + text_w, top + text_h + baseline), color, cv2.FILLED)
+            cv2.putText(image, label, (x1, top + text_h), cv2.FONT_HERSHEY_SIMPLEX, font_scale, (255, 255, 255),
+                        thickness, cv2.LINE_AA)
+
+    extension, _, quality_flag = ANNOTATED_FORMATS[options.format]
+    with timings.stage("encode"):
+        ok, encoded = cv2.imencode(extension, image, [quality_flag, options.quality])
+    if not ok:
+        raise ValueError(f"Could not encode annotated image as {options.format}")
+    return encoded.tobytes()
@@ -0,0 +1,204 @@
+import asyncio
+import logging
+import time
+from collections import Counter, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from detections import DetectionSet, PostprocessOptions
+from detector import Detector
+from metrics import NULL_TIMINGS
+from worker_pool import DeadlineExceededError, WorkerPool
+
+logger = logging.getLogger(__name__)
+
+
+def detect_and_postprocess(detector: Detector, images: List[np.ndarray], options: List[PostprocessOptions]
+                           ) -> Tuple[List[DetectionSet], float, List[float]]:
+    """
+    Run one batch through the detector and filter each result with its own
+    options. Also returns the batch inference time and per-image
+    postprocessing times in seconds.
+    """
+    started = time.perf_counter()
+    raw = detector.detect_batch(images)
+    inference = time.perf_counter() - started
+
+    results, postprocess = [], []
+    for candidates, opts in zip(raw, options):
+        started = time.perf_counter()
+        results.append(candidates.postprocess(opts))
+        postprocess.append(time.perf_counter() - started)
+    return results, inference, postprocess
+
+
+class BatchScheduler:
+    """
+    Dynamic micro-batching in front of a Detector.
+
+    Concurrent detect() calls are gathered into batches of up to
+    max_batch_size images. A batch is dispatched as soon as it is full or
+    max_wait_ms after its first image arrived, whichever comes first, and each
+    caller gets back its own slice of the batch result, postprocessed with its
+    own PostprocessOptions on the same worker. Images whose deadline passes
+    while they wait for a batch are dropped with DeadlineExceededError.
+    """
+
+    def __init__(
+        self,
+        detector: Detector,
+        pool: WorkerPool,
+        max_batch_size: int = 8,
+        max_wait_ms: float = 5.0,
+        max_concurrent_batches: Optional[int] = None,
+    ):
+        self.detector = detector
+        self.pool = pool
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.max_concurrent_batches = max_concurrent_batches or pool.max_workers
+        self._queue: Deque[Tuple[np.ndarray, PostprocessOptions, asyncio.Future, float, Optional[float]]] = deque()
+        self._arrived: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._task: Optional[asyncio.Task] = None
+        self._inflight: set = set()
+        self._batches = 0
+        self._images = 0
+        self._batch_sizes: Counter = Counter()
+        self._expired = 0
+        # Moving average of batch inference time, for queue wait estimates
+        self._batch_seconds = 0.0
+
+    async def start(self):
+        if self._task is not None:
+            return
+        self._arrived = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+        self._task = asyncio.create_task(self._collect_loop())
+        logger.info(f"Batch scheduler started (max_batch_size={self.max_batch_size}, "
+                    f"max_wait_ms={self.max_wait * 1000:g})")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+        # Fail anything that never made it into a batch
+        while self._queue:
+            _, _, future, _, _ = self._queue.popleft()
+            if not future.done():
+                future.set_exception(RuntimeError("Batch scheduler stopped"))
+
+    async def detect(self, image: np.ndarray, options: PostprocessOptions = PostprocessOptions(),
+                     timings=NULL_TIMINGS, deadline: Optional[float] = None) -> DetectionSet:
+        """
+        Queue one image for the next batch and wait for its detections.
+        deadline is a time.time() value after which the image is not run.
+        """
+        if self._task is None:
+            await self.start()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.append((image, options, future, loop.time(), deadline))
+        self._arrived.set()
+        detections, inference, postprocess = await future
+        timings.record("inference", inference)
+        timings.record("postprocess", postprocess)
+        return detections
+
+    async def _collect_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Hold a dispatch slot before collecting, so requests keep
+            # accumulating into the next batch while every worker is busy
+            await self._slots.acquire()
+            try:
+                while not self._queue:
+                    self._arrived.clear()
+                    await self._arrived.wait()
+                # The wait budget starts when the oldest image arrived
+                deadline = self._queue[0][3] + self.max_wait
+                while len(self._queue) < self.max_batch_size:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    self._arrived.clear()
+                    try:
+                        await asyncio.wait_for(self._arrived.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                batch = [self._queue.popleft() for _ in range(min(len(self._queue), self.max_batch_size))]
+            except BaseException:
+                self._slots.release()
+                raise
+
+            task = asyncio.create_task(self._run_batch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _run_batch(self, batch: List[Tuple[np.ndarray, PostprocessOptions, asyncio.Future, float,
+                                                 Optional[float]]]):
+        try:
+            # Skip callers that gave up or ran out of time while queued
+            now = time.time()
+            live = []
+            for item in batch:
+                future, deadline = item[2], item[4]
+                if future.done():
+                    continue
+                if deadline is not None and now > deadline:
+                    self._expired += 1
+                    future.set_exception(DeadlineExceededError("Deadline passed while waiting for a batch"))
+                    continue
+                live.append(item)
+            batch = live
+            if not batch:
+                return
+            images = [image for image, _, _, _, _ in batch]
+            options = [opts for _, opts, _, _, _ in batch]
+            # The batch is only worth running while some image in it still has time
+            deadlines = [deadline for _, _, _, _, deadline in batch]
+            deadline = None if None in deadlines else max(deadlines)
+            try:
+                results, inference, postprocess = await self.pool.run(
+                    detect_and_postprocess, self.detector, images, options, deadline=deadline
+                )
+            except Exception as e:
+                for _, _, future, _, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+            self._batches += 1
+            self._images += len(batch)
+            self._batch_sizes[len(batch)] += 1
+            self._batch_seconds += 0.2 * (inference - self._batch_seconds)
+            for (_, _, future, _, _), detections, post in zip(batch, results, postprocess):
+                if not future.done():
+                    future.set_result((detections, inference, post))
+        finally:
+            self._slots.release()
+
+    def estimated_wait(self) -> float:
+        """Seconds an image queued now would likely wait before its batch runs"""
+        batches_ahead = len(self._queue) // self.max_batch_size
+        return self.max_wait + batches_ahead / self.max_concurrent_batches * self._batch_seconds
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "queued": len(self._queue),
+            "expired": self._expired,
+            "batches": self._batches,
+            "images": self._images,
+            "avg_batch_size": round(self._images / self._batches, 3) if self._batches else 0.0,
+            "batch_sizes": {str(size): count for size, count in sorted(self._batch_sizes.items())},
+        }
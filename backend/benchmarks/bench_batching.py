@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Micro-batching benchmark: throughput vs p99 latency for different
+max batch size / max wait settings, using MockDetector with a simulated
+per-batch and per-image inference cost.
+
+    python backend/benchmarks/bench_batching.py --clients 32 --requests 2000
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from batching import BatchScheduler  # noqa: E402
+from detector import MockDetector  # noqa: E402
+from worker_pool import WorkerPool  # noqa: E402
+
+
+async def run_case(max_batch: int, max_wait_ms: float, args) -> dict:
+    pool = WorkerPool(max_workers=args.workers, max_queue=args.clients * 2)
+    detector = MockDetector(batch_cost_ms=args.batch_cost_ms, image_cost_ms=args.image_cost_ms)
+    scheduler = BatchScheduler(detector, pool, max_batch_size=max_batch, max_wait_ms=max_wait_ms)
+    await scheduler.start()
+
+    image = np.zeros((480, 640, 3), dtype=np.uint8)
+    latencies = []
+    remaining = args.requests
+
+    async def client():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            await scheduler.detect(image)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(args.clients)))
+    elapsed = time.perf_counter() - started
+
+    stats = scheduler.stats()
+    await scheduler.stop()
+    pool.shutdown()
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "max_batch": max_batch,
+        "max_wait_ms": max_wait_ms,
+        "throughput": len(latencies) / elapsed,
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+        "avg_batch": stats["avg_batch_size"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=32, help="concurrent closed-loop clients")
+    parser.add_argument("--requests", type=int, default=1000, help="requests per case")
+    parser.add_argument("--workers", type=int, default=2, help="worker pool size")
+    parser.add_argument("--batch-cost-ms", type=float, default=20.0, help="simulated fixed cost per batch")
+    parser.add_argument("--image-cost-ms", type=float, default=2.0, help="simulated marginal cost per image")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--waits-ms", type=float, nargs="+", default=[0, 2, 5, 10])
+    args = parser.parse_args()
+
+    print(f"clients={args.clients} workers={args.workers} "
+          f"batch_cost={args.batch_cost_ms}ms image_cost={args.image_cost_ms}ms")
+    print(f"{'batch':>6} {'wait_ms':>8} {'req/s':>9} {'p50_ms':>9} {'p99_ms':>9} {'avg_batch':>10}")
+    for max_batch in args.batch_sizes:
+        for max_wait_ms in args.waits_ms:
+            result = asyncio.run(run_case(max_batch, max_wait_ms, args))
+            print(f"{result['max_batch']:>6} {result['max_wait_ms']:>8g} {result['throughput']:>9.1f} "
+                  f"{result['p50_ms']:>9.2f} {result['p99_ms']:>9.2f} {result['avg_batch']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Ingestion benchmark for /api/detect: the same frame sent as a multipart
+JPEG, as raw BGR pixels (application/octet-stream with X-Image-Shape) and
+as base64 JPEG in a JSON body. Each case reports the client-side payload
+size, mean and p95 request latency through the in-process app, and the
+server-side decode/preprocess time taken from Server-Timing.
+
+The result cache is disabled so every request does the full work; the mock
+detector keeps inference cost out of the comparison.
+
+    python backend/benchmarks/bench_ingest.py --sizes 640x480 1920x1080 3840x2160
+"""
+
+import argparse
+import asyncio
+import base64
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import cv2
+import httpx
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("CACHE_MAX_ENTRIES", "0")
+
+import server  # noqa: E402 - configuration is read from the environment at import
+
+
+def make_frame(width: int, height: int) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    small = rng.integers(0, 255, (height // 8 + 1, width // 8 + 1, 3), dtype=np.uint8)
+    return cv2.resize(small, (width, height), interpolation=cv2.INTER_LINEAR)
+
+
+def build_requests(frame: np.ndarray, quality: int) -> Dict[str, dict]:
+    jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes()
+    height, width = frame.shape[:2]
+    return {
+        "multipart_jpeg": {"files": {"image": ("frame.jpg", jpeg, "image/jpeg")}},
+        "raw_bgr": {"content": frame.tobytes(),
+                    "headers": {"Content-Type": "application/octet-stream",
+                                "X-Image-Shape": f"{height},{width},3"}},
+        "base64_json": {"json": {"image": base64.b64encode(jpeg).decode()}},
+    }
+
+
+def payload_bytes(client: httpx.AsyncClient, kwargs: dict) -> int:
+    return len(client.build_request("POST", "/detect", **kwargs).read())
+
+
+def server_stages(header: str) -> float:
+    """Milliseconds spent in decode and preprocess, from a Server-Timing header"""
+    total = 0.0
+    for entry in header.split(","):
+        name, _, duration = entry.strip().partition(";dur=")
+        if name in ("decode", "preprocess"):
+            total += float(duration)
+    return total
+
+
+async def run_case(client: httpx.AsyncClient, kwargs: dict, repeats: int) -> Tuple[List[float], List[float]]:
+    latencies, stages = [], []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        response = await client.post("/detect", **kwargs)
+        latencies.append((time.perf_counter() - started) * 1000)
+        response.raise_for_status()
+        stages.append(server_stages(response.headers.get("server-timing", "")))
+    return latencies, stages
+
+
+async def main_async(args):
+    await server.app.router.startup()
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app),
+                                     base_url="http://bench/api") as client:
+            print(f"{'size':>10} {'path':>15} {'payload_kb':>11} {'mean_ms':>8} {'p95_ms':>8} {'decode_ms':>10}")
+            for size in args.sizes:
+                width, height = (int(v) for v in size.lower().split("x"))
+                for name, kwargs in build_requests(make_frame(width, height), args.quality).items():
+                    await run_case(client, kwargs, args.warmup)
+                    latencies, stages = await run_case(client, kwargs, args.repeats)
+                    p95 = sorted(latencies)[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+                    print(f"{size:>10} {name:>15} {payload_bytes(client, kwargs) / 1024:>11.1f} "
+                          f"{statistics.mean(latencies):>8.2f} {p95:>8.2f} {statistics.mean(stages):>10.2f}")
+    finally:
+        await server.app.router.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", default=["640x480", "1920x1080"], help="frame WIDTHxHEIGHT")
+    parser.add_argument("--quality", type=int, default=90, help="JPEG quality for the encoded paths")
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Motion-gating benchmark: a synthetic near-static camera feed (a fixed
+scene with a small object crossing it now and then, plus sensor noise)
+sent to /api/detect as JPEG frames, with and without a `session`. Reports
+mean and p95 latency, the skip/partial/full split and the session's
+estimated time saved.
+
+The mock detector is given a simulated per-image inference cost, so the
+comparison reflects a model whose inference dominates the frame budget.
+
+    python backend/benchmarks/bench_motion.py --frames 300 --inference-ms 40
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import cv2
+import httpx
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("CACHE_MAX_ENTRIES", "0")
+
+import server  # noqa: E402 - configuration is read from the environment at import
+
+
+def make_feed(width: int, height: int, frames: int, moving_every: int, quality: int) -> List[bytes]:
+    """Encoded frames of a static scene; every `moving_every` frames an object crosses for a few frames"""
+    rng = np.random.default_rng(0)
+    scene = cv2.resize(rng.integers(0, 255, (height // 16, width // 16, 3), dtype=np.uint8), (width, height))
+    feed = []
+    for index in range(frames):
+        frame = scene.copy()
+        phase = index % moving_every
+        if moving_every and phase < 10:
+            x = int(width * 0.1 + phase * width * 0.02)
+            cv2.rectangle(frame, (x, height // 3), (x + width // 12, height // 3 + height // 8), (240, 240, 240), -1)
+        noise = rng.integers(-3, 4, frame.shape, dtype=np.int16)
+        frame = np.clip(frame.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+        feed.append(cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes())
+    return feed
+
+
+async def run_feed(client: httpx.AsyncClient, feed: List[bytes], session: Optional[str] = None) -> List[float]:
+    params = {"session": session} if session else {}
+    latencies = []
+    for data in feed:
+        started = time.perf_counter()
+        response = await client.post("/detect", params=params, files={"image": ("frame.jpg", data, "image/jpeg")})
+        latencies.append((time.perf_counter() - started) * 1000)
+        response.raise_for_status()
+    return latencies
+
+
+def report(name: str, latencies: List[float]):
+    p95 = sorted(latencies)[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+    print(f"{name:>10} mean {statistics.mean(latencies):8.2f} ms   p95 {p95:8.2f} ms")
+
+
+async def main_async(args):
+    await server.app.router.startup()
+    await server.model_registry.wait_started()
+    server.model_registry.default.detector.image_cost_ms = args.inference_ms
+    try:
+        width, height = (int(v) for v in args.size.lower().split("x"))
+        feed = make_feed(width, height, args.frames, args.moving_every, args.quality)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app),
+                                     base_url="http://bench/api") as client:
+            report("ungated", await run_feed(client, feed))
+            report("session", await run_feed(client, feed, session="bench"))
+            stats = (await client.get("/sessions/bench")).json()
+        print(f"full {stats['full']}  partial {stats['partial']}  skip {stats['skip']}  "
+              f"skip_ratio {stats['skip_ratio']:.3f}  estimated_saved {stats['estimated_saved_s']:.2f} s")
+    finally:
+        await server.app.router.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", default="1280x720", help="frame WIDTHxHEIGHT")
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--moving-every", type=int, default=50, help="frames between object crossings")
+    parser.add_argument("--inference-ms", type=float, default=30.0, help="simulated per-image inference cost")
+    parser.add_argument("--quality", type=int, default=85)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Postprocessing microbenchmark: vectorized DetectionSet threshold + per-class
+NMS + top-k against building one Pydantic Detection per candidate, for
+1k to 25k candidate boxes.
+
+    python backend/benchmarks/bench_nms.py --candidates 1000 5000 10000 25000
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from detections import DetectionSet, PostprocessOptions  # noqa: E402
+from schemas import Detection  # noqa: E402
+
+CLASS_NAMES = ["fire_extinguisher", "oxygen_tank", "toolkit"]
+
+
+def make_candidates(n: int, num_objects: int = 40, size: int = 640, seed: int = 0) -> DetectionSet:
+    """YOLO-head-like candidates: jittered clusters around a few true objects"""
+    rng = np.random.default_rng(seed)
+    centers = rng.uniform(40, size - 40, (num_objects, 2))
+    extents = rng.uniform(20, 120, (num_objects, 2))
+    owner = rng.integers(0, num_objects, n)
+    jitter = rng.normal(0, 6, (n, 4))
+    xy = centers[owner] - extents[owner] / 2
+    boxes = np.concatenate([xy, xy + extents[owner]], axis=1) + jitter
+    scores = rng.beta(0.6, 4.0, n)
+    class_ids = owner % len(CLASS_NAMES)
+    return DetectionSet.from_arrays(boxes, scores, class_ids)
+
+
+def time_call(fn, repeats: int) -> float:
+    fn()
+    started = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - started) / repeats * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidates", type=int, nargs="+", default=[1000, 5000, 10000, 25000])
+    parser.add_argument("--conf", type=float, default=0.25)
+    parser.add_argument("--iou", type=float, default=0.45)
+    parser.add_argument("--max-det", type=int, default=300)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+    options = PostprocessOptions(conf=args.conf, iou=args.iou, max_det=args.max_det)
+
+    print(f"conf={args.conf} iou={args.iou} max_det={args.max_det}")
+    print(f"{'candidates':>10} {'kept':>6} {'vector_ms':>10} {'edge_ms':>8} {'pydantic_all_ms':>16}")
+    for n in args.candidates:
+        candidates = make_candidates(n)
+        kept = candidates.postprocess(options)
+
+        vector_ms = time_call(lambda: candidates.postprocess(options), args.repeats)
+        edge_ms = time_call(lambda: kept.to_detections(CLASS_NAMES), args.repeats)
+
+        # The old path: one Pydantic object per candidate before any filtering
+        def pydantic_all():
+            xywh = candidates.boxes.copy()
+            xywh[:, 2:] -= xywh[:, :2]
+            return [
+                Detection(class_name=CLASS_NAMES[c], confidence=s, bbox=b)
+                for b, s, c in zip(xywh.tolist(), candidates.scores.tolist(), candidates.class_ids.tolist())
+            ]
+
+        pydantic_ms = time_call(pydantic_all, max(1, args.repeats // 4))
+        print(f"{n:>10} {len(kept):>6} {vector_ms:>10.3f} {edge_ms:>8.3f} {pydantic_ms:>16.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+ONNX Runtime backend benchmark: fp32 against dynamically quantized int8.
+
+Latency: mean and p95 milliseconds per detect_batch call for each batch
+size and intra-op thread count. Accuracy delta: the int8 detections
+compared with fp32 on the same letterboxed frames after the default
+postprocessing; recall is the share of fp32 boxes matched by an int8 box of
+the same class at IoU >= 0.5, with the mean IoU and absolute score change
+of those matches.
+
+Without --model a tiny random-weight model is generated, which checks the
+plumbing; pass a real export for numbers that mean something.
+
+    python backend/benchmarks/bench_onnx.py --model models/yolov8n.onnx --batch 1 4 8 --threads 1 2 4
+"""
+
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from detections import PostprocessOptions, box_iou  # noqa: E402
+from make_tiny_onnx import build_tiny_yolo  # noqa: E402
+from onnx_detector import OnnxDetector  # noqa: E402
+from preprocess import letterbox  # noqa: E402
+
+
+def make_frames(count: int, input_size: Tuple[int, int], images: List[str]) -> List[np.ndarray]:
+    """Letterboxed model inputs from the given image files, or smooth random scenes"""
+    width, height = input_size
+    rng = np.random.default_rng(0)
+    frames = []
+    for index in range(count):
+        if images:
+            image = cv2.imread(images[index % len(images)])
+        else:
+            image = cv2.resize(rng.integers(0, 255, (45, 80, 3), dtype=np.uint8), (1280, 720))
+        out = np.empty((height, width, 3), np.uint8)
+        letterbox(image, out)
+        frames.append(out)
+    return frames
+
+
+def time_batches(detector: OnnxDetector, frames: List[np.ndarray], batch: int, repeats: int) -> List[float]:
+    latencies = []
+    for index in range(repeats):
+        start = index * batch % len(frames)
+        images = (frames * 2)[start:start + batch]
+        started = time.perf_counter()
+        detector.detect_batch(images)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def accuracy_delta(reference: OnnxDetector, candidate: OnnxDetector, frames: List[np.ndarray]
+                   ) -> Tuple[float, float, float]:
+    """(recall of reference boxes, mean IoU of matches, mean |score delta| of matches)"""
+    options = PostprocessOptions()
+    matched, total, ious, score_deltas = 0, 0, [], []
+    for frame in frames:
+        expected = reference.detect(frame).postprocess(options)
+        actual = candidate.detect(frame).postprocess(options)
+        total += len(expected)
+        for box, score, class_id in zip(expected.boxes, expected.scores, expected.class_ids):
+            same_class = actual.class_ids == class_id
+            if not same_class.any():
+                continue
+            overlaps = box_iou(box, actual.boxes[same_class])
+            best = int(overlaps.argmax())
+            if overlaps[best] >= 0.5:
+                matched += 1
+                ious.append(float(overlaps[best]))
+                score_deltas.append(abs(float(actual.scores[same_class][best]) - float(score)))
+    return (matched / total if total else 1.0, statistics.mean(ious) if ious else 0.0,
+            statistics.mean(score_deltas) if score_deltas else 0.0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", help="ONNX model; a tiny generated one if omitted")
+    parser.add_argument("--images", nargs="*", default=[], help="images for the accuracy comparison")
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 0], help="intra-op threads, 0 for default")
+    parser.add_argument("--frames", type=int, default=32, help="frames for the accuracy comparison")
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model = args.model or build_tiny_yolo(str(Path(tmp) / "tiny-yolo.onnx"))
+
+        print(f"{'precision':>9} {'threads':>7} {'batch':>5} {'mean_ms':>8} {'p95_ms':>8} {'ms/image':>9}")
+        for threads in args.threads:
+            for precision in ("fp32", "int8"):
+                detector = OnnxDetector(model, precision=precision, intra_op_threads=threads, inter_op_threads=1)
+                frames = make_frames(max(args.batch) * 2, detector.input_size, args.images)
+                for batch in args.batch:
+                    time_batches(detector, frames, batch, 3)
+                    latencies = time_batches(detector, frames, batch, args.repeats)
+                    p95 = sorted(latencies)[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+                    mean = statistics.mean(latencies)
+                    print(f"{precision:>9} {threads or 'auto':>7} {batch:>5} {mean:>8.2f} {p95:>8.2f} "
+                          f"{mean / batch:>9.2f}")
+
+        fp32 = OnnxDetector(model, precision="fp32")
+        int8 = OnnxDetector(model, precision="int8")
+        recall, mean_iou, score_delta = accuracy_delta(fp32, int8, make_frames(args.frames, fp32.input_size,
+                                                                               args.images))
+        print(f"\nint8 vs fp32 over {args.frames} frames: recall {recall:.3f}, mean IoU {mean_iou:.3f}, "
+              f"mean |score delta| {score_delta:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Decode + preprocess benchmark: full-resolution decode and resize versus
+reduced-scale JPEG decode with letterboxing into a reused buffer.
+
+Peak memory is the tracemalloc peak over one decode + preprocess step.
+OpenCV allocates its output Mats through numpy, so the decoded frame and
+any resize temporaries are included.
+
+    python backend/benchmarks/bench_preprocess.py --sizes 640x480 1920x1080 4000x3000
+"""
+
+import argparse
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from preprocess import FrameBufferPool, letterbox, prepare_frame  # noqa: E402
+
+INPUT_SIZE = (640, 640)
+
+
+def make_jpeg(width: int, height: int, quality: int = 90) -> bytes:
+    """Photo-like test frame: smooth gradients plus mild noise"""
+    xs = np.linspace(0, 255, width, dtype=np.float32)
+    ys = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    image = np.empty((height, width, 3), dtype=np.uint8)
+    image[..., 0] = (xs + ys) / 2
+    image[..., 1] = xs[::-1] * 0.5 + ys * 0.5
+    image[..., 2] = np.abs(xs - ys)
+    image = cv2.add(image, np.random.randint(0, 16, image.shape, dtype=np.uint8))
+    return cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes()
+
+
+def measure(step, iterations: int) -> dict:
+    step()  # warm up, and let the buffer pool allocate its first buffer
+
+    tracemalloc.start()
+    step()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        step()
+        timings.append(time.perf_counter() - started)
+    return {
+        "mean_ms": float(np.mean(timings) * 1000),
+        "p95_ms": float(np.percentile(timings, 95) * 1000),
+        "peak_mb": peak / (1024 * 1024),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", default=["640x480", "1920x1080", "4000x3000"])
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+
+    buffers = FrameBufferPool((INPUT_SIZE[1], INPUT_SIZE[0], 3))
+
+    print(f"{'size':>10} {'mode':>8} {'jpeg_kb':>8} {'mean_ms':>8} {'p95_ms':>8} {'peak_mb':>8}")
+    for size in args.sizes:
+        width, height = (int(v) for v in size.split("x"))
+        data = make_jpeg(width, height)
+
+        def full():
+            image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+            out = np.empty((INPUT_SIZE[1], INPUT_SIZE[0], 3), dtype=np.uint8)
+            letterbox(image, out)
+
+        def reduced():
+            frame = prepare_frame(data, buffers)
+            buffers.release(frame.input)
+
+        for mode, step in (("full", full), ("reduced", reduced)):
+            result = measure(step, args.iterations)
+            print(f"{size:>10} {mode:>8} {len(data) / 1024:>8.0f} {result['mean_ms']:>8.2f} "
+                  f"{result['p95_ms']:>8.2f} {result['peak_mb']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Response serialization benchmark: cost per request of the original
+Pydantic + FastAPI JSON path versus the fast dict/orjson path and the
+columnar JSON and msgpack formats.
+
+    python backend/benchmarks/bench_serialization.py --detections 3 50 300
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from detections import DetectionSet  # noqa: E402
+from schemas import DetectionResponse  # noqa: E402
+from serialization import render_detections  # noqa: E402
+
+CLASS_NAMES = ["fire_extinguisher", "oxygen_tank", "toolkit"]
+MODEL_VERSION = "YOLOv8n-space-v1.0"
+
+
+def make_detections(n: int) -> DetectionSet:
+    rng = np.random.default_rng(0)
+    xy = rng.uniform(0, 1500, (n, 2))
+    boxes = np.concatenate([xy, xy + rng.uniform(10, 200, (n, 2))], axis=1)
+    return DetectionSet.from_arrays(boxes, rng.uniform(0.25, 1.0, n), rng.integers(0, len(CLASS_NAMES), n))
+
+
+def pydantic_path(detections: DetectionSet) -> bytes:
+    """What /api/detect used to do: build, validate and jsonable-encode the model"""
+    response = DetectionResponse(
+        success=True,
+        detections=detections.to_detections(CLASS_NAMES),
+        total_detections=len(detections),
+        processing_time="0.010s",
+        image_dimensions=[1920, 1080],
+        model_version=MODEL_VERSION,
+    )
+    # FastAPI revalidates the returned model against response_model, then encodes
+    validated = DetectionResponse.model_validate(response.model_dump())
+    return json.dumps(jsonable_encoder(validated)).encode()
+
+
+def time_call(fn, repeats: int) -> float:
+    fn()
+    started = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - started) / repeats * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--detections", type=int, nargs="+", default=[3, 50, 300])
+    parser.add_argument("--repeats", type=int, default=500)
+    args = parser.parse_args()
+
+    print(f"{'detections':>10} {'format':>16} {'us/request':>11} {'bytes':>8}")
+    for n in args.detections:
+        detections = make_detections(n)
+        cases = [("pydantic+json", lambda: pydantic_path(detections))]
+        for fmt in ("json", "columnar", "msgpack"):
+            cases.append((fmt, lambda fmt=fmt: render_detections(
+                fmt, detections, CLASS_NAMES, 1920, 1080, 0.010, MODEL_VERSION).body))
+        for name, fn in cases:
+            size = len(fn())
+            print(f"{n:>10} {name:>16} {time_call(fn, args.repeats):>11.1f} {size:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark: how long a fresh `uvicorn server:app` process takes
+to import the app, to start answering /api/health (listening) and to
+answer /api/ready with 200 (every model in MODELS loaded and warm).
+Each run starts a new process on a free localhost port, so nothing is
+shared between runs except the OS file cache; the first run is reported
+but usually slower.
+
+Import time is also measured on its own (`python -c "import server"`),
+with `-X importtime` output for the slowest modules under --import-detail.
+
+    python backend/benchmarks/bench_startup.py --runs 5
+    python backend/benchmarks/bench_startup.py --models onnx:/tmp/tiny-yolo.onnx --env MODEL_LOAD_BACKGROUND=0
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_import(env: Dict[str, str]) -> float:
+    """Seconds for a fresh interpreter to import server, interpreter start-up excluded"""
+    code = "import time; t = time.perf_counter(); import server; print(time.perf_counter() - t)"
+    output = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def slowest_imports(env: Dict[str, str], limit: int) -> List[Tuple[int, str]]:
+    """(cumulative microseconds, module) of the top-level imports that take longest"""
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import server"], cwd=BACKEND_DIR, env=env,
+                            check=True, capture_output=True, text=True).stderr
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Only modules imported directly by server or its top-level imports
+        if cumulative.strip().isdigit() and len(name) - len(name.lstrip()) <= 3:
+            imports.append((int(cumulative), name.strip()))
+    return sorted(imports, reverse=True)[:limit]
+
+
+def time_startup(env: Dict[str, str], timeout: float) -> Tuple[float, float, float]:
+    """(seconds to listen, seconds to ready, ready-side startup_seconds) for one fresh process"""
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}/api"
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1",
+                                "--port", str(port), "--log-level", "warning"], cwd=BACKEND_DIR, env=env)
+    listening = None
+    try:
+        with httpx.Client(base_url=base_url, timeout=2) as client:
+            while time.perf_counter() - started < timeout:
+                if process.poll() is not None:
+                    raise RuntimeError(f"Server exited with code {process.returncode}")
+                try:
+                    if listening is None and client.get("/health").status_code == 200:
+                        listening = time.perf_counter() - started
+                    response = client.get("/ready")
+                    if response.status_code == 200:
+                        return listening, time.perf_counter() - started, response.json()["startup_seconds"]
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.005)
+        raise RuntimeError(f"Server did not become ready within {timeout:.0f}s")
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def summary(values: List[float]) -> str:
+    values_ms = [value * 1000 for value in values]
+    return (f"mean {statistics.mean(values_ms):8.1f} ms   min {min(values_ms):8.1f} ms   "
+            f"max {max(values_ms):8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--models", help="MODELS for the server, its default (mock) if omitted")
+    parser.add_argument("--env", nargs="*", default=[], metavar="NAME=VALUE", help="extra server environment")
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds to wait for readiness")
+    parser.add_argument("--import-detail", type=int, default=0, metavar="N",
+                        help="also list the N slowest imports")
+    args = parser.parse_args()
+
+    env = {**os.environ, **dict(item.split("=", 1) for item in args.env)}
+    if args.models:
+        env["MODELS"] = args.models
+
+    imports, listens, readies, loads = [], [], [], []
+    print(f"{'run':>3} {'import_ms':>10} {'listen_ms':>10} {'ready_ms':>10} {'load_ms':>10}")
+    for run in range(args.runs):
+        imported = time_import(env)
+        listening, ready, load = time_startup(env, args.timeout)
+        imports.append(imported)
+        listens.append(listening)
+        readies.append(ready)
+        loads.append(load)
+        print(f"{run:>3} {imported * 1000:>10.1f} {listening * 1000:>10.1f} {ready * 1000:>10.1f} "
+              f"{load * 1000:>10.1f}")
+
+    print(f"\n{'import':>7} {summary(imports)}\n{'listen':>7} {summary(listens)}\n"
+          f"{'ready':>7} {summary(readies)}\n{'load':>7} {summary(loads)}")
+
+    if args.import_detail:
+        print("\nSlowest imports (cumulative):")
+        for microseconds, name in slowest_imports(env, args.import_detail):
+            print(f"{microseconds / 1000:>10.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Tiled inference benchmark: latency of one large, already decoded image
+split into overlapping tiles, for increasing worker counts (cores used for
+letterboxing and inference), against the single downscaled pass. Also
+times the cross-tile NMS and WBF merge on their own.
+
+MockDetector's simulated per-batch / per-image cost stands in for the
+model, so the scaling reflects how well tiles spread over workers and pack
+into batches.
+
+    python backend/benchmarks/bench_tiling.py --size 6000x4000 --workers 1 2 4 8
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from batching import BatchScheduler  # noqa: E402
+from detections import DetectionSet, PostprocessOptions  # noqa: E402
+from detector import MockDetector  # noqa: E402
+from preprocess import FrameBufferPool, letterbox  # noqa: E402
+from tiling import detect_tiled, merge_tile_detections, tile_grid  # noqa: E402
+from worker_pool import WorkerPool  # noqa: E402
+
+
+def make_image(width: int, height: int) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    # Smooth content so resizes cost what they would on a photo
+    small = rng.integers(0, 255, (height // 16, width // 16, 3), dtype=np.uint8)
+    return np.ascontiguousarray(np.repeat(np.repeat(small, 16, axis=0), 16, axis=1)[:height, :width])
+
+
+async def time_tiled(image: np.ndarray, workers: int, args) -> float:
+    pool = WorkerPool(max_workers=workers, max_queue=256)
+    detector = MockDetector(batch_cost_ms=args.batch_cost_ms, image_cost_ms=args.image_cost_ms)
+    scheduler = BatchScheduler(detector, pool, max_batch_size=args.max_batch, max_wait_ms=2)
+    await scheduler.start()
+    buffers = FrameBufferPool((640, 640, 3), capacity=64)
+    options = PostprocessOptions()
+
+    async def once():
+        return await detect_tiled(image, lambda frame: scheduler.detect(frame, options), pool.run, buffers,
+                                  tile=args.tile, overlap=args.overlap, options=options, merge=args.merge,
+                                  parallelism=args.parallelism, max_tiles=10000)
+
+    await once()
+    started = time.perf_counter()
+    for _ in range(args.repeats):
+        await once()
+    elapsed = (time.perf_counter() - started) / args.repeats
+
+    await scheduler.stop()
+    pool.shutdown()
+    return elapsed * 1000
+
+
+async def time_downscaled(image: np.ndarray, args) -> float:
+    """The non-tiled path: the whole image letterboxed into one 640x640 frame"""
+    pool = WorkerPool(max_workers=1, max_queue=8)
+    detector = MockDetector(batch_cost_ms=args.batch_cost_ms, image_cost_ms=args.image_cost_ms)
+    scheduler = BatchScheduler(detector, pool, max_batch_size=args.max_batch, max_wait_ms=0)
+    await scheduler.start()
+    out = np.empty((640, 640, 3), dtype=np.uint8)
+
+    async def once():
+        await pool.run(letterbox, image, out)
+        return await scheduler.detect(out)
+
+    await once()
+    started = time.perf_counter()
+    for _ in range(args.repeats):
+        await once()
+    elapsed = (time.perf_counter() - started) / args.repeats
+    await scheduler.stop()
+    pool.shutdown()
+    return elapsed * 1000
+
+
+def time_merge(tiles: np.ndarray, method: str, per_tile: int, repeats: int) -> float:
+    rng = np.random.default_rng(1)
+    results = []
+    for x1, y1, x2, y2 in tiles:
+        xy = rng.uniform(0, [x2 - x1 - 40, y2 - y1 - 40], (per_tile, 2))
+        boxes = np.concatenate([xy, xy + rng.uniform(10, 40, (per_tile, 2))], axis=1)
+        results.append(DetectionSet.from_arrays(boxes, rng.uniform(0.3, 1.0, per_tile), rng.integers(0, 3, per_tile)))
+    options = PostprocessOptions()
+    started = time.perf_counter()
+    for _ in range(repeats):
+        merge_tile_detections(results, tiles, options, method)
+    return (time.perf_counter() - started) / repeats * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", default="6000x4000", help="image WIDTHxHEIGHT")
+    parser.add_argument("--tile", type=int, default=640)
+    parser.add_argument("--overlap", type=float, default=0.2)
+    parser.add_argument("--merge", choices=["nms", "wbf"], default="nms")
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    parser.add_argument("--parallelism", type=int, default=16, help="tiles holding a buffer at once")
+    parser.add_argument("--max-batch", type=int, default=8)
+    parser.add_argument("--batch-cost-ms", type=float, default=8.0)
+    parser.add_argument("--image-cost-ms", type=float, default=4.0)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.size.lower().split("x"))
+    image = make_image(width, height)
+    tiles = tile_grid(width, height, args.tile, args.overlap)
+    print(f"{width}x{height} image, {len(tiles)} tiles of {args.tile}px at {args.overlap:g} overlap, "
+          f"cpu_count={os.cpu_count()}")
+
+    print(f"downscaled single pass: {asyncio.run(time_downscaled(image, args)):.1f} ms")
+    print(f"{'workers':>8} {'tiled_ms':>9} {'speedup':>8}")
+    baseline = None
+    for workers in args.workers:
+        elapsed = asyncio.run(time_tiled(image, workers, args))
+        baseline = baseline or elapsed
+        print(f"{workers:>8} {elapsed:>9.1f} {baseline / elapsed:>7.2f}x")
+
+    print(f"{'merge':>8} {'boxes':>7} {'ms':>8}")
+    for method in ("nms", "wbf"):
+        for per_tile in (5, 50):
+            merge_ms = time_merge(tiles, method, per_tile, args.repeats)
+            print(f"{method:>8} {per_tile * len(tiles):>7} {merge_ms:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
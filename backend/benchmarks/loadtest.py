@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+Local load test for /api/detect: starts the app in-process (ASGI, no
+sockets), under uvicorn or prefork.py on localhost, or targets an already
+running server, and drives it with concurrent clients for every
+combination of image size and format. Each case reports throughput, p50/p95/p99 latency,
+error rate and peak RSS of the serving process tree.
+
+Results are written as JSON; pass --compare with an earlier results file
+to flag throughput drops or latency increases beyond --tolerance (the
+script then exits non-zero, so it can gate CI).
+
+    python backend/benchmarks/loadtest.py --mode inprocess --concurrency 1 8 32
+    python backend/benchmarks/loadtest.py --mode prefork --server-workers 4 --inference-workers 4
+    python backend/benchmarks/loadtest.py --mode uvicorn --sizes 640x480 1920x1080 \\
+        --formats JPEG PNG --output results.json --compare baseline.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+import numpy as np
+from PIL import Image
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+MIME_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp", "BMP": "image/bmp"}
+
+# Lower is better for these, higher is better for throughput
+LATENCY_KEYS = ("p50_ms", "p95_ms", "p99_ms")
+
+
+def create_test_image(format: str = "JPEG", size=(640, 480), seed: int = 0) -> bytes:
+    """Random-content test image, as BackendTester.create_test_image builds them"""
+    rng = np.random.default_rng(seed)
+    img_array = rng.integers(0, 255, (size[1], size[0], 3), dtype=np.uint8)
+    img_bytes = BytesIO()
+    Image.fromarray(img_array).save(img_bytes, format=format)
+    return img_bytes.getvalue()
+
+
+def parse_size(text: str):
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+def _child_pids(pid: int) -> List[int]:
+    children = []
+    try:
+        for task in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{task}/children") as f:
+                children.extend(int(child) for child in f.read().split())
+    except OSError:
+        pass
+    return children
+
+
+def read_rss_bytes(pid: int) -> Optional[int]:
+    """
+    Resident set size of a process and all its descendants (uvicorn and
+    prefork workers), or None where /proc is unavailable. Pages shared
+    between processes are counted once per process.
+    """
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+    return rss + sum(read_rss_bytes(child) or 0 for child in _child_pids(pid))
+
+
+class PeakMemorySampler:
+    """Polls a process's RSS in the background and keeps the maximum"""
+
+    def __init__(self, pid: Optional[int], interval: float = 0.02):
+        self.pid = pid
+        self.interval = interval
+        self.peak: Optional[int] = None
+        self._task = None
+
+    async def _run(self):
+        while True:
+            rss = read_rss_bytes(self.pid)
+            if rss is not None:
+                self.peak = max(self.peak or 0, rss)
+            await asyncio.sleep(self.interval)
+
+    def __enter__(self):
+        if self.pid is not None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    def __exit__(self, *exc):
+        if self._task is not None:
+            self._task.cancel()
+        return False
+
+
+class InProcessTarget:
+    """The FastAPI app driven through httpx's ASGI transport"""
+
+    name = "inprocess"
+
+    def __init__(self, env: Dict[str, str]):
+        os.environ.update(env)
+        sys.path.insert(0, str(BACKEND_DIR))
+        import server  # noqa: E402 - configuration is read from the environment at import
+
+        self.app = server.app
+        self.pid = os.getpid()
+
+    async def __aenter__(self):
+        await self.app.router.startup()
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=self.app), base_url="http://loadtest/api")
+
+    async def __aexit__(self, *exc):
+        await self.app.router.shutdown()
+
+
+class UvicornTarget:
+    """The app served by a uvicorn subprocess on a free localhost port"""
+
+    name = "uvicorn"
+
+    def __init__(self, env: Dict[str, str], workers: int = 1):
+        self.env = {**os.environ, **env}
+        self.workers = workers
+        self.process: Optional[subprocess.Popen] = None
+        self.pid: Optional[int] = None
+
+    async def __aenter__(self):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        self.process = subprocess.Popen(self.command(port), cwd=BACKEND_DIR, env=self.env)
+        self.pid = self.process.pid
+        base_url = f"http://127.0.0.1:{port}/api"
+        await wait_until_ready(base_url, process=self.process)
+        return httpx.AsyncClient(base_url=base_url)
+
+    def command(self, port: int) -> List[str]:
+        return [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1", "--port", str(port),
+                "--workers", str(self.workers), "--log-level", "warning"]
+
+    async def __aexit__(self, *exc):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+class PreforkTarget(UvicornTarget):
+    """prefork.py: HTTP front-ends handing frames to inference processes via shared memory"""
+
+    name = "prefork"
+
+    def __init__(self, env: Dict[str, str], workers: int = 1, inference_workers: Optional[int] = None):
+        super().__init__(env, workers)
+        self.inference_workers = inference_workers
+
+    def command(self, port: int) -> List[str]:
+        command = [sys.executable, "prefork.py", "--host", "127.0.0.1", "--port", str(port),
+                   "--frontends", str(self.workers), "--log-level", "warning"]
+        if self.inference_workers:
+            command += ["--inference-workers", str(self.inference_workers)]
+        return command
+
+
+class RemoteTarget:
+    """An already running server; its memory cannot be observed"""
+
+    name = "url"
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip("/")
+        self.pid = None
+
+    async def __aenter__(self):
+        await wait_until_ready(self.base_url)
+        return httpx.AsyncClient(base_url=self.base_url)
+
+    async def __aexit__(self, *exc):
+        pass
+
+
+async def wait_until_ready(base_url: str, timeout: float = 30.0, process=None):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process is not None and process.poll() is not None:
+                raise RuntimeError(f"Server exited with code {process.returncode}")
+            try:
+                # /ready rather than /health: models load after the server starts listening
+                if (await client.get(f"{base_url}/ready", timeout=2)).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not become ready within {timeout:.0f}s")
+
+
+async def run_case(client: httpx.AsyncClient, pid: Optional[int], images: List[bytes], mime: str,
+                   concurrency: int, requests: int, warmup: int) -> dict:
+    """Send `requests` uploads from `concurrency` clients and summarise the latencies"""
+    async def post(index: int):
+        files = {"image": ("loadtest", images[index % len(images)], mime)}
+        return await client.post("/detect", files=files, timeout=60)
+
+    for i in range(warmup):
+        await post(i)
+
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index
+        while next_index < requests:
+            index, next_index = next_index, next_index + 1
+            started = time.perf_counter()
+            try:
+                status = str((await post(index)).status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    with PeakMemorySampler(pid) as sampler:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies_ms = np.array(latencies) * 1000
+    errors = sum(count for status, count in statuses.items() if status != "200")
+    return {
+        "requests": len(latencies),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 2),
+        "p95_ms": round(float(np.percentile(latencies_ms, 95)), 2),
+        "p99_ms": round(float(np.percentile(latencies_ms, 99)), 2),
+        "max_ms": round(float(latencies_ms.max()), 2),
+        "error_rate": round(errors / len(latencies), 4),
+        "status_counts": statuses,
+        "peak_rss_mb": round(sampler.peak / 2**20, 1) if sampler.peak else None,
+    }
+
+
+def case_key(case: dict) -> str:
+    return f"{case['size']}/{case['format']}/c{case['concurrency']}"
+
+
+def compare_results(current: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Human-readable regressions of `current` against `baseline`"""
+    previous = {case_key(case): case for case in baseline.get("cases", [])}
+    regressions = []
+    for case in current["cases"]:
+        old = previous.get(case_key(case))
+        if old is None:
+            continue
+        if case["throughput_rps"] < old["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{case_key(case)}: throughput {old['throughput_rps']} -> {case['throughput_rps']} rps")
+        for key in LATENCY_KEYS:
+            if case[key] > old[key] * (1 + tolerance):
+                regressions.append(f"{case_key(case)}: {key} {old[key]} -> {case[key]}")
+        if case["error_rate"] > old["error_rate"] + 0.01:
+            regressions.append(f"{case_key(case)}: error_rate {old['error_rate']} -> {case['error_rate']}")
+    return regressions
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args) -> dict:
+    # Unique images per case plus a disabled result cache keep every request on the full pipeline
+    env = {} if args.cache else {"CACHE_MAX_ENTRIES": "0"}
+    if args.mode == "inprocess":
+        target = InProcessTarget(env)
+    elif args.mode == "uvicorn":
+        target = UvicornTarget(env, workers=args.server_workers)
+    elif args.mode == "prefork":
+        target = PreforkTarget(env, workers=args.server_workers, inference_workers=args.inference_workers)
+    else:
+        target = RemoteTarget(args.url)
+
+    cases = []
+    async with target as client:
+        print(f"{'size':>10} {'format':>6} {'conc':>5} {'rps':>8} {'p50_ms':>8} {'p95_ms':>8} "
+              f"{'p99_ms':>8} {'errors':>7} {'peak_mb':>8}")
+        for size in args.sizes:
+            for fmt in args.formats:
+                images = [create_test_image(fmt, parse_size(size), seed) for seed in range(args.distinct_images)]
+                for concurrency in args.concurrency:
+                    result = await run_case(client, target.pid, images, MIME_TYPES[fmt], concurrency,
+                                            args.requests, args.warmup)
+                    case = {"size": size, "format": fmt, "concurrency": concurrency,
+                            "image_bytes": int(np.mean([len(image) for image in images])), **result}
+                    cases.append(case)
+                    peak = case["peak_rss_mb"] if case["peak_rss_mb"] is not None else "-"
+                    print(f"{size:>10} {fmt:>6} {concurrency:>5} {case['throughput_rps']:>8.1f} "
+                          f"{case['p50_ms']:>8.1f} {case['p95_ms']:>8.1f} {case['p99_ms']:>8.1f} "
+                          f"{case['error_rate']:>7.2%} {peak:>8}")
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git_revision": git_revision(),
+            "mode": target.name,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "cache": args.cache,
+            "requests_per_case": args.requests,
+        },
+        "cases": cases,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["inprocess", "uvicorn", "prefork", "url"], default="inprocess")
+    parser.add_argument("--url", default=os.environ.get("BACKEND_URL", "http://127.0.0.1:8001/api"),
+                        help="API base URL for --mode url")
+    parser.add_argument("--server-workers", type=int, default=1,
+                        help="uvicorn workers (--mode uvicorn) or HTTP front-ends (--mode prefork)")
+    parser.add_argument("--inference-workers", type=int, help="inference processes for --mode prefork")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--sizes", nargs="+", default=["640x480", "1920x1080"])
+    parser.add_argument("--formats", nargs="+", choices=sorted(MIME_TYPES), default=["JPEG", "PNG"])
+    parser.add_argument("--requests", type=int, default=200, help="requests per case")
+    parser.add_argument("--warmup", type=int, default=5, help="untimed requests before each case")
+    parser.add_argument("--distinct-images", type=int, default=16, help="different images cycled per case")
+    parser.add_argument("--cache", action="store_true", help="leave the server's result cache enabled")
+    parser.add_argument("--output", type=Path, help="write results JSON here")
+    parser.add_argument("--compare", type=Path, help="baseline results JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="allowed relative throughput drop / latency increase (default 0.10)")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+        print(f"Results written to {args.output}")
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())
+        regressions = compare_results(results, baseline, args.tolerance)
+        if regressions:
+            print(f"Regressions against {args.compare} (tolerance {args.tolerance:.0%}):")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"No regressions against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
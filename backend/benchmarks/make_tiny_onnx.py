@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Write a tiny randomly initialised YOLOv8-shaped ONNX model: a few strided
+convolutions ending in a (N, 4 + classes, anchors) head, with Ultralytics
+`names` / `imgsz` metadata. It exercises the whole ONNX Runtime backend
+(loading, metadata, batching, int8 quantization, decoding) in well under a
+second per batch, without shipping real weights.
+
+    python backend/benchmarks/make_tiny_onnx.py /tmp/tiny-yolo.onnx --size 320
+    MODELS=onnx:/tmp/tiny-yolo.onnx,onnx-int8:/tmp/tiny-yolo.onnx uvicorn server:app
+"""
+
+import argparse
+import sys
+from pathlib import Path
+from typing import Sequence
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from detector import CLASS_NAMES  # noqa: E402
+
+
+def build_tiny_yolo(path: str, size: int = 320, classes: Sequence[str] = CLASS_NAMES, width: int = 32,
+                    seed: int = 0) -> str:
+    """Save the model to `path` and return it; the batch dimension is dynamic"""
+    import onnx
+    from onnx import TensorProto, helper, numpy_helper
+
+    rng = np.random.default_rng(seed)
+    channels = 4 + len(classes)
+    layers = [(3, width // 2, 3, 2), (width // 2, width, 3, 2), (width, width, 3, 2), (width, channels, 1, 1)]
+
+    nodes, initializers = [], []
+    current = "images"
+    for index, (c_in, c_out, kernel, stride) in enumerate(layers):
+        weight = rng.normal(0, (2 / (c_in * kernel * kernel)) ** 0.5, (c_out, c_in, kernel, kernel))
+        initializers += [numpy_helper.from_array(weight.astype(np.float32), f"conv{index}.weight"),
+                         numpy_helper.from_array(np.zeros(c_out, np.float32), f"conv{index}.bias")]
+        nodes.append(helper.make_node("Conv", [current, f"conv{index}.weight", f"conv{index}.bias"],
+                                      [f"conv{index}"], kernel_shape=[kernel, kernel], strides=[stride, stride],
+                                      pads=[kernel // 2] * 4))
+        current = f"conv{index}"
+        if index < len(layers) - 1:
+            nodes.append(helper.make_node("Relu", [current], [f"relu{index}"]))
+            current = f"relu{index}"
+
+    # (N, C, H/8, W/8) -> (N, C, anchors), squashed to pixel boxes and scores
+    scale = np.ones((1, channels, 1), np.float32)
+    scale[0, :4, 0] = [size, size, size / 4, size / 4]
+    initializers += [numpy_helper.from_array(np.array([0, channels, -1], np.int64), "head.shape"),
+                     numpy_helper.from_array(scale, "head.scale")]
+    nodes += [
+        helper.make_node("Reshape", [current, "head.shape"], ["head"]),
+        helper.make_node("Sigmoid", ["head"], ["head.sigmoid"]),
+        helper.make_node("Mul", ["head.sigmoid", "head.scale"], ["output0"]),
+    ]
+
+    graph = helper.make_graph(
+        nodes, "tiny-yolo",
+        [helper.make_tensor_value_info("images", TensorProto.FLOAT, ["batch", 3, size, size])],
+        [helper.make_tensor_value_info("output0", TensorProto.FLOAT, ["batch", channels, (size // 8) ** 2])],
+        initializers,
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)], producer_name="make_tiny_onnx")
+    # IR version 8 loads on every ONNX Runtime release that supports opset 13
+    model.ir_version = 8
+    helper.set_model_props(model, {"names": str(dict(enumerate(classes))), "imgsz": str([size, size])})
+    onnx.checker.check_model(model)
+    onnx.save(model, path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="where to write the .onnx file")
+    parser.add_argument("--size", type=int, default=320, help="square input size, a multiple of 8")
+    parser.add_argument("--width", type=int, default=32, help="channels in the hidden layers")
+    args = parser.parse_args()
+    print(build_tiny_yolo(args.path, args.size, width=args.width))
+
+
+if __name__ == "__main__":
+    main()
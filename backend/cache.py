@@ -0,0 +1,152 @@
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def content_key(data, model_version: str) -> str:
+    """Cache key for uploaded bytes scored by a given model version"""
+    digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+    return f"{model_version}:{digest}"
+
+
+class _Inflight:
+    """A running computation and the number of callers waiting on it"""
+
+    def __init__(self, task: asyncio.Future):
+        self.task = task
+        self.waiters = 0
+        self.abandoned = False
+
+
+class ResultCache:
+    """
+    Content-addressed LRU cache bounded by entry count and total bytes.
+
+    Entries optionally expire after ttl_seconds. Concurrent lookups of the
+    same missing key share one in-flight computation (singleflight). The cache
+    is owned by the event loop and is not thread-safe.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024,
+                 ttl_seconds: Optional[float] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds or None
+        # key -> (value, size, stored_at)
+        self._entries: "OrderedDict[str, Tuple[Any, int, float]]" = OrderedDict()
+        self._inflight: Dict[str, _Inflight] = {}
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    def invalidate(self, model_version: Optional[str] = None):
+        """Drop every entry, or only those scored by one model version"""
+        if model_version is None:
+            self._entries.clear()
+            self._bytes = 0
+            return
+        prefix = f"{model_version}:"
+        for key in [key for key in self._entries if key.startswith(prefix)]:
+            self._remove(key)
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        value, size, stored_at = entry
+        if self.ttl_seconds is not None and time.monotonic() - stored_at > self.ttl_seconds:
+            self._remove(key)
+            self.expirations += 1
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def put(self, key: str, value: Any, size: int):
+        if not self.enabled or size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (value, size, time.monotonic())
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[Any]],
+                             size_of: Callable[[Any], int]) -> Tuple[Any, bool]:
+        """
+        Return (value, hit). On a miss, run compute() once no matter how many
+        callers are waiting on the same key, and cache its result.
+        """
+        found, value = self.get(key)
+        if found:
+            self.hits += 1
+            return value, True
+
+        inflight = self._inflight.get(key)
+        if inflight is not None and not inflight.abandoned:
+            self.coalesced += 1
+            return await self._join(inflight), True
+
+        self.misses += 1
+        # Run as its own task so one disconnecting caller does not cancel the
+        # computation for everyone else waiting on it
+        inflight = _Inflight(asyncio.ensure_future(compute()))
+        self._inflight[key] = inflight
+        inflight.task.add_done_callback(lambda _: self._forget(key, inflight))
+        value = await self._join(inflight)
+
+        # Keys carry the model version and unloading a model drains its
+        # requests before invalidating, so every result is safe to store
+        self.put(key, value, size_of(value))
+        return value, False
+
+    async def _join(self, inflight: _Inflight) -> Any:
+        inflight.waiters += 1
+        try:
+            return await asyncio.shield(inflight.task)
+        except asyncio.CancelledError:
+            # The last caller gave up (e.g. disconnected); nobody will read the result
+            if inflight.waiters == 1 and not inflight.task.done():
+                inflight.abandoned = True
+                inflight.task.cancel()
+            raise
+        finally:
+            inflight.waiters -= 1
+
+    def _forget(self, key: str, inflight: _Inflight):
+        if self._inflight.get(key) is inflight:
+            del self._inflight[key]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_ratio": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,179 @@
+from dataclasses import dataclass
+from typing import List, Sequence
+
+import numpy as np
+
+from schemas import Detection
+
+
+@dataclass(frozen=True)
+class PostprocessOptions:
+    """Per-request filtering applied to raw detector candidates"""
+
+    conf: float = 0.25
+    iou: float = 0.45
+    max_det: int = 300
+
+    def cache_tag(self) -> str:
+        return f"c{self.conf:g}-i{self.iou:g}-m{self.max_det}"
+
+
+@dataclass
+class DetectionSet:
+    """
+    Detections for one image as parallel arrays.
+
+    boxes are (N, 4) float32 [x1, y1, x2, y2], scores (N,) float32 and
+    class_ids (N,) int32. All filtering stays vectorized; responses are built
+    straight from the arrays by serialization.detection_payload().
+    """
+
+    boxes: np.ndarray
+    scores: np.ndarray
+    class_ids: np.ndarray
+
+    @classmethod
+    def empty(cls) -> "DetectionSet":
+        return cls(np.zeros((0, 4), np.float32), np.zeros(0, np.float32), np.zeros(0, np.int32))
+
+    @classmethod
+    def from_arrays(cls, boxes, scores, class_ids) -> "DetectionSet":
+        return cls(
+            np.asarray(boxes, dtype=np.float32).reshape(-1, 4),
+            np.asarray(scores, dtype=np.float32).reshape(-1),
+            np.asarray(class_ids, dtype=np.int32).reshape(-1),
+        )
+
+    @classmethod
+    def concatenate(cls, sets: Sequence["DetectionSet"]) -> "DetectionSet":
+        if not sets:
+            return cls.empty()
+        return cls(
+            np.concatenate([d.boxes for d in sets]),
+            np.concatenate([d.scores for d in sets]),
+            np.concatenate([d.class_ids for d in sets]),
+        )
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    @property
+    def nbytes(self) -> int:
+        return self.boxes.nbytes + self.scores.nbytes + self.class_ids.nbytes
+
+    def select(self, index) -> "DetectionSet":
+        """Subset by boolean mask or integer index array"""
+        return DetectionSet(self.boxes[index], self.scores[index], self.class_ids[index])
+
+    def threshold(self, conf: float) -> "DetectionSet":
+        return self.select(self.scores >= conf)
+
+    def topk(self, k: int) -> "DetectionSet":
+        if len(self) <= k:
+            return self.select(np.argsort(-self.scores, kind="stable"))
+        index = np.argpartition(-self.scores, k - 1)[:k]
+        return self.select(index[np.argsort(-self.scores[index], kind="stable")])
+
+    def _class_shift(self) -> np.ndarray:
+        """
+        Per-box offsets that move each class into its own coordinate range,
+        so one suppression pass never matches boxes across classes.
+        """
+        offset = float(self.boxes.max() - self.boxes.min()) + 1.0
+        return self.class_ids.astype(np.float32) * offset
+
+    def nms(self, iou_threshold: float, class_agnostic: bool = False) -> "DetectionSet":
+        if len(self) == 0:
+            return self
+        boxes = self.boxes
+        if not class_agnostic:
+            boxes = boxes + self._class_shift()[:, None]
+        return self.select(nms_indices(boxes, self.scores, iou_threshold))
+
+    def wbf(self, iou_threshold: float, class_agnostic: bool = False) -> "DetectionSet":
+        """
+        Weighted box fusion: overlapping boxes are averaged, weighted by
+        score, instead of all but the best being discarded.
+        """
+        if len(self) == 0:
+            return self
+        # Fuse in float64 so removing the class shift afterwards is exact enough
+        boxes, shift = self.boxes.astype(np.float64), None
+        if not class_agnostic:
+            shift = self._class_shift().astype(np.float64)
+            boxes += shift[:, None]
+        fused, scores, representatives = weighted_box_fusion(boxes, self.scores, iou_threshold)
+        if shift is not None:
+            fused -= shift[representatives][:, None]
+        return DetectionSet(fused.astype(np.float32), scores, self.class_ids[representatives])
+
+    def postprocess(self, options: PostprocessOptions) -> "DetectionSet":
+        """Confidence threshold, per-class NMS and top-k, in that order"""
+        return self.threshold(options.conf).nms(options.iou).topk(options.max_det)
+
+    def to_detections(self, class_names: Sequence[str]) -> List[Detection]:
+        """Build the public [x, y, width, height] schema objects"""
+        xywh = self.boxes.copy()
+        xywh[:, 2:] -= xywh[:, :2]
+        return [
+            Detection(
+                class_name=class_names[class_id] if 0 <= class_id < len(class_names) else str(class_id),
+                confidence=score,
+                bbox=box,
+            )
+            for box, score, class_id in zip(xywh.tolist(), self.scores.tolist(), self.class_ids.tolist())
+        ]
+
+
+def box_iou(box: np.ndarray, boxes: np.ndarray) -> np.ndarray:
+    """IoU of one [x1, y1, x2, y2] box against an (N, 4) array"""
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[2], boxes[:, 2])
+    y2 = np.minimum(box[3], boxes[:, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return inter / np.maximum(area + areas - inter, 1e-9)
+
+
+def nms_indices(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float) -> np.ndarray:
+    """
+    Greedy non-maximum suppression, returning kept indices by descending score.
+    Each iteration suppresses every remaining overlap with one vectorized IoU.
+    """
+    order = np.argsort(-scores, kind="stable")
+    keep = []
+    while order.size:
+        best = order[0]
+        keep.append(best)
+        if order.size == 1:
+            break
+        rest = order[1:]
+        order = rest[box_iou(boxes[best], boxes[rest]) <= iou_threshold]
+    return np.asarray(keep, dtype=np.intp)
+
+
+def weighted_box_fusion(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float):
+    """
+    Greedy weighted box fusion. Returns the fused (M, 4) boxes, their scores
+    (the best score in each cluster) and the index of each cluster's
+    highest-scoring member, by descending score.
+    """
+    order = np.argsort(-scores, kind="stable")
+    fused, fused_scores, representatives = [], [], []
+    while order.size:
+        best = order[0]
+        members = box_iou(boxes[best], boxes[order]) > iou_threshold
+        members[0] = True
+        cluster = order[members]
+        weights = scores[cluster]
+        fused.append((boxes[cluster] * weights[:, None]).sum(axis=0) / max(float(weights.sum()), 1e-9))
+        fused_scores.append(scores[best])
+        representatives.append(best)
+        order = order[~members]
+    return (
+        np.asarray(fused, dtype=boxes.dtype).reshape(-1, 4),
+        np.asarray(fused_scores, dtype=np.float32),
+        np.asarray(representatives, dtype=np.intp),
+    )
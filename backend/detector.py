@@ -0,0 +1,123 @@
+import random
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from detections import DetectionSet
+
+CLASS_NAMES = ["fire_extinguisher", "oxygen_tank", "toolkit"]
+
+
+class Detector(ABC):
+    """
+    Interface every inference backend implements.
+
+    Backends receive whole batches so real models can run at their most
+    efficient batch size; detect() is a convenience for single images.
+    """
+
+    name: str = "detector"
+    version: str = "unknown"
+    framework: str = "unknown"
+    classes: List[str] = []
+    input_size: Tuple[int, int] = (640, 640)
+
+    @abstractmethod
+    def detect_batch(self, images: List[np.ndarray]) -> List[DetectionSet]:
+        """
+        Run detection on a batch of BGR images, returning the raw candidate
+        boxes (in input-image pixels) for each one. Thresholding and NMS are
+        applied afterwards by DetectionSet.postprocess.
+        """
+
+    def detect(self, image: np.ndarray) -> DetectionSet:
+        return self.detect_batch([image])[0]
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "model_name": self.version,
+            "model_type": "Object Detection",
+            "framework": self.framework,
+            "classes": list(self.classes),
+            "input_size": list(self.input_size),
+        }
+
+
+# Mock boxes as fractions of the image: (class_id, confidence, x, y, width, height)
+_MOCK_BOXES = np.array([
+    [0, 0.942, 0.15, 0.25, 0.12, 0.30],
+    [1, 0.887, 0.65, 0.15, 0.08, 0.40],
+    [2, 0.915, 0.35, 0.55, 0.15, 0.20],
+], dtype=np.float32)
+
+
+# Mock YOLO detection function (replace with actual model)
+def mock_yolo_detection(image: np.ndarray) -> DetectionSet:
+    """
+    Mock YOLO detection function. Replace this with actual YOLOv8 model inference.
+    """
+    height, width = image.shape[:2]
+
+    # Randomly select 1-3 detections to simulate real scenarios
+    num_detections = random.randint(1, 3)
+    rows = _MOCK_BOXES[random.sample(range(len(_MOCK_BOXES)), num_detections)]
+
+    # Realistic bounding boxes in pixels, [x1, y1, x2, y2]
+    scale = np.array([width, height, width, height], dtype=np.float32)
+    xywh = np.floor(rows[:, 2:6] * scale)
+    boxes = np.concatenate([xywh[:, :2], xywh[:, :2] + xywh[:, 2:]], axis=1)
+
+    # Add some variation
+    scores = rows[:, 1] + np.random.uniform(-0.1, 0.05, num_detections).astype(np.float32)
+
+    return DetectionSet.from_arrays(boxes, scores, rows[:, 0])
+
+
+class MockDetector(Detector):
+    """
+    Detector backed by mock_yolo_detection.
+
+    batch_cost_ms and image_cost_ms simulate the fixed per-call and marginal
+    per-image cost of a real model, which is what makes batching pay off.
+    """
+
+    name = "mock"
+    version = "YOLOv8n-space-v1.0"
+    framework = "YOLOv8"
+    classes = CLASS_NAMES
+    input_size = (640, 640)
+
+    def __init__(self, batch_cost_ms: float = 0.0, image_cost_ms: float = 0.0, version: Optional[str] = None):
+        if version:
+            self.version = version
+        self.batch_cost_ms = batch_cost_ms
+        self.image_cost_ms = image_cost_ms
+
+    def detect_batch(self, images: List[np.ndarray]) -> List[DetectionSet]:
+        cost_ms = self.batch_cost_ms + self.image_cost_ms * len(images)
+        if cost_ms > 0:
+            time.sleep(cost_ms / 1000)
+        return [mock_yolo_detection(image) for image in images]
+
+
+def create_detector(spec: str) -> Detector:
+    """
+    Build a detector from a model spec of the form "<backend>[:<argument>]".
+
+    "mock" is the default MockDetector; "mock:<version>" serves the mock
+    under another version name, which is handy for exercising hot swaps.
+    "onnx:<path>" runs an ONNX YOLO model on ONNX Runtime, and
+    "onnx-int8:<path>" the same model with dynamically quantized weights.
+    """
+    backend, _, argument = spec.partition(":")
+    if backend == "mock":
+        return MockDetector(version=argument or None)
+    if backend in ("onnx", "onnx-int8"):
+        if not argument:
+            raise ValueError(f"Model spec '{spec}' needs a path, e.g. '{backend}:models/yolov8n.onnx'")
+        # Imported here: onnx_detector builds on this module
+        from onnx_detector import OnnxDetector
+        return OnnxDetector(argument, precision="int8" if backend == "onnx-int8" else "fp32")
+    raise ValueError(f"Unknown model backend '{backend}' in spec '{spec}'")
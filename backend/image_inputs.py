@@ -0,0 +1,119 @@
+import base64
+import binascii
+import json
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Mapping, Optional, Tuple, Union
+
+import numpy as np
+from fastapi import HTTPException, Request, UploadFile
+
+from uploads import SNIFF_BYTES, sniff_image_format, upload_buffer
+
+RAW_MEDIA_TYPE = "application/octet-stream"
+RAW_CHANNELS = (1, 3, 4)
+# Raw frames are BGR unless the headers give another channel count
+RAW_DEFAULT_CHANNELS = 3
+
+
+@dataclass
+class ImageInput:
+    """
+    One image to detect on, whichever way it arrived: encoded bytes from a
+    multipart upload or a base64 JSON body, or raw HxWxC uint8 pixels.
+    """
+
+    data: Union[bytes, memoryview, np.ndarray]
+    source: str
+
+    @property
+    def raw(self) -> bool:
+        return isinstance(self.data, np.ndarray)
+
+
+def validate_encoded(data: Union[bytes, memoryview], source: str) -> ImageInput:
+    """Check encoded bytes by their content rather than the declared type"""
+    if sniff_image_format(bytes(data[:SNIFF_BYTES])) is None:
+        raise HTTPException(status_code=400, detail="File must be an image")
+    return ImageInput(data, source)
+
+
+def raw_shape(headers: Mapping[str, str]) -> Tuple[int, int, int]:
+    """
+    (height, width, channels) of a raw pixel body, from `X-Image-Shape: H,W[,C]`
+    or `X-Image-Height` / `X-Image-Width` / `X-Image-Channels`. Either way a
+    missing channel count means 3 (BGR); grayscale frames must say 1.
+    """
+    try:
+        if headers.get("x-image-shape"):
+            dims = [int(v) for v in headers["x-image-shape"].replace("x", ",").split(",")]
+            if len(dims) not in (2, 3):
+                raise ValueError
+            height, width, channels = dims if len(dims) == 3 else (*dims, RAW_DEFAULT_CHANNELS)
+        else:
+            height = int(headers["x-image-height"])
+            width = int(headers["x-image-width"])
+            channels = int(headers.get("x-image-channels", RAW_DEFAULT_CHANNELS))
+    except (KeyError, ValueError):
+        raise HTTPException(status_code=422, detail="Raw pixel bodies need X-Image-Shape: H,W[,C] "
+                                                    "or X-Image-Height and X-Image-Width headers")
+    return height, width, channels
+
+
+def validate_pixels(body: bytes, shape: Tuple[int, int, int], max_side: int) -> ImageInput:
+    """Wrap a raw uint8 HWC body as an array without copying it"""
+    height, width, channels = shape
+    if not (0 < height <= max_side and 0 < width <= max_side):
+        raise HTTPException(status_code=422, detail=f"Image sides must be between 1 and {max_side} pixels")
+    if channels not in RAW_CHANNELS:
+        raise HTTPException(status_code=422, detail=f"Channels must be one of {RAW_CHANNELS}")
+    expected = height * width * channels
+    if len(body) != expected:
+        raise HTTPException(status_code=400, detail=f"Body is {len(body)} bytes but a {height}x{width}x{channels} "
+                                                    f"uint8 frame needs {expected}")
+    return ImageInput(np.frombuffer(body, dtype=np.uint8).reshape(height, width, channels), "raw")
+
+
+def decode_base64_payload(body: bytes) -> ImageInput:
+    """Extract `{"image": "<base64 or data: URL>"}` from a JSON body"""
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON body")
+    text = payload.get("image") if isinstance(payload, dict) else None
+    if not isinstance(text, str):
+        raise HTTPException(status_code=422, detail='JSON body needs an "image" field with base64 image data')
+    if text.startswith("data:"):
+        header, _, text = text.partition(",")
+        if not header.endswith(";base64"):
+            raise HTTPException(status_code=400, detail="Only base64 data URLs are supported")
+    try:
+        data = base64.b64decode(text, validate=True)
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Image is not valid base64")
+    return validate_encoded(data, "base64")
+
+
+@asynccontextmanager
+async def read_request_image(request: Request, upload: Optional[UploadFile], max_side: int
+                             ) -> AsyncIterator[ImageInput]:
+    """
+    Validate the image of a detection request, whichever way it was sent:
+    a multipart `image` part, an application/octet-stream body of raw
+    pixels with shape headers, or a JSON body with base64 image data.
+    """
+    if upload is not None:
+        with upload_buffer(upload) as view:
+            yield validate_encoded(view, "multipart")
+        return
+
+    content_type = (request.headers.get("content-type") or "").split(";")[0].strip().lower()
+    if content_type == RAW_MEDIA_TYPE:
+        # Shape first, so a bad request is refused before the body is read
+        shape = raw_shape(request.headers)
+        yield validate_pixels(await request.body(), shape, max_side)
+    elif content_type == "application/json" or content_type.endswith("+json"):
+        yield decode_base64_payload(await request.body())
+    else:
+        raise HTTPException(status_code=422, detail="No image: send a multipart `image` part, raw pixels as "
+                                                    f"{RAW_MEDIA_TYPE} or base64 image data as JSON")
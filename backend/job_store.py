@@ -0,0 +1,306 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import asdict, dataclass, field, fields
+from typing import Any, Dict, List, Optional, Sequence
+
+from serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+try:
+    from motor.motor_asyncio import AsyncIOMotorClient
+except ImportError:  # pragma: no cover - optional store
+    AsyncIOMotorClient = None
+
+JOB_STATUSES = ("queued", "running", "succeeded", "failed", "cancelled")
+FINISHED_STATUSES = ("succeeded", "failed", "cancelled")
+
+
+@dataclass
+class Job:
+    """A submitted batch analysis and its progress"""
+
+    id: str
+    priority: int = 0
+    model: Optional[str] = None
+    options: Dict[str, Any] = field(default_factory=dict)
+    status: str = "queued"
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    processed: int = 0
+    failed: int = 0
+    total: Optional[int] = None
+    error: Optional[str] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Job":
+        names = {f.name for f in fields(cls)}
+        return cls(**{key: value for key, value in data.items() if key in names})
+
+
+class JobStore(ABC):
+    """
+    Persistence for jobs and their per-image results.
+
+    Results are appended in batches (add_results) and read back in
+    completion order by their `seq` number, so a client can resume a
+    result stream from any point.
+    """
+
+    async def open(self):
+        pass
+
+    async def close(self):
+        pass
+
+    @abstractmethod
+    async def save_job(self, job: Job):
+        """Insert or replace a job record"""
+
+    @abstractmethod
+    async def get_job(self, job_id: str) -> Optional[Job]:
+        pass
+
+    @abstractmethod
+    async def list_jobs(self, statuses: Optional[Sequence[str]] = None, limit: int = 100) -> List[Job]:
+        """Most recently created first"""
+
+    @abstractmethod
+    async def add_results(self, job_id: str, rows: List[Dict[str, Any]]):
+        """Append result rows, each carrying its `seq`, in one bulk write"""
+
+    @abstractmethod
+    async def get_results(self, job_id: str, start: int = 0, limit: int = 1000) -> List[Dict[str, Any]]:
+        """Rows with seq >= start, in seq order"""
+
+    @abstractmethod
+    async def delete_results(self, job_id: str):
+        pass
+
+    @abstractmethod
+    async def prune_finished(self, finished_before: float) -> int:
+        """Delete jobs that finished before the given time, with their results; returns how many"""
+
+
+class MemoryJobStore(JobStore):
+    """Process-local store; jobs are lost on restart"""
+
+    def __init__(self):
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._results: Dict[str, List[Dict[str, Any]]] = {}
+
+    async def save_job(self, job: Job):
+        self._jobs[job.id] = job.as_dict()
+
+    async def get_job(self, job_id: str) -> Optional[Job]:
+        data = self._jobs.get(job_id)
+        return Job.from_dict(data) if data is not None else None
+
+    async def list_jobs(self, statuses: Optional[Sequence[str]] = None, limit: int = 100) -> List[Job]:
+        jobs = [Job.from_dict(data) for data in self._jobs.values()
+                if statuses is None or data["status"] in statuses]
+        return sorted(jobs, key=lambda job: job.created_at, reverse=True)[:limit]
+
+    async def add_results(self, job_id: str, rows: List[Dict[str, Any]]):
+        self._results.setdefault(job_id, []).extend(rows)
+
+    async def get_results(self, job_id: str, start: int = 0, limit: int = 1000) -> List[Dict[str, Any]]:
+        # seq numbers are dense from 0, so they double as list positions
+        return self._results.get(job_id, [])[start:start + limit]
+
+    async def delete_results(self, job_id: str):
+        self._results.pop(job_id, None)
+
+    async def prune_finished(self, finished_before: float) -> int:
+        expired = [job_id for job_id, data in self._jobs.items()
+                   if data["status"] in FINISHED_STATUSES and (data["finished_at"] or 0) < finished_before]
+        for job_id in expired:
+            del self._jobs[job_id]
+            self._results.pop(job_id, None)
+        return len(expired)
+
+
+class SQLiteJobStore(JobStore):
+    """
+    Single-file store using the stdlib sqlite3 driver. Queries run on a
+    thread so the event loop never waits on disk; result batches go in with
+    one executemany per flush.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    async def open(self):
+        await asyncio.to_thread(self._open)
+
+    def _open(self):
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, status TEXT NOT NULL, "
+            "created_at REAL NOT NULL, data TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS job_results (job_id TEXT NOT NULL, seq INTEGER NOT NULL, "
+            "data TEXT NOT NULL, PRIMARY KEY (job_id, seq)) WITHOUT ROWID"
+        )
+
+    async def close(self):
+        if self._conn is not None:
+            await asyncio.to_thread(self._conn.close)
+            self._conn = None
+
+    def _execute(self, sql: str, params: Sequence = ()) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _executemany(self, sql: str, rows: List[tuple]):
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(sql, rows)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    async def save_job(self, job: Job):
+        await asyncio.to_thread(
+            self._execute,
+            "INSERT OR REPLACE INTO jobs (id, status, created_at, data) VALUES (?, ?, ?, ?)",
+            (job.id, job.status, job.created_at, json.dumps(job.as_dict())),
+        )
+
+    async def get_job(self, job_id: str) -> Optional[Job]:
+        rows = await asyncio.to_thread(self._execute, "SELECT data FROM jobs WHERE id = ?", (job_id,))
+        return Job.from_dict(json.loads(rows[0][0])) if rows else None
+
+    async def list_jobs(self, statuses: Optional[Sequence[str]] = None, limit: int = 100) -> List[Job]:
+        if statuses:
+            placeholders = ",".join("?" * len(statuses))
+            sql = f"SELECT data FROM jobs WHERE status IN ({placeholders}) ORDER BY created_at DESC LIMIT ?"
+            params = (*statuses, limit)
+        else:
+            sql, params = "SELECT data FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)
+        rows = await asyncio.to_thread(self._execute, sql, params)
+        return [Job.from_dict(json.loads(data)) for (data,) in rows]
+
+    async def add_results(self, job_id: str, rows: List[Dict[str, Any]]):
+        if rows:
+            await asyncio.to_thread(
+                self._executemany,
+                "INSERT OR REPLACE INTO job_results (job_id, seq, data) VALUES (?, ?, ?)",
+                [(job_id, row["seq"], dumps(row).decode()) for row in rows],
+            )
+
+    async def get_results(self, job_id: str, start: int = 0, limit: int = 1000) -> List[Dict[str, Any]]:
+        rows = await asyncio.to_thread(
+            self._execute,
+            "SELECT data FROM job_results WHERE job_id = ? AND seq >= ? ORDER BY seq LIMIT ?",
+            (job_id, start, limit),
+        )
+        return [json.loads(data) for (data,) in rows]
+
+    async def delete_results(self, job_id: str):
+        await asyncio.to_thread(self._execute, "DELETE FROM job_results WHERE job_id = ?", (job_id,))
+
+    async def prune_finished(self, finished_before: float) -> int:
+        return await asyncio.to_thread(self._prune_finished, finished_before)
+
+    def _prune_finished(self, finished_before: float) -> int:
+        placeholders = ",".join("?" * len(FINISHED_STATUSES))
+        expired = (f"SELECT id FROM jobs WHERE status IN ({placeholders}) "
+                   "AND COALESCE(json_extract(data, '$.finished_at'), 0) < ?")
+        params = (*FINISHED_STATUSES, finished_before)
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute(f"DELETE FROM job_results WHERE job_id IN ({expired})", params)
+                pruned = self._conn.execute(f"DELETE FROM jobs WHERE id IN ({expired})", params).rowcount
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return pruned
+
+
+class MongoJobStore(JobStore):
+    """MongoDB store through motor; result batches use insert_many"""
+
+    def __init__(self, url: str, database: str):
+        if AsyncIOMotorClient is None:
+            raise RuntimeError("JOB_STORE=mongo requires the motor package")
+        self._client = AsyncIOMotorClient(url)
+        self._db = self._client[database]
+        self._jobs = self._db["jobs"]
+        self._results = self._db["job_results"]
+
+    async def open(self):
+        await self._jobs.create_index([("status", 1), ("created_at", -1)])
+        await self._results.create_index([("job_id", 1), ("seq", 1)], unique=True)
+
+    async def close(self):
+        self._client.close()
+
+    async def save_job(self, job: Job):
+        data = job.as_dict()
+        await self._jobs.replace_one({"_id": job.id}, {"_id": job.id, **data}, upsert=True)
+
+    async def get_job(self, job_id: str) -> Optional[Job]:
+        data = await self._jobs.find_one({"_id": job_id})
+        return Job.from_dict(data) if data is not None else None
+
+    async def list_jobs(self, statuses: Optional[Sequence[str]] = None, limit: int = 100) -> List[Job]:
+        query = {"status": {"$in": list(statuses)}} if statuses else {}
+        cursor = self._jobs.find(query).sort("created_at", -1).limit(limit)
+        return [Job.from_dict(data) async for data in cursor]
+
+    async def add_results(self, job_id: str, rows: List[Dict[str, Any]]):
+        if rows:
+            # ordered=False lets the server apply the batch in parallel
+            await self._results.insert_many([{"job_id": job_id, "seq": row["seq"], "result": row} for row in rows],
+                                            ordered=False)
+
+    async def get_results(self, job_id: str, start: int = 0, limit: int = 1000) -> List[Dict[str, Any]]:
+        cursor = self._results.find({"job_id": job_id, "seq": {"$gte": start}}).sort("seq", 1).limit(limit)
+        return [document["result"] async for document in cursor]
+
+    async def delete_results(self, job_id: str):
+        await self._results.delete_many({"job_id": job_id})
+
+    async def prune_finished(self, finished_before: float) -> int:
+        query = {"status": {"$in": list(FINISHED_STATUSES)}, "finished_at": {"$lt": finished_before}}
+        expired = [document["_id"] async for document in self._jobs.find(query, {"_id": 1})]
+        if expired:
+            await self._results.delete_many({"job_id": {"$in": expired}})
+            await self._jobs.delete_many({"_id": {"$in": expired}})
+        return len(expired)
+
+
+def create_job_store(kind: str, sqlite_path: str = "jobs.db", mongo_url: Optional[str] = None,
+                     mongo_db: str = "eleven11_detection") -> JobStore:
+    if kind == "memory":
+        return MemoryJobStore()
+    if kind == "sqlite":
+        return SQLiteJobStore(sqlite_path)
+    if kind == "mongo":
+        if not mongo_url:
+            raise ValueError("JOB_STORE=mongo requires MONGO_URL")
+        return MongoJobStore(mongo_url, mongo_db)
+    raise ValueError(f"Unknown job store: {kind}")
@@ -0,0 +1,326 @@
+import asyncio
+import itertools
+import logging
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import Any, AsyncContextManager, Awaitable, Callable, Dict, List, Optional, Union
+
+from starlette.datastructures import UploadFile
+
+from job_store import FINISHED_STATUSES, Job, JobStore
+from uploads import OversizedImage, iter_upload_images
+
+logger = logging.getLogger(__name__)
+
+ItemRunner = Callable[[int, str, Union[bytes, OversizedImage]], Awaitable[Dict[str, Any]]]
+
+
+class JobNotFoundError(LookupError):
+    """Raised for a job id the store does not know"""
+
+
+class JobQueueFullError(RuntimeError):
+    """Raised when max_queued jobs are already waiting"""
+
+
+class JobManager:
+    """
+    Runs submitted jobs on background workers.
+
+    Uploaded inputs are spooled under input_dir so a job outlives the request
+    that submitted it. At most `workers` jobs run at once, taken highest
+    priority first (FIFO within a priority), and each keeps at most
+    `item_parallelism` images in flight. Results are buffered and written to
+    the store in bulk every `flush_size` rows or `flush_interval` seconds.
+    Images over `max_image_bytes` are not read and reach the item runner as
+    an OversizedImage. Finished jobs and their results are deleted from the
+    store `retention` seconds after they finish (never, if None), checked
+    every `prune_interval` seconds.
+
+    When several processes share one store, only the one with `recover`
+    requeues jobs interrupted by a restart, and `poll_cancellation` makes a
+    running job check the store at every flush for a cancel made through
+    another process.
+
+    `item_runner(job)` is an async context manager yielding the coroutine
+    function that analyses one image; it is entered once per job, so the job
+    can pin its model for its whole run.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        item_runner: Callable[[Job], AsyncContextManager[ItemRunner]],
+        input_dir: str,
+        workers: int = 2,
+        item_parallelism: int = 4,
+        max_queued: int = 100,
+        flush_size: int = 64,
+        flush_interval: float = 1.0,
+        max_image_bytes: Optional[int] = None,
+        recover: bool = True,
+        poll_cancellation: bool = False,
+        retention: Optional[float] = None,
+        prune_interval: float = 60.0,
+    ):
+        self.store = store
+        self.item_runner = item_runner
+        self.input_dir = Path(input_dir)
+        self.workers = workers
+        self.item_parallelism = item_parallelism
+        self.max_queued = max_queued
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_image_bytes = max_image_bytes
+        self.recover = recover
+        self.poll_cancellation = poll_cancellation
+        self.retention = retention
+        self.prune_interval = prune_interval
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._order = itertools.count()
+        self._workers: List[asyncio.Task] = []
+        self._running: Dict[str, asyncio.Task] = {}
+        self._cancelled: set = set()
+        self._updates: Dict[str, asyncio.Event] = {}
+        self._pruner: Optional[asyncio.Task] = None
+        self.completed = 0
+        self.pruned = 0
+
+    async def start(self):
+        self._queue = asyncio.PriorityQueue()
+        self.input_dir.mkdir(parents=True, exist_ok=True)
+        await self.store.open()
+        if self.recover:
+            await self._recover()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        if self.retention is not None:
+            self._pruner = asyncio.create_task(self._prune_loop())
+        logger.info(f"Job manager started with {self.workers} workers")
+
+    async def stop(self):
+        """Stop the workers; interrupted jobs are picked up again by the next start()"""
+        tasks = self._workers + ([self._pruner] if self._pruner is not None else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers, self._pruner = [], None
+        await self.store.close()
+
+    async def _recover(self):
+        """Requeue jobs left queued or running by a previous process"""
+        for job in await self.store.list_jobs(("queued", "running"), limit=self.max_queued * 10):
+            if not self._inputs(job.id).is_dir():
+                job.status, job.error, job.finished_at = "failed", "Inputs lost on restart", time.time()
+                await self.store.save_job(job)
+                continue
+            if job.status == "running":
+                # Start over; results are keyed by seq so the rerun overwrites them
+                await self.store.delete_results(job.id)
+                job.status, job.started_at, job.processed, job.failed = "queued", None, 0, 0
+                await self.store.save_job(job)
+            self._enqueue(job)
+            logger.info(f"Requeued job {job.id}")
+
+    async def prune(self) -> int:
+        """Delete finished jobs older than the retention period, with their results"""
+        pruned = await self.store.prune_finished(time.time() - self.retention)
+        if pruned:
+            self.pruned += pruned
+            logger.info(f"Pruned {pruned} finished jobs older than {self.retention:.0f}s")
+        return pruned
+
+    async def _prune_loop(self):
+        while True:
+            try:
+                await self.prune()
+            except Exception as e:
+                logger.error(f"Could not prune finished jobs: {str(e)}")
+            await asyncio.sleep(self.prune_interval)
+
+    def _inputs(self, job_id: str) -> Path:
+        return self.input_dir / job_id
+
+    def _enqueue(self, job: Job):
+        # PriorityQueue pops the smallest entry: highest priority, then oldest
+        self._queue.put_nowait((-job.priority, next(self._order), job.id))
+
+    def _spool_inputs(self, job_id: str, uploads: List[UploadFile]):
+        directory = self._inputs(job_id)
+        directory.mkdir(parents=True)
+        for position, upload in enumerate(uploads):
+            name = Path(upload.filename or "image").name
+            with open(directory / f"{position:05d}_{name}", "wb") as out:
+                upload.file.seek(0)
+                shutil.copyfileobj(upload.file, out, 1024 * 1024)
+
+    async def submit(self, uploads: List[UploadFile], priority: int = 0, model: Optional[str] = None,
+                     options: Optional[Dict[str, Any]] = None) -> Job:
+        """Spool the uploads to disk and queue a job for them"""
+        if self._queue.qsize() >= self.max_queued:
+            raise JobQueueFullError(f"{self.max_queued} jobs are already queued")
+        job = Job(id=uuid.uuid4().hex, priority=priority, model=model, options=options or {})
+        try:
+            await asyncio.to_thread(self._spool_inputs, job.id, uploads)
+        except BaseException:
+            await asyncio.to_thread(shutil.rmtree, self._inputs(job.id), True)
+            raise
+        await self.store.save_job(job)
+        self._enqueue(job)
+        return job
+
+    async def get(self, job_id: str) -> Job:
+        job = await self.store.get_job(job_id)
+        if job is None:
+            raise JobNotFoundError(f"Job {job_id} not found")
+        return job
+
+    async def list(self, statuses: Optional[List[str]] = None, limit: int = 100) -> List[Job]:
+        return await self.store.list_jobs(statuses, limit)
+
+    async def results(self, job_id: str, start: int = 0, limit: int = 1000) -> List[Dict[str, Any]]:
+        return await self.store.get_results(job_id, start, limit)
+
+    def updates(self, job_id: str) -> asyncio.Event:
+        """Event set the next time the job flushes results or changes status"""
+        return self._updates.setdefault(job_id, asyncio.Event())
+
+    def _notify(self, job_id: str):
+        event = self._updates.pop(job_id, None)
+        if event is not None:
+            event.set()
+
+    async def cancel(self, job_id: str) -> Job:
+        """
+        Cancel a queued or running job. Results already written are kept.
+        Raises ValueError if the job has already finished.
+        """
+        job = await self.get(job_id)
+        if job.finished:
+            raise ValueError(f"Job {job_id} already {job.status}")
+        task = self._running.get(job_id)
+        if task is not None:
+            self._cancelled.add(job_id)
+            task.cancel()
+            await asyncio.wait([task])
+            return await self.get(job_id)
+        # Still queued, and the worker skips it when it comes up, or running
+        # in another process sharing the store, which stops at its next flush
+        job.status, job.finished_at = "cancelled", time.time()
+        await self.store.save_job(job)
+        await asyncio.to_thread(shutil.rmtree, self._inputs(job_id), True)
+        self._notify(job_id)
+        return job
+
+    async def _worker(self):
+        while True:
+            _, _, job_id = await self._queue.get()
+            job = await self.store.get_job(job_id)
+            if job is None or job.status != "queued":
+                continue
+            task = asyncio.create_task(self._run(job))
+            self._running[job_id] = task
+            try:
+                # wait() rather than await, so cancelling this job does not
+                # stop the worker and stopping the worker stops the job
+                await asyncio.wait([task])
+            except asyncio.CancelledError:
+                task.cancel()
+                await asyncio.wait([task])
+                raise
+            finally:
+                self._running.pop(job_id, None)
+                self._cancelled.discard(job_id)
+
+    async def _run(self, job: Job):
+        job.status, job.started_at = "running", time.time()
+        await self.store.save_job(job)
+        self._notify(job.id)
+        logger.info(f"Job {job.id} started (priority {job.priority})")
+
+        buffered: List[Dict[str, Any]] = []
+        last_flush = time.monotonic()
+
+        async def flush():
+            nonlocal buffered, last_flush
+            rows, buffered = buffered, []
+            last_flush = time.monotonic()
+            if rows:
+                await self.store.add_results(job.id, rows)
+            await self.store.save_job(job)
+            self._notify(job.id)
+
+        files = []
+        pending = set()
+        try:
+            files = [UploadFile(file=open(path, "rb"), filename=path.name.split("_", 1)[1])
+                     for path in sorted(self._inputs(job.id).iterdir())]
+            source = iter_upload_images(files, self.max_image_bytes)
+            index = 0
+            exhausted = False
+            async with self.item_runner(job) as run_item:
+                while True:
+                    while not exhausted and len(pending) < self.item_parallelism:
+                        item = await asyncio.to_thread(next, source, None)
+                        if item is None:
+                            exhausted = True
+                            break
+                        filename, data = item
+                        pending.add(asyncio.create_task(run_item(index, filename, data)))
+                        index += 1
+                    if not pending:
+                        break
+                    done, pending = await asyncio.wait(pending, timeout=self.flush_interval,
+                                                       return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        result = task.result()
+                        buffered.append({"seq": job.processed, **result})
+                        job.processed += 1
+                        if not result.get("success", True):
+                            job.failed += 1
+                    if len(buffered) >= self.flush_size or time.monotonic() - last_flush >= self.flush_interval:
+                        # Checked before the flush overwrites the stored status
+                        if self.poll_cancellation and await self._cancelled_elsewhere(job.id):
+                            self._cancelled.add(job.id)
+                            raise asyncio.CancelledError
+                        await flush()
+            job.status, job.total = "succeeded", job.processed
+        except asyncio.CancelledError:
+            # Cancelled by the client, or the manager is stopping and the
+            # job will be requeued by the next start()
+            job.status = "cancelled" if job.id in self._cancelled else "running"
+            if job.status == "running":
+                raise
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {str(e)}")
+            job.status, job.error = "failed", str(e)
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            for upload in files:
+                upload.file.close()
+            if job.status in FINISHED_STATUSES:
+                job.finished_at = time.time()
+                self.completed += 1
+                # Shielded so the final state is recorded even while cancelling
+                await asyncio.shield(flush())
+                await asyncio.to_thread(shutil.rmtree, self._inputs(job.id), True)
+                logger.info(f"Job {job.id} {job.status}: {job.processed} images, {job.failed} failed")
+
+    async def _cancelled_elsewhere(self, job_id: str) -> bool:
+        stored = await self.store.get_job(job_id)
+        return stored is not None and stored.status == "cancelled"
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "item_parallelism": self.item_parallelism,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "max_queued": self.max_queued,
+            "running": sorted(self._running),
+            "completed": self.completed,
+            "retention": self.retention,
+            "pruned": self.pruned,
+        }
@@ -0,0 +1,224 @@
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds, from 0.1 ms to 10 s
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+STAGES = ("upload_read", "decode", "preprocess", "inference", "postprocess", "serialize")
+
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is a bisect and two increments under a lock"""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def snapshot(self) -> Tuple[List[int], float, int]:
+        """Cumulative bucket counts, sum and total count"""
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        cumulative, running = [], 0
+        for count in counts:
+            running += count
+            cumulative.append(running)
+        return cumulative, total, running
+
+
+class _Stage:
+    __slots__ = ("timings", "name", "started")
+
+    def __init__(self, timings: "RequestTimings", name: str):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timings.record(self.name, time.perf_counter() - self.started)
+        return False
+
+
+class RequestTimings:
+    """
+    Stage durations for one request. Recorded from any thread under a lock:
+    tiled and batched requests time their stages on several workers at once.
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def stage(self, name: str) -> _Stage:
+        return _Stage(self, name)
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def snapshot(self) -> Dict[str, float]:
+        """A consistent copy of the stage durations so far"""
+        with self._lock:
+            return dict(self.stages)
+
+    def server_timing(self) -> str:
+        """Server-Timing header value, durations in milliseconds"""
+        return ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.snapshot().items())
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class NullTimings:
+    """Stand-in used when metrics are disabled; every call is a no-op"""
+
+    enabled = False
+    stages: Dict[str, float] = {}
+    _stage = _NullStage()
+
+    def stage(self, name: str) -> _NullStage:
+        return self._stage
+
+    def record(self, name: str, seconds: float):
+        pass
+
+    def snapshot(self) -> Dict[str, float]:
+        return {}
+
+    def server_timing(self) -> str:
+        return ""
+
+
+NULL_TIMINGS = NullTimings()
+
+
+class MetricsRegistry:
+    """
+    Per-stage latency histograms, counters and gauge callbacks, rendered in
+    the Prometheus text exposition format.
+    """
+
+    def __init__(self, enabled: bool = True, namespace: str = "eleven11"):
+        self.enabled = enabled
+        self.namespace = namespace
+        self.stage_histograms: Dict[str, Histogram] = {stage: Histogram() for stage in STAGES}
+        self.request_histogram = Histogram()
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self._counter_help: Dict[str, str] = {}
+        self._gauges: Dict[str, Tuple[str, Callable[[], float]]] = {}
+        self._lock = threading.Lock()
+        self.in_flight = 0
+
+    def new_timings(self):
+        return RequestTimings() if self.enabled else NULL_TIMINGS
+
+    def observe_request(self, timings, total_seconds: Optional[float] = None):
+        """Fold one finished request's stage timings into the histograms"""
+        if not self.enabled:
+            return
+        for stage, seconds in timings.snapshot().items():
+            histogram = self.stage_histograms.get(stage)
+            if histogram is None:
+                histogram = self.stage_histograms.setdefault(stage, Histogram())
+            histogram.observe(seconds)
+        if total_seconds is not None:
+            self.request_histogram.observe(total_seconds)
+
+    def inc(self, name: str, value: float = 1.0, help_text: str = "", **labels: str):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+            if help_text:
+                self._counter_help.setdefault(name, help_text)
+
+    def gauge(self, name: str, help_text: str, read: Callable[[], float]):
+        """Register a gauge sampled at scrape time"""
+        self._gauges[name] = (help_text, read)
+
+    def render(self) -> str:
+        ns = self.namespace
+        lines: List[str] = []
+
+        lines.append(f"# HELP {ns}_stage_duration_seconds Time spent in each detection pipeline stage")
+        lines.append(f"# TYPE {ns}_stage_duration_seconds histogram")
+        for stage, histogram in self.stage_histograms.items():
+            lines.extend(_render_histogram(f"{ns}_stage_duration_seconds", histogram, f'stage="{stage}"'))
+
+        lines.append(f"# HELP {ns}_request_duration_seconds End-to-end detection request latency")
+        lines.append(f"# TYPE {ns}_request_duration_seconds histogram")
+        lines.extend(_render_histogram(f"{ns}_request_duration_seconds", self.request_histogram, ""))
+
+        with self._lock:
+            counters = sorted(self._counters.items())
+        seen = set()
+        for (name, labels), value in counters:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# HELP {ns}_{name} {self._counter_help.get(name, name)}")
+                lines.append(f"# TYPE {ns}_{name} counter")
+            label_text = ",".join(f'{key}="{val}"' for key, val in labels)
+            lines.append(f"{ns}_{name}{{{label_text}}} {value:g}" if label_text else f"{ns}_{name} {value:g}")
+
+        for name, (help_text, read) in self._gauges.items():
+            lines.append(f"# HELP {ns}_{name} {help_text}")
+            lines.append(f"# TYPE {ns}_{name} gauge")
+            lines.append(f"{ns}_{name} {read():g}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _render_histogram(metric: str, histogram: Histogram, labels: str) -> List[str]:
+    cumulative, total, count = histogram.snapshot()
+    prefix = f"{labels}," if labels else ""
+    lines = [
+        f'{metric}_bucket{{{prefix}le="{bound:g}"}} {cumulative[i]}' for i, bound in enumerate(histogram.buckets)
+    ]
+    lines.append(f'{metric}_bucket{{{prefix}le="+Inf"}} {count}')
+    suffix = f"{{{labels}}}" if labels else ""
+    lines.append(f"{metric}_sum{suffix} {total:.6f}")
+    lines.append(f"{metric}_count{suffix} {count}")
+    return lines
+
+
+class InFlightMiddleware:
+    """ASGI middleware tracking in-flight HTTP requests and stamping their start time"""
+
+    def __init__(self, app, registry: MetricsRegistry):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        scope.setdefault("state", {})["request_start"] = time.perf_counter()
+        self.registry.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.registry.in_flight -= 1
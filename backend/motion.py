@@ -0,0 +1,289 @@
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from detections import DetectionSet
+from metrics import NULL_TIMINGS
+from preprocess import read_image_size
+
+MOTION_DECISIONS = ("full", "partial", "skip")
+
+# Grayscale DCT-scaled JPEG decodes for the gate, largest reduction first
+_REDUCED_GRAY_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_GRAYSCALE_8),
+    (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+    (2, cv2.IMREAD_REDUCED_GRAYSCALE_2),
+)
+
+
+@dataclass(frozen=True)
+class MotionOptions:
+    """
+    Frame-difference gate for session streams. Frames are compared as
+    `gate_width`-wide blurred grayscale thumbnails; a thumbnail pixel that
+    moved by more than `pixel_delta` grey levels counts as changed.
+
+    Below `threshold` changed pixels the previous detections are reused.
+    When the changed area's bounding box covers at most `max_region_area`
+    of the frame only that box is re-detected, otherwise the whole frame
+    is. Every `full_interval` frames (0 for never) a full pass runs anyway.
+    """
+
+    threshold: float = 0.002
+    pixel_delta: int = 25
+    gate_width: int = 160
+    full_interval: int = 30
+    max_region_area: float = 0.5
+
+
+def gate_frame(data, width: int, timings=NULL_TIMINGS) -> np.ndarray:
+    """
+    Small blurred grayscale copy of an encoded image or HxWxC pixel array.
+    JPEGs are decoded straight to grayscale at reduced scale, so gating a
+    frame costs a fraction of decoding it.
+    """
+    with timings.stage("gate"):
+        if isinstance(data, np.ndarray):
+            image = data.reshape(data.shape[:2]) if data.ndim == 3 and data.shape[2] == 1 else data
+        else:
+            nparr = np.frombuffer(data, np.uint8)
+            size = read_image_size(nparr)
+            flag = cv2.IMREAD_GRAYSCALE
+            if size is not None and bytes(nparr[:2]) == b"\xff\xd8":
+                for factor, reduced_flag in _REDUCED_GRAY_FLAGS:
+                    if min(size) // factor >= width:
+                        flag = reduced_flag
+                        break
+            image = cv2.imdecode(nparr, flag)
+            if image is None:
+                raise ValueError("Could not decode image")
+
+        height = max(1, round(image.shape[0] * width / image.shape[1]))
+        small = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGRA2GRAY if small.shape[2] == 4 else cv2.COLOR_BGR2GRAY)
+        # Blur so sensor noise and compression artefacts do not register as motion
+        return cv2.GaussianBlur(small, (5, 5), 0)
+
+
+def changed_box(reference: np.ndarray, current: np.ndarray, options: MotionOptions
+                ) -> Tuple[float, Optional[np.ndarray]]:
+    """
+    Fraction of gate pixels that changed, and the [x1, y1, x2, y2] box (gate
+    pixels) around them, or None when the change is under the threshold.
+    """
+    mask = (cv2.absdiff(reference, current) > options.pixel_delta).astype(np.uint8)
+    # Opening drops isolated flickering pixels so they cannot stretch the box
+    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, np.ones((3, 3), np.uint8))
+    fraction = cv2.countNonZero(mask) / mask.size
+    if fraction == 0 or fraction < options.threshold:
+        return fraction, None
+    x, y, w, h = cv2.boundingRect(mask)
+    return fraction, np.array([x, y, x + w, y + h])
+
+
+def motion_region(box: np.ndarray, gate_shape: Tuple[int, ...], image_shape: Tuple[int, ...],
+                  min_side: int, margin: float = 0.25) -> np.ndarray:
+    """
+    Scale a gate box to decoded-image pixels, pad it by `margin` of its size
+    so objects half inside it are seen whole, and grow it to at least
+    `min_side` so a small change is not blown up far beyond the scale the
+    model sees in a full frame.
+    """
+    image_h, image_w = image_shape[:2]
+    scale = np.array([image_w / gate_shape[1], image_h / gate_shape[0]] * 2)
+    x1, y1, x2, y2 = box * scale
+    pad_x = max((x2 - x1) * margin, (min_side - (x2 - x1)) / 2, 0)
+    pad_y = max((y2 - y1) * margin, (min_side - (y2 - y1)) / 2, 0)
+    return np.array([
+        max(0, int(x1 - pad_x)), max(0, int(y1 - pad_y)),
+        min(image_w, int(np.ceil(x2 + pad_x))), min(image_h, int(np.ceil(y2 + pad_y))),
+    ])
+
+
+def merge_partial(previous: DetectionSet, fresh: DetectionSet, region: np.ndarray, iou: float,
+                  max_det: int) -> DetectionSet:
+    """
+    Previous detections lying mostly outside the re-detected region (all in
+    original pixels) plus the fresh ones from inside it.
+    """
+    if len(previous):
+        boxes = previous.boxes
+        inter_w = np.clip(np.minimum(boxes[:, 2], region[2]) - np.maximum(boxes[:, 0], region[0]), 0, None)
+        inter_h = np.clip(np.minimum(boxes[:, 3], region[3]) - np.maximum(boxes[:, 1], region[1]), 0, None)
+        area = np.maximum((boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1]), 1e-6)
+        previous = previous.select(inter_w * inter_h <= 0.5 * area)
+    # Boxes cut by the region edge can duplicate retained ones
+    return DetectionSet.concatenate([previous, fresh]).nms(iou).topk(max_det)
+
+
+class MotionSession:
+    """
+    One camera stream: the reference gate frame its detections were
+    computed from, and those detections in original image pixels.
+
+    The reference only moves where inference reran, so slow changes that
+    stay under the threshold frame by frame still add up to a re-detect.
+    Frames of a session must be analysed one at a time, under `lock`.
+    """
+
+    def __init__(self, session_id: str, options: MotionOptions):
+        self.id = session_id
+        self.options = options
+        self.lock = asyncio.Lock()
+        self.reference: Optional[np.ndarray] = None
+        self.detections = DetectionSet.empty()
+        self.image_size: Optional[Tuple[int, int]] = None
+        self._source_size: Optional[Tuple[int, int]] = None
+        self._key: Optional[str] = None
+        self.since_full = 0
+        self.counts = dict.fromkeys(MOTION_DECISIONS, 0)
+        self.full_seconds = 0.0
+        self.saved_seconds = 0.0
+        self.created_at = time.time()
+        self.last_used = time.monotonic()
+
+    def decide(self, gate: np.ndarray, source_size: Optional[Tuple[int, int]], key: str
+               ) -> Tuple[str, float, Optional[np.ndarray]]:
+        """
+        How to handle the next frame: "full", "partial" or "skip", with its
+        changed fraction and, for "partial", the changed box in gate pixels.
+        `key` identifies the model and options; a new key forces a full pass.
+        """
+        self.last_used = time.monotonic()
+        if (self.reference is None or self.reference.shape != gate.shape or key != self._key
+                or source_size != self._source_size):
+            return "full", 1.0, None
+        fraction, box = changed_box(self.reference, gate, self.options)
+        if self.options.full_interval and self.since_full + 1 >= self.options.full_interval:
+            return "full", fraction, None
+        if box is None:
+            return "skip", fraction, None
+        if (box[2] - box[0]) * (box[3] - box[1]) > self.options.max_region_area * gate.size:
+            return "full", fraction, None
+        return "partial", fraction, box
+
+    def record_full(self, gate: np.ndarray, detections: DetectionSet, image_size: Tuple[int, int],
+                    source_size: Optional[Tuple[int, int]], key: str, seconds: float):
+        self.counts["full"] += 1
+        self.reference, self.detections, self.image_size = gate, detections, image_size
+        self._source_size, self._key = source_size, key
+        self.since_full = 0
+        # Smoothed cost of a full pass, the yardstick for what gating saves
+        self.full_seconds = seconds if not self.full_seconds else 0.8 * self.full_seconds + 0.2 * seconds
+
+    def record_partial(self, gate: np.ndarray, box: np.ndarray, detections: DetectionSet, seconds: float):
+        self.counts["partial"] += 1
+        x1, y1, x2, y2 = (int(v) for v in box)
+        self.reference[y1:y2, x1:x2] = gate[y1:y2, x1:x2]
+        self.detections = detections
+        self.since_full += 1
+        self.saved_seconds += self.full_seconds - seconds
+
+    def record_skip(self, seconds: float):
+        self.counts["skip"] += 1
+        self.since_full += 1
+        self.saved_seconds += self.full_seconds - seconds
+
+    @property
+    def frames(self) -> int:
+        return sum(self.counts.values())
+
+    def as_dict(self) -> Dict[str, Any]:
+        frames = self.frames
+        return {
+            "id": self.id,
+            "frames": frames,
+            **self.counts,
+            "skip_ratio": round(self.counts["skip"] / frames, 4) if frames else 0.0,
+            "frames_since_full": self.since_full,
+            "full_pass_ms": round(self.full_seconds * 1000, 3),
+            "estimated_saved_s": round(self.saved_seconds, 3),
+            "detections": len(self.detections),
+            "idle_s": round(time.monotonic() - self.last_used, 3),
+        }
+
+
+class MotionSessions:
+    """
+    Sessions by client-chosen id. Idle sessions expire after ttl_seconds and
+    the least recently used are evicted beyond max_sessions.
+    """
+
+    def __init__(self, options: MotionOptions, max_sessions: int = 256, ttl_seconds: float = 300):
+        self.options = options
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._sessions: "OrderedDict[str, MotionSession]" = OrderedDict()
+        # Totals of sessions that are gone, so the stats stay cumulative
+        self._retired_counts = dict.fromkeys(MOTION_DECISIONS, 0)
+        self._retired_saved = 0.0
+        self.created = 0
+        self.evicted = 0
+
+    def get_or_create(self, session_id: str) -> MotionSession:
+        self._expire()
+        session = self._sessions.pop(session_id, None)
+        if session is None:
+            session = MotionSession(session_id, self.options)
+            self.created += 1
+        self._sessions[session_id] = session
+        while len(self._sessions) > self.max_sessions:
+            self._retire(self._sessions.popitem(last=False)[1])
+            self.evicted += 1
+        return session
+
+    def get(self, session_id: str) -> Optional[MotionSession]:
+        self._expire()
+        return self._sessions.get(session_id)
+
+    def remove(self, session_id: str) -> bool:
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            self._retire(session)
+        return session is not None
+
+    def sessions(self):
+        self._expire()
+        return list(self._sessions.values())
+
+    def _expire(self):
+        if not self.ttl_seconds:
+            return
+        cutoff = time.monotonic() - self.ttl_seconds
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if session.last_used >= cutoff:
+                break
+            self._retire(self._sessions.popitem(last=False)[1])
+            self.evicted += 1
+
+    def _retire(self, session: MotionSession):
+        for decision, count in session.counts.items():
+            self._retired_counts[decision] += count
+        self._retired_saved += session.saved_seconds
+
+    def stats(self) -> Dict[str, Any]:
+        live = self.sessions()
+        counts = dict(self._retired_counts)
+        for session in live:
+            for decision, count in session.counts.items():
+                counts[decision] += count
+        frames = sum(counts.values())
+        return {
+            "active": len(live),
+            "max_sessions": self.max_sessions,
+            "created": self.created,
+            "evicted": self.evicted,
+            "frames": frames,
+            **counts,
+            "skip_ratio": round(counts["skip"] / frames, 4) if frames else 0.0,
+            "estimated_saved_s": round(self._retired_saved + sum(s.saved_seconds for s in live), 3),
+            "threshold": self.options.threshold,
+            "full_interval": self.options.full_interval,
+        }
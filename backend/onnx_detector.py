@@ -0,0 +1,213 @@
+import ast
+import hashlib
+import logging
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from detections import DetectionSet
+from detector import CLASS_NAMES, Detector
+
+logger = logging.getLogger(__name__)
+
+try:
+    import onnxruntime as ort
+except ImportError:  # pragma: no cover - optional backend
+    ort = None
+
+# Thread counts for every ONNX Runtime session; 0 lets the runtime decide
+# (one intra-op thread per physical core). Keep intra-op threads times
+# concurrently running batches at or under the core count.
+ONNX_INTRA_OP_THREADS = int(os.environ.get("ONNX_INTRA_OP_THREADS", 0))
+ONNX_INTER_OP_THREADS = int(os.environ.get("ONNX_INTER_OP_THREADS", 0))
+# Candidates scoring below this are dropped before postprocessing
+ONNX_MIN_SCORE = float(os.environ.get("ONNX_MIN_SCORE", 0.001))
+# Where int8 models are cached; next to their source model if unset
+ONNX_QUANTIZED_DIR = os.environ.get("ONNX_QUANTIZED_DIR")
+
+PRECISIONS = ("fp32", "int8")
+
+# Sessions by (path, intra, inter) so detectors unpickled in worker
+# processes load each model once per process, not once per batch
+_sessions: Dict[Tuple[str, int, int], Any] = {}
+
+
+def quantize_int8(source: Path, directory: Optional[str] = ONNX_QUANTIZED_DIR) -> Path:
+    """
+    Dynamically quantize a model's weights to int8, caching the result as
+    <name>.int8.onnx next to it (or in `directory`) until the source
+    changes. Activations stay float and are quantized on the fly, so no
+    calibration data is needed.
+    """
+    if directory is None:
+        target = source.with_suffix(".int8.onnx")
+    else:
+        # Models from different directories may share a name
+        digest = hashlib.blake2b(str(source.resolve()).encode(), digest_size=4).hexdigest()
+        target = Path(directory) / f"{source.stem}-{digest}.int8.onnx"
+    if target.exists() and target.stat().st_mtime >= source.stat().st_mtime:
+        return target
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    logger.info(f"Quantizing {source} to {target}")
+    try:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        # Written under a temporary name and renamed into place, so other
+        # processes (e.g. prefork inference workers quantizing at the same
+        # time) never load a half-written model
+        fd, partial = tempfile.mkstemp(prefix=f".{target.stem}.", suffix=".onnx", dir=target.parent)
+        os.close(fd)
+    except OSError as e:
+        raise ValueError(f"Cannot write the int8 model to {target.parent} ({str(e)}); set ONNX_QUANTIZED_DIR")
+    try:
+        quantize_dynamic(str(source), partial, weight_type=QuantType.QUInt8)
+        os.replace(partial, target)
+    finally:
+        if os.path.exists(partial):
+            os.unlink(partial)
+    return target
+
+
+def _session(path: str, intra_op_threads: int, inter_op_threads: int):
+    key = (path, intra_op_threads, inter_op_threads)
+    session = _sessions.get(key)
+    if session is None:
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        if inter_op_threads <= 1:
+            options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        session = _sessions.setdefault(key, ort.InferenceSession(path, options, providers=["CPUExecutionProvider"]))
+    return session
+
+
+def _static_dim(value) -> Optional[int]:
+    return value if isinstance(value, int) and value > 0 else None
+
+
+def _class_names(metadata: Dict[str, str], count: int) -> List[str]:
+    """Class names from Ultralytics-style `names` metadata, else positional names"""
+    try:
+        names = ast.literal_eval(metadata.get("names", ""))
+    except (ValueError, SyntaxError):
+        names = None
+    if isinstance(names, dict) and len(names) == count:
+        return [str(names[key]) for key in sorted(names)]
+    if isinstance(names, (list, tuple)) and len(names) == count:
+        return [str(name) for name in names]
+    if count == len(CLASS_NAMES):
+        return list(CLASS_NAMES)
+    return [f"class_{index}" for index in range(count)]
+
+
+class OnnxDetector(Detector):
+    """
+    YOLO detector on ONNX Runtime's CPU execution provider.
+
+    Accepts the usual single-output exports: YOLOv8-style (N, 4 + classes,
+    anchors) with class scores only, and YOLOv5-style (N, anchors,
+    5 + classes) with an objectness column; boxes are centre/size in input
+    pixels. The input size, class count and names are read from the model
+    (Ultralytics `names` / `imgsz` metadata where present). With
+    precision="int8" the weights are dynamically quantized at load.
+    """
+
+    name = "onnx"
+    framework = "ONNX Runtime"
+
+    def __init__(self, path: str, precision: str = "fp32", intra_op_threads: int = ONNX_INTRA_OP_THREADS,
+                 inter_op_threads: int = ONNX_INTER_OP_THREADS, min_score: float = ONNX_MIN_SCORE):
+        if ort is None:
+            raise ValueError("ONNX models require the onnxruntime package")
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision '{precision}', expected one of {', '.join(PRECISIONS)}")
+        source = Path(path)
+        if not source.is_file():
+            raise ValueError(f"ONNX model not found: {path}")
+        self.source = source
+        self.precision = precision
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.min_score = min_score
+        self.path = str(quantize_int8(source) if precision == "int8" else source)
+        self.version = source.stem if precision == "fp32" else f"{source.stem}-int8"
+
+        try:
+            session = _session(self.path, intra_op_threads, inter_op_threads)
+        except Exception as e:
+            raise ValueError(f"Could not load ONNX model {self.path}: {str(e)}")
+        model_input = session.get_inputs()[0]
+        self._input_name = model_input.name
+        metadata = session.get_modelmeta().custom_metadata_map
+        self._fixed_batch = _static_dim(model_input.shape[0])
+
+        height, width = (_static_dim(dim) for dim in model_input.shape[2:4])
+        if height is None or width is None:
+            try:
+                imgsz = ast.literal_eval(metadata.get("imgsz", ""))
+            except (ValueError, SyntaxError):
+                imgsz = 640
+            height, width = (imgsz, imgsz) if isinstance(imgsz, int) else imgsz[:2]
+        self.input_size = (int(width), int(height))
+
+        # Output layouts differ only in which axis holds the anchors, which
+        # is always the longer one; a dummy run settles dynamic shapes
+        output_shape = session.get_outputs()[0].shape
+        if not all(_static_dim(dim) for dim in output_shape[1:]):
+            output_shape = self._run(session, [np.zeros((int(height), int(width), 3), np.uint8)]).shape
+        self._anchors_last = output_shape[2] > output_shape[1]
+        channels = output_shape[1] if self._anchors_last else output_shape[2]
+        # YOLOv5-style heads (anchors first) carry an objectness column
+        self._objectness = not self._anchors_last
+        self.classes = _class_names(metadata, channels - (4 if self._anchors_last else 5))
+        logger.info(f"ONNX model {self.version} ({precision}): input {self.input_size}, "
+                    f"{len(self.classes)} classes, intra/inter threads {intra_op_threads}/{inter_op_threads}")
+
+    @property
+    def session(self):
+        # Looked up rather than held, so the detector pickles to process
+        # pool workers, which open the session once on first use
+        return _session(self.path, self.intra_op_threads, self.inter_op_threads)
+
+    def _run(self, session, images: List[np.ndarray]) -> np.ndarray:
+        # BGR uint8 HWC -> RGB float32 NCHW in [0, 1], in one pass
+        blob = cv2.dnn.blobFromImages(images, scalefactor=1 / 255, swapRB=True)
+        return session.run(None, {self._input_name: blob})[0]
+
+    def detect_batch(self, images: List[np.ndarray]) -> List[DetectionSet]:
+        session = self.session
+        chunk = self._fixed_batch or len(images)
+        outputs = []
+        for start in range(0, len(images), chunk):
+            part = images[start:start + chunk]
+            # A fixed batch dimension is filled up with copies of the last image
+            padded = part + [part[-1]] * (chunk - len(part))
+            outputs.extend(self._run(session, padded)[:len(part)])
+        return [self._decode(output) for output in outputs]
+
+    def _decode(self, output: np.ndarray) -> DetectionSet:
+        """Raw candidates of one image: best class per anchor, centre/size boxes to corners"""
+        predictions = output if self._anchors_last else output.T
+        class_scores = predictions[5:] if self._objectness else predictions[4:]
+        class_ids = class_scores.argmax(axis=0)
+        scores = np.take_along_axis(class_scores, class_ids[None], axis=0)[0]
+        if self._objectness:
+            scores = scores * predictions[4]
+        keep = scores >= self.min_score
+        cx, cy, w, h = predictions[:4, keep]
+        boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+        return DetectionSet.from_arrays(boxes, scores[keep], class_ids[keep])
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            **super().info(),
+            "precision": self.precision,
+            "intra_op_threads": self.intra_op_threads,
+            "inter_op_threads": self.inter_op_threads,
+            "providers": self.session.get_providers(),
+        }
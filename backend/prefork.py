@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Pre-fork serving for the detection API.
+
+One parent process binds the listening socket, starts INFERENCE_WORKERS
+inference processes (each loading every model in MODELS exactly once) and
+then forks FRONTEND_WORKERS HTTP front-ends that all accept on the shared
+socket. Front-ends decode and letterbox uploads straight into their own
+shared-memory frame ring; only slot indices and small result headers cross
+process boundaries, so image arrays are never pickled. Detections come back
+through the same slot.
+
+    python prefork.py --port 8001 --frontends 4 --inference-workers 4
+
+Requires the fork start method (Linux/macOS).
+
+Anything a front-end keeps in its own memory is not shared with the
+others, and a request may land on any of them:
+
+- The job API needs a shared store (JOB_STORE=sqlite or mongo); with the
+  memory store it answers 501. Front-end 0 alone requeues jobs
+  interrupted by a restart, and a cancel made through any front-end stops
+  the job at its next result flush.
+- Motion-gated sessions (`session` on /api/detect and /api/stream, and
+  /api/sessions) answer 501: each front-end would keep its own reference
+  frame.
+- Model administration (POST/DELETE /api/models, activate) answers 501;
+  the inference workers load MODELS once, so change it and restart.
+- The result cache, /api/stats and /api/metrics are per front-end. Cached
+  results stay correct, only the hit rate drops.
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+from multiprocessing import resource_tracker
+from typing import List
+
+from shared_inference import SharedFrameRing, SharedInferenceClient, inference_worker_main, install_client
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("prefork")
+
+# Process layout
+FRONTEND_WORKERS = int(os.environ.get("FRONTEND_WORKERS", 2))
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+
+# Shared frame slots per front-end; a full ring answers 503 like a full worker pool
+SHM_SLOTS_PER_FRONTEND = int(os.environ.get("SHM_SLOTS_PER_FRONTEND", 64))
+
+# Read with the same defaults as server.py
+MODEL_SPECS = [spec.strip() for spec in os.environ.get("MODELS", "mock").split(",") if spec.strip()]
+MODEL_WARMUP_RUNS = int(os.environ.get("MODEL_WARMUP_RUNS", 2))
+DETECT_MAX_BATCH = int(os.environ.get("DETECT_MAX_BATCH", 8))
+DETECT_MAX_WAIT_MS = float(os.environ.get("DETECT_MAX_WAIT_MS", 5))
+DETECT_MAX_DET = int(os.environ.get("DETECT_MAX_DET", 300))
+
+
+def _frontend_main(index: int, sock: socket.socket, client: SharedInferenceClient, log_level: str):
+    """Front-end process: serve the FastAPI app on the inherited socket"""
+    import uvicorn
+
+    install_client(client)
+    import server
+
+    config = uvicorn.Config(server.app, log_level=log_level)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--frontends", type=int, default=FRONTEND_WORKERS)
+    parser.add_argument("--inference-workers", type=int, default=INFERENCE_WORKERS)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    # Front-ends only decode and serialize, so split the cores between them
+    os.environ.setdefault("DETECT_WORKERS", str(max(2, (os.cpu_count() or 2) // args.frontends)))
+    # Warmup already happened in the inference workers; a single pass checks the path
+    os.environ.setdefault("MODEL_WARMUP_RUNS", "1")
+
+    ctx = multiprocessing.get_context("fork")
+    # Start the resource tracker before forking so every process shares it
+    # and the segments are unlinked once, by this process
+    resource_tracker.ensure_running()
+    requests = ctx.Queue()
+    responses = [ctx.Queue() for _ in range(args.frontends)]
+    ready = ctx.Queue()
+
+    inference: List[multiprocessing.Process] = []
+    ring_pipes = []
+    for index in range(args.inference_workers):
+        parent_conn, child_conn = ctx.Pipe()
+        process = ctx.Process(
+            target=inference_worker_main,
+            args=(index, MODEL_SPECS, requests, responses, ready, child_conn,
+                  DETECT_MAX_BATCH, DETECT_MAX_WAIT_MS, MODEL_WARMUP_RUNS),
+            name=f"inference-{index}",
+        )
+        process.start()
+        inference.append(process)
+        ring_pipes.append(parent_conn)
+
+    # Every worker loads the same specs; slot size comes from their input sizes
+    models = {}
+    for _ in inference:
+        _, models = ready.get()
+    frame_bytes = max(width * height * 3 for width, height in (m["input_size"] for m in models.values()))
+    rings = [SharedFrameRing(SHM_SLOTS_PER_FRONTEND, frame_bytes, DETECT_MAX_DET) for _ in range(args.frontends)]
+    for conn in ring_pipes:
+        conn.send(([(ring.name, ring.slots) for ring in rings], frame_bytes, DETECT_MAX_DET))
+    logger.info(f"{len(inference)} inference workers ready with {', '.join(m['version'] for m in models.values())}; "
+                f"{args.frontends} x {SHM_SLOTS_PER_FRONTEND} shared slots of {rings[0].stride} bytes")
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    frontends: List[multiprocessing.Process] = []
+    for index in range(args.frontends):
+        client = SharedInferenceClient(index, rings[index], requests, responses[index], models)
+        process = ctx.Process(target=_frontend_main, args=(index, sock, client, args.log_level),
+                              name=f"frontend-{index}")
+        process.start()
+        frontends.append(process)
+    logger.info(f"Serving on http://{args.host}:{args.port} with {args.frontends} front-ends")
+
+    stopping = False
+
+    def request_stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    # Any process dying takes the whole group down so a supervisor can restart it cleanly
+    while not stopping and all(p.is_alive() for p in frontends + inference):
+        time.sleep(0.5)
+    exit_code = 0 if stopping else 1
+    if not stopping:
+        dead = [p.name for p in frontends + inference if not p.is_alive()]
+        logger.error(f"Process(es) {', '.join(dead)} exited, shutting down")
+
+    for process in frontends:
+        if process.is_alive():
+            process.terminate()
+    for process in frontends:
+        process.join(timeout=10)
+    for _ in inference:
+        requests.put(None)
+    for process in inference:
+        process.join(timeout=10)
+        if process.is_alive():
+            process.terminate()
+    for ring in rings:
+        ring.close()
+        ring.unlink()
+    sock.close()
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+import logging
+import threading
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from detections import DetectionSet
+from metrics import NULL_TIMINGS
+
+logger = logging.getLogger(__name__)
+
+# Gray used by YOLO letterboxing for the padded border
+PAD_VALUE = 114
+
+# JPEG start-of-frame markers that carry the image dimensions
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+_REDUCED_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+
+def _jpeg_size(buf: memoryview) -> Optional[Tuple[int, int]]:
+    """Read (width, height) from the JPEG SOF segment without decoding"""
+    i, n = 2, len(buf)
+    while i + 9 < n:
+        if buf[i] != 0xFF:
+            return None
+        marker = buf[i + 1]
+        if marker == 0xFF:  # fill byte
+            i += 1
+            continue
+        if marker in (0x01,) or 0xD0 <= marker <= 0xD9:  # standalone markers
+            i += 2
+            continue
+        if marker in _SOF_MARKERS:
+            height = (buf[i + 5] << 8) | buf[i + 6]
+            width = (buf[i + 7] << 8) | buf[i + 8]
+            return width, height
+        i += 2 + ((buf[i + 2] << 8) | buf[i + 3])
+    return None
+
+
+def read_image_size(data) -> Optional[Tuple[int, int]]:
+    """Return (width, height) from JPEG or PNG headers, or None if unknown"""
+    buf = memoryview(data).cast("B")
+    if len(buf) >= 24 and bytes(buf[:8]) == b"\x89PNG\r\n\x1a\n":
+        return int.from_bytes(buf[16:20], "big"), int.from_bytes(buf[20:24], "big")
+    if len(buf) >= 4 and bytes(buf[:2]) == b"\xff\xd8":
+        return _jpeg_size(buf)
+    return None
+
+
+def decode_image(data, target_size: Optional[Tuple[int, int]] = None) -> Tuple[np.ndarray, Tuple[int, int]]:
+    """
+    Decode image bytes to BGR, returning (image, original (width, height)).
+
+    When target_size is given and the upload is a JPEG much larger than it,
+    decode at 1/2, 1/4 or 1/8 scale using libjpeg DCT scaling, which skips
+    most of the IDCT work and never materialises the full-resolution frame.
+    The decoded image is never smaller than target_size.
+    """
+    nparr = np.frombuffer(data, np.uint8)
+    size = read_image_size(nparr)
+    flag = cv2.IMREAD_COLOR
+    if target_size is not None and size is not None and bytes(nparr[:2]) == b"\xff\xd8":
+        width, height = size
+        for factor, reduced_flag in _REDUCED_FLAGS:
+            if width // factor >= target_size[0] and height // factor >= target_size[1]:
+                flag = reduced_flag
+                break
+
+    image = cv2.imdecode(nparr, flag)
+    if image is None:
+        # The error's traceback keeps this frame alive; don't let it pin the upload's buffer too
+        del nparr
+        raise ValueError("Could not decode image")
+
+    if size is None or flag == cv2.IMREAD_COLOR:
+        return image, (image.shape[1], image.shape[0])
+    # EXIF orientation may have rotated the decoded frame relative to the header
+    width, height = size
+    if (image.shape[1] > image.shape[0]) != (width > height) and width != height:
+        width, height = height, width
+    return image, (width, height)
+
+
+class FrameBufferPool:
+    """
+    Recycles preallocated model-input buffers.
+
+    A buffer stays checked out until inference on it has finished, so frames
+    waiting in a batch are never overwritten. When the pool is empty a new
+    buffer is allocated rather than blocking.
+    """
+
+    def __init__(self, shape: Tuple[int, ...], capacity: int = 16):
+        self.shape = shape
+        self.capacity = capacity
+        self._free: List[np.ndarray] = []
+        self._lock = threading.Lock()
+        self.allocated = 0
+
+    def acquire(self) -> np.ndarray:
+        with self._lock:
+            if self._free:
+                return self._free.pop()
+            self.allocated += 1
+        return np.empty(self.shape, dtype=np.uint8)
+
+    def release(self, buffer: np.ndarray):
+        with self._lock:
+            if len(self._free) < self.capacity:
+                self._free.append(buffer)
+
+
+@dataclass
+class PreparedFrame:
+    """A letterboxed model input plus what is needed to map boxes back"""
+
+    input: np.ndarray
+    original_size: Tuple[int, int]  # (width, height) of the uploaded image
+    scale_x: float  # model-input pixels per original pixel
+    scale_y: float
+    pad_x: int
+    pad_y: int
+    decoded: Optional[np.ndarray] = None
+
+
+def letterbox(image: np.ndarray, out: np.ndarray) -> Tuple[float, int, int]:
+    """
+    Resize image into out preserving aspect ratio, padding the remainder.
+    Returns (scale, pad_x, pad_y).
+    """
+    in_h, in_w = out.shape[:2]
+    h, w = image.shape[:2]
+    scale = min(in_w / w, in_h / h)
+    new_w, new_h = max(1, round(w * scale)), max(1, round(h * scale))
+    pad_x, pad_y = (in_w - new_w) // 2, (in_h - new_h) // 2
+
+    # Only the border needs refilling; the resized image overwrites the rest
+    out[:pad_y] = PAD_VALUE
+    out[pad_y + new_h:] = PAD_VALUE
+    out[pad_y:pad_y + new_h, :pad_x] = PAD_VALUE
+    out[pad_y:pad_y + new_h, pad_x + new_w:] = PAD_VALUE
+
+    region = out[pad_y:pad_y + new_h, pad_x:pad_x + new_w]
+    interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+    if (new_w, new_h) == (w, h):
+        region[...] = image
+    else:
+        cv2.resize(image, (new_w, new_h), dst=region, interpolation=interpolation)
+    return scale, pad_x, pad_y
+
+
+def prepare_frame(data, buffers: FrameBufferPool, keep_decoded: bool = False,
+                  reduced_decode: bool = True, timings=NULL_TIMINGS,
+                  decode_size: Optional[Tuple[int, int]] = None) -> PreparedFrame:
+    """
+    Decode at the cheapest scale that still covers the model input (and
+    decode_size, when the decoded frame is kept for more than inference),
+    then letterbox.
+    """
+    in_h, in_w = buffers.shape[:2]
+    target = (max(in_w, decode_size[0]), max(in_h, decode_size[1])) if decode_size else (in_w, in_h)
+    with timings.stage("decode"):
+        image, (width, height) = decode_image(data, target if reduced_decode else None)
+    return _letterbox_frame(image, (width, height), buffers, keep_decoded, timings)
+
+
+def to_bgr(pixels: np.ndarray) -> np.ndarray:
+    """View or convert an HxW, HxWx1, HxWx3 or HxWx4 uint8 array as 3-channel BGR"""
+    if pixels.ndim == 2 or pixels.shape[2] == 1:
+        return cv2.cvtColor(pixels.reshape(pixels.shape[:2]), cv2.COLOR_GRAY2BGR)
+    if pixels.shape[2] == 4:
+        return cv2.cvtColor(pixels, cv2.COLOR_BGRA2BGR)
+    return pixels
+
+
+def prepare_pixels(pixels: np.ndarray, buffers: FrameBufferPool, keep_decoded: bool = False,
+                   timings=NULL_TIMINGS) -> PreparedFrame:
+    """Letterbox an already-decoded frame (raw pixels from the client); there is nothing to decode"""
+    image = to_bgr(pixels)
+    return _letterbox_frame(image, (image.shape[1], image.shape[0]), buffers, keep_decoded, timings)
+
+
+def _letterbox_frame(image: np.ndarray, original_size: Tuple[int, int], buffers: FrameBufferPool,
+                     keep_decoded: bool, timings) -> PreparedFrame:
+    width, height = original_size
+    out = buffers.acquire()
+    try:
+        with timings.stage("preprocess"):
+            scale, pad_x, pad_y = letterbox(image, out)
+    except Exception:
+        buffers.release(out)
+        raise
+
+    decoded_h, decoded_w = image.shape[:2]
+    return PreparedFrame(
+        input=out,
+        original_size=(width, height),
+        scale_x=scale * decoded_w / width,
+        scale_y=scale * decoded_h / height,
+        pad_x=pad_x,
+        pad_y=pad_y,
+        decoded=image if keep_decoded else None,
+    )
+
+
+def map_detections_to_original(detections: DetectionSet, frame: PreparedFrame) -> DetectionSet:
+    """Convert boxes from model-input space to original image pixels"""
+    width, height = frame.original_size
+    boxes = detections.boxes - np.array([frame.pad_x, frame.pad_y, frame.pad_x, frame.pad_y], dtype=np.float32)
+    boxes /= np.array([frame.scale_x, frame.scale_y, frame.scale_x, frame.scale_y], dtype=np.float32)
+    np.clip(boxes, 0, np.array([width, height, width, height], dtype=np.float32), out=boxes)
+    return DetectionSet(boxes, detections.scores, detections.class_ids)
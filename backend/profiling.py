@@ -0,0 +1,307 @@
+import asyncio
+import cProfile
+import hmac
+import logging
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODES = ("sample", "cprofile")
+
+_NAME_PATTERN = re.compile(r"^[\w.-]+$")
+
+# Innermost frames of threads that are idle rather than working
+_IDLE_LEAVES = {("thread.py", "_worker"), ("selectors.py", "select"), ("threading.py", "wait")}
+
+# The profile of the request being handled, visible to the worker pool
+_current: ContextVar[Optional["RequestProfile"]] = ContextVar("request_profile", default=None)
+
+
+def current_profile() -> Optional["RequestProfile"]:
+    return _current.get()
+
+
+class StackSampler:
+    """
+    Samples the Python stack of every thread at a fixed interval, counting
+    identical stacks. The result is in the collapsed format read by
+    flamegraph.pl and speedscope, one "thread;outer;...;inner count" per line.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.counts: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        names: Dict[int, str] = {}
+        while not self._stop.wait(self.interval):
+            self.samples += 1
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in _IDLE_LEAVES:
+                    continue
+                if ident not in names:
+                    names.update((thread.ident, thread.name) for thread in threading.enumerate())
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.counts[";".join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.counts.most_common())
+
+
+class RequestProfile:
+    """
+    Profile of one request. "sample" mode samples every thread while the
+    request is in flight, so it sees the event loop and the batched
+    inference it shares with other requests. "cprofile" mode runs the
+    request's own worker pool calls (decode, letterbox, tiles, rendering)
+    under cProfile, giving exact call counts for that work alone.
+    """
+
+    def __init__(self, mode: str, reason: str, sample_interval: float):
+        self.mode = mode
+        self.reason = reason
+        self.name = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}" + \
+            (".collapsed.txt" if mode == "sample" else ".prof")
+        self._sampler = StackSampler(sample_interval) if mode == "sample" else None
+        self._profiles: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self._sampler is not None:
+            self._sampler.start()
+
+    def stop(self):
+        if self._sampler is not None:
+            self._sampler.stop()
+
+    def call(self, fn: Callable, *args) -> Any:
+        """Run fn(*args) on the calling thread, under cProfile in cprofile mode"""
+        if self.mode != "cprofile":
+            return fn(*args)
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler already owns this thread
+            return fn(*args)
+        try:
+            return fn(*args)
+        finally:
+            profile.disable()
+            with self._lock:
+                self._profiles.append(profile)
+
+    def write(self, path: Path):
+        if self._sampler is not None:
+            path.write_text(self._sampler.collapsed())
+            return
+        with self._lock:
+            profiles = list(self._profiles)
+        if not profiles:
+            path.write_text("")
+            return
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(str(path))
+
+
+class Profiler:
+    """
+    Decides which requests are profiled and keeps their profiles in a
+    bounded directory, deleting the oldest beyond max_files.
+
+    A request is profiled when it sends the configured token as
+    X-Profile-Token (optionally choosing X-Profile-Mode), or, with
+    sample_rate > 0, at random; random picks are skipped while
+    max_concurrent profiles are already running.
+    """
+
+    def __init__(self, directory: str, token: Optional[str] = None, sample_rate: float = 0.0,
+                 mode: str = "sample", max_files: int = 100, max_concurrent: int = 2,
+                 sample_interval: float = 0.005):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode '{mode}', expected one of {', '.join(PROFILE_MODES)}")
+        self.directory = Path(directory)
+        self.token = token
+        self.sample_rate = sample_rate
+        self.mode = mode
+        self.max_files = max_files
+        self.max_concurrent = max_concurrent
+        self.sample_interval = sample_interval
+        self.active = 0
+        self.captured = 0
+        self.rejected_tokens = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.token) or self.sample_rate > 0
+
+    def check_token(self, token: Optional[str]) -> bool:
+        # Compared as bytes: compare_digest rejects non-ASCII str, and header
+        # values arrive decoded as latin-1
+        return bool(self.token) and token is not None and \
+            hmac.compare_digest(token.encode("latin-1", "replace"), self.token.encode())
+
+    def begin(self, token: Optional[str], mode: Optional[str]) -> Optional[RequestProfile]:
+        """Start a profile for a request, or return None if it is not profiled"""
+        if token is not None:
+            if not self.check_token(token):
+                self.rejected_tokens += 1
+                logger.warning("Ignoring X-Profile-Token that does not match PROFILE_TOKEN")
+                return None
+            reason = "requested"
+        elif self.sample_rate > 0 and self.active < self.max_concurrent and random.random() < self.sample_rate:
+            reason, mode = "sampled", None
+        else:
+            return None
+        profile = RequestProfile(mode if mode in PROFILE_MODES else self.mode, reason, self.sample_interval)
+        self.active += 1
+        profile.start()
+        return profile
+
+    async def finish(self, profile: RequestProfile):
+        """Stop a profile and write it out off the event loop"""
+        self.active -= 1
+        try:
+            await asyncio.to_thread(self._save, profile)
+            self.captured += 1
+        except OSError as e:
+            logger.error(f"Could not save profile {profile.name}: {str(e)}")
+
+    def _save(self, profile: RequestProfile):
+        profile.stop()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        profile.write(self.directory / profile.name)
+        logger.info(f"Saved {profile.reason} {profile.mode} profile {profile.name}")
+        files = sorted(self.directory.iterdir(), key=lambda path: path.stat().st_mtime)
+        for path in files[:max(0, len(files) - self.max_files)]:
+            path.unlink(missing_ok=True)
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Stored profiles, newest first"""
+        if not self.directory.is_dir():
+            return []
+        files = sorted(self.directory.iterdir(), key=lambda path: path.stat().st_mtime, reverse=True)
+        return [{"name": path.name, "bytes": path.stat().st_size, "created_at": path.stat().st_mtime}
+                for path in files]
+
+    def path(self, name: str) -> Optional[Path]:
+        """Path of a stored profile; names are checked so nothing outside the directory is served"""
+        if not _NAME_PATTERN.match(name):
+            return None
+        path = self.directory / name
+        return path if path.is_file() else None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "mode": self.mode,
+            "sample_rate": self.sample_rate,
+            "active": self.active,
+            "captured": self.captured,
+            "rejected_tokens": self.rejected_tokens,
+            "stored": len(self.list()),
+            "max_files": self.max_files,
+        }
+
+
+class SlowRequestLog:
+    """The last `window` requests' durations and stage breakdowns, for finding the slowest"""
+
+    def __init__(self, window: int = 1000):
+        self._records: Deque[Dict[str, Any]] = deque(maxlen=window)
+
+    def record(self, method: str, path: str, status: int, seconds: float, stages: Dict[str, float],
+               profile: Optional[str] = None):
+        self._records.append({
+            "at": time.time(),
+            "method": method,
+            "path": path,
+            "status": status,
+            "duration_ms": round(seconds * 1000, 3),
+            "stages_ms": {name: round(value * 1000, 3) for name, value in stages.items()},
+            "profile": profile,
+        })
+
+    def slowest(self, limit: int = 20) -> List[Dict[str, Any]]:
+        return sorted(self._records, key=lambda record: record["duration_ms"], reverse=True)[:limit]
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware for the detection endpoints: profiles opted-in requests
+    (their response carries X-Profile-Id) and logs every request's duration
+    with the stage timings the endpoint left in the request state.
+    """
+
+    def __init__(self, app, profiler: Profiler, slow_log: SlowRequestLog, path_prefix: str = "/api/detect"):
+        self.app = app
+        self.profiler = profiler
+        self.slow_log = slow_log
+        self.path_prefix = path_prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefix):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        token = headers.get(b"x-profile-token")
+        mode = headers.get(b"x-profile-mode")
+        profile = self.profiler.begin(token.decode("latin-1") if token is not None else None,
+                                      mode.decode("latin-1") if mode is not None else None)
+        status = 500
+
+        async def send_with_profile_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if profile is not None:
+                    message["headers"] = [*message.get("headers", []), (b"x-profile-id", profile.name.encode())]
+            await send(message)
+
+        started = time.perf_counter()
+        # Current for the endpoint and everything it awaits
+        context = _current.set(profile)
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            _current.reset(context)
+            seconds = time.perf_counter() - started
+            if profile is not None:
+                await self.profiler.finish(profile)
+            timings = scope.get("state", {}).get("timings")
+            self.slow_log.record(scope["method"], scope["path"], status, seconds,
+                                 timings.snapshot() if timings is not None else {},
+                                 profile.name if profile is not None else None)
@@ -0,0 +1,275 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+
+from batching import BatchScheduler
+from detector import Detector
+from worker_pool import WorkerPool
+
+logger = logging.getLogger(__name__)
+
+
+class ModelNotFoundError(LookupError):
+    """Raised when a request names a model version that is not loaded"""
+
+
+class ModelHandle:
+    """
+    One resident model: its detector, its own batch scheduler and a count of
+    requests currently using it.
+    """
+
+    def __init__(self, spec: str, detector: Detector, scheduler: BatchScheduler):
+        self.spec = spec
+        self.detector = detector
+        self.scheduler = scheduler
+        self.state = "loading"
+        self.loaded_at = time.time()
+        self.load_seconds = 0.0
+        self.warmup_seconds = 0.0
+        self.active = 0
+        self.served = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    @property
+    def version(self) -> str:
+        return self.detector.version
+
+    def _enter(self):
+        self.active += 1
+        self.served += 1
+        self._idle.clear()
+
+    def _exit(self):
+        self.active -= 1
+        if self.active == 0:
+            self._idle.set()
+
+    async def drained(self):
+        await self._idle.wait()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "spec": self.spec,
+            "state": self.state,
+            "active_requests": self.active,
+            "served": self.served,
+            "load_ms": round(self.load_seconds * 1000, 2),
+            "warmup_ms": round(self.warmup_seconds * 1000, 2),
+            "batching": self.scheduler.stats(),
+        }
+
+
+class ModelRegistry:
+    """
+    Loads, warms up and serves several model versions side by side.
+
+    Every model gets its own scheduler (a BatchScheduler on the shared worker
+    pool unless scheduler_factory says otherwise).
+    Requests pin a model with acquire() for as long as they use it, so
+    switching the default with set_default() is a single reference swap:
+    new requests see the new model immediately while in-flight ones finish
+    on the model they started with. unload() waits for those to drain.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[str], Detector],
+        pool: WorkerPool,
+        max_batch_size: int = 8,
+        max_wait_ms: float = 5.0,
+        warmup_runs: int = 2,
+        scheduler_factory: Optional[Callable[[Detector], Any]] = None,
+    ):
+        self.factory = factory
+        self.pool = pool
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.warmup_runs = warmup_runs
+        self.scheduler_factory = scheduler_factory or self._batch_scheduler
+        self._models: Dict[str, ModelHandle] = {}
+        self._default: Optional[ModelHandle] = None
+        self._lock = asyncio.Lock()
+        # Startup loading of the configured models (load_all)
+        self._startup_specs: List[str] = []
+        self._loading: List[str] = []
+        self.started = False
+        self.startup_error: Optional[str] = None
+        self.startup_seconds = 0.0
+        self._started = asyncio.Event()
+
+    def _batch_scheduler(self, detector: Detector) -> BatchScheduler:
+        return BatchScheduler(detector, self.pool, max_batch_size=self.max_batch_size, max_wait_ms=self.max_wait_ms)
+
+    @property
+    def default(self) -> ModelHandle:
+        if self._default is None:
+            raise ModelNotFoundError("No model is loaded")
+        return self._default
+
+    @property
+    def ready(self) -> bool:
+        """
+        True once a default model is loaded and warm. Other models loading
+        or warming alongside it (a hot load before a swap) do not count.
+        """
+        return self._default is not None and self._default.state == "ready"
+
+    @property
+    def pending(self) -> List[str]:
+        """Specs not yet ready: startup models still to load, and any load in progress"""
+        return self._startup_specs + [spec for spec in self._loading if spec not in self._startup_specs]
+
+    def load_all(self, specs: List[str]) -> Awaitable[None]:
+        """
+        Load and warm the configured models in order, the first becoming the
+        default. They count as pending from this call, before the returned
+        coroutine first runs. `started` turns True (and wait_started()
+        returns) once they are all ready or one of them failed.
+        """
+        self._startup_specs = list(specs)
+        return self._load_all(specs)
+
+    async def _load_all(self, specs: List[str]):
+        began = time.perf_counter()
+        try:
+            for spec in specs:
+                await self.load(spec)
+                self._startup_specs.remove(spec)
+        except Exception as e:
+            self.startup_error = f"Loading '{self._startup_specs[0]}' failed: {str(e)}"
+            raise
+        finally:
+            self.started = True
+            self.startup_seconds = time.perf_counter() - began
+            self._started.set()
+
+    async def wait_started(self, timeout: Optional[float] = None) -> bool:
+        """Wait for startup loading to finish; False if it is still running after timeout"""
+        if self.started:
+            return True
+        try:
+            await asyncio.wait_for(self._started.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def versions(self) -> List[str]:
+        return list(self._models)
+
+    def handles(self) -> List[ModelHandle]:
+        return list(self._models.values())
+
+    def get(self, version: Optional[str] = None) -> ModelHandle:
+        if version is None:
+            return self.default
+        handle = self._models.get(version)
+        if handle is None or handle.state != "ready":
+            raise ModelNotFoundError(f"Model '{version}' is not loaded; available: {', '.join(self._models)}")
+        return handle
+
+    @asynccontextmanager
+    async def acquire(self, version: Optional[str] = None) -> AsyncIterator[ModelHandle]:
+        """Pin a model (the default if version is None) for the duration of a request"""
+        handle = self.get(version)
+        handle._enter()
+        try:
+            yield handle
+        finally:
+            handle._exit()
+
+    async def load(self, spec: str, make_default: bool = False) -> ModelHandle:
+        """Construct a detector from its spec, start its scheduler and warm it up"""
+        self._loading.append(spec)
+        try:
+            return await self._load(spec, make_default)
+        finally:
+            self._loading.remove(spec)
+
+    async def _load(self, spec: str, make_default: bool) -> ModelHandle:
+        async with self._lock:
+            started = time.perf_counter()
+            detector = await asyncio.to_thread(self.factory, spec)
+            if detector.version in self._models:
+                raise ValueError(f"Model '{detector.version}' is already loaded")
+            scheduler = self.scheduler_factory(detector)
+            handle = ModelHandle(spec, detector, scheduler)
+            handle.load_seconds = time.perf_counter() - started
+            self._models[handle.version] = handle
+            try:
+                await scheduler.start()
+                handle.state = "warming"
+                await self._warmup(handle)
+            except BaseException:
+                del self._models[handle.version]
+                await scheduler.stop()
+                raise
+            handle.state = "ready"
+            logger.info(f"Loaded model {handle.version} from '{spec}' in {handle.load_seconds:.3f}s, "
+                        f"warmed up in {handle.warmup_seconds:.3f}s")
+            if make_default or self._default is None:
+                self._set_default(handle)
+            return handle
+
+    async def _warmup(self, handle: ModelHandle):
+        """
+        Push dummy frames through the model's scheduler, alone and as a full
+        batch, before serving traffic, so the whole inference path is warm.
+        """
+        width, height = handle.detector.input_size
+        image = np.zeros((height, width, 3), dtype=np.uint8)
+        started = time.perf_counter()
+        for _ in range(self.warmup_runs):
+            for size in sorted({1, self.max_batch_size}):
+                await asyncio.gather(*(handle.scheduler.detect(image) for _ in range(size)))
+        handle.warmup_seconds = time.perf_counter() - started
+
+    def set_default(self, version: str) -> ModelHandle:
+        """Atomically route new requests without an explicit model to `version`"""
+        handle = self.get(version)
+        self._set_default(handle)
+        return handle
+
+    def _set_default(self, handle: ModelHandle):
+        previous = self._default
+        self._default = handle
+        if previous is not None and previous is not handle:
+            logger.info(f"Default model switched {previous.version} -> {handle.version} "
+                        f"({previous.active} requests still on {previous.version})")
+
+    async def unload(self, version: str, timeout: Optional[float] = None):
+        """Stop routing to a model, wait for its in-flight requests, then stop it"""
+        async with self._lock:
+            handle = self.get(version)
+            if handle is self._default:
+                raise ValueError(f"Model '{version}' is the default; switch the default before unloading it")
+            handle.state = "draining"
+            del self._models[version]
+        try:
+            await asyncio.wait_for(handle.drained(), timeout)
+        finally:
+            await handle.scheduler.stop()
+            handle.state = "unloaded"
+            logger.info(f"Unloaded model {version}")
+
+    async def stop(self):
+        for handle in list(self._models.values()):
+            await handle.scheduler.stop()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "default": self._default.version if self._default is not None else None,
+            "ready": self.ready,
+            "startup": {
+                "started": self.started,
+                "pending": list(self.pending),
+                "error": self.startup_error,
+                "seconds": round(self.startup_seconds, 3),
+            },
+            "models": {version: handle.stats() for version, handle in self._models.items()},
+        }
@@ -0,0 +1,22 @@
+from pydantic import BaseModel
+from typing import List, Optional
+
+# Data models
+class BoundingBox(BaseModel):
+    x: float
+    y: float
+    width: float
+    height: float
+
+class Detection(BaseModel):
+    class_name: str
+    confidence: float
+    bbox: List[float]  # [x, y, width, height]
+
+class DetectionResponse(BaseModel):
+    success: bool
+    detections: List[Detection]
+    total_detections: int
+    processing_time: str
+    image_dimensions: Optional[List[int]] = None
+    model_version: str
@@ -0,0 +1,148 @@
+import json
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from fastapi import Response
+
+from detections import DetectionSet
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional format
+    msgpack = None
+
+JSON_MEDIA_TYPE = "application/json"
+COLUMNAR_MEDIA_TYPE = "application/vnd.eleven11.columnar+json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+
+# Accept values mapped to the format that serves them
+_MEDIA_FORMATS = {
+    "application/json": "json",
+    "application/*": "json",
+    "*/*": "json",
+    COLUMNAR_MEDIA_TYPE: "columnar",
+    MSGPACK_MEDIA_TYPE: "msgpack",
+    "application/x-msgpack": "msgpack",
+    "application/vnd.msgpack": "msgpack",
+}
+
+
+def dumps(payload: Any) -> bytes:
+    """Encode JSON with orjson when available"""
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(payload).encode()
+
+
+def negotiate_format(accept: Optional[str]) -> Optional[str]:
+    """
+    Pick 'json', 'columnar' or 'msgpack' from an Accept header by q-value.
+    A missing Accept header gets the default JSON shape; one that accepts
+    none of the formats (not even */*) gets None, for a 406.
+    """
+    if not accept:
+        return "json"
+    candidates: List[Tuple[float, int, str]] = []
+    for position, media_range in enumerate(accept.split(",")):
+        media_type, *params = [part.strip() for part in media_range.split(";")]
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        fmt = _MEDIA_FORMATS.get(media_type.lower())
+        if fmt == "msgpack" and msgpack is None:
+            continue
+        if fmt is not None and quality > 0:
+            candidates.append((-quality, position, fmt))
+    return min(candidates)[2] if candidates else None
+
+
+def detection_payload(detections: DetectionSet, class_names: Sequence[str], width: int, height: int,
+                      processing_time: float, model_version: str) -> Dict[str, Any]:
+    """
+    The DetectionResponse JSON shape built straight from trusted arrays,
+    without constructing and revalidating Pydantic models.
+    """
+    xywh = detections.boxes.copy()
+    xywh[:, 2:] -= xywh[:, :2]
+    names = _class_names(detections, class_names)
+    return {
+        "success": True,
+        "detections": [
+            {"class_name": name, "confidence": score, "bbox": box}
+            for name, score, box in zip(names, detections.scores.tolist(), xywh.tolist())
+        ],
+        "total_detections": len(detections),
+        "processing_time": f"{processing_time:.3f}s",
+        "image_dimensions": [width, height],
+        "model_version": model_version,
+    }
+
+
+def columnar_payload(detections: DetectionSet, class_names: Sequence[str], width: int, height: int,
+                     processing_time: float, model_version: str, binary: bool = False) -> Dict[str, Any]:
+    """
+    Detections as parallel columns indexed by detection. class_id indexes the
+    `classes` list. With binary=True the numeric columns are little-endian
+    float32/int32 byte strings (for msgpack) instead of JSON lists.
+    """
+    xywh = detections.boxes.copy()
+    xywh[:, 2:] -= xywh[:, :2]
+    if binary:
+        columns = {
+            "class_id": detections.class_ids.astype("<i4").tobytes(),
+            "confidence": detections.scores.astype("<f4").tobytes(),
+            "bbox": np.ascontiguousarray(xywh, dtype="<f4").tobytes(),
+        }
+    else:
+        columns = {
+            "class_id": detections.class_ids.tolist(),
+            "confidence": detections.scores.tolist(),
+            "x": xywh[:, 0].tolist(),
+            "y": xywh[:, 1].tolist(),
+            "width": xywh[:, 2].tolist(),
+            "height": xywh[:, 3].tolist(),
+        }
+    return {
+        "success": True,
+        "classes": list(class_names),
+        "detections": columns,
+        "total_detections": len(detections),
+        "processing_time": f"{processing_time:.3f}s",
+        "image_dimensions": [width, height],
+        "model_version": model_version,
+    }
+
+
+def render_detections(fmt: str, detections: DetectionSet, class_names: Sequence[str], width: int,
+                      height: int, processing_time: float, model_version: str,
+                      headers: Optional[Dict[str, str]] = None) -> Response:
+    """Serialize a detection result in the negotiated format"""
+    args = (detections, class_names, width, height, processing_time, model_version)
+    if fmt == "msgpack":
+        body = msgpack.packb(columnar_payload(*args, binary=True), use_bin_type=True)
+        media_type = MSGPACK_MEDIA_TYPE
+    elif fmt == "columnar":
+        body = dumps(columnar_payload(*args))
+        media_type = COLUMNAR_MEDIA_TYPE
+    else:
+        body = dumps(detection_payload(*args))
+        media_type = JSON_MEDIA_TYPE
+    response_headers = {"Vary": "Accept"}
+    response_headers.update(headers or {})
+    return Response(content=body, media_type=media_type, headers=response_headers)
+
+
+def _class_names(detections: DetectionSet, class_names: Sequence[str]) -> List[str]:
+    return [class_names[i] if 0 <= i < len(class_names) else str(i) for i in detections.class_ids.tolist()]
@@ -1,21 +1,152 @@
-from fastapi import FastAPI, APIRouter, File, UploadFile, HTTPException
+from fastapi import FastAPI, APIRouter, Depends, File, Header, UploadFile, HTTPException, Query, Request, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import UploadFile as StarletteUploadFile
 import cv2
 import numpy as np
 import io
-import base64
+import hashlib
 import time
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple, Union
 import logging
 from pathlib import Path
 import os
 import json
+import asyncio
+import uuid
+from contextlib import asynccontextmanager
+
+from annotate import ANNOTATED_FORMATS, AnnotateOptions, render_annotated
+from cache import ResultCache, content_key
+from detections import DetectionSet, PostprocessOptions
+from detector import create_detector
+from image_inputs import read_request_image
+from job_store import JOB_STATUSES, Job, create_job_store
+from jobs import JobManager, JobNotFoundError, JobQueueFullError
+from metrics import NULL_TIMINGS, InFlightMiddleware, MetricsRegistry
+from motion import MotionOptions, MotionSession, MotionSessions, gate_frame, merge_partial, motion_region
+from profiling import Profiler, ProfilingMiddleware, SlowRequestLog
+from preprocess import (FrameBufferPool, PreparedFrame, decode_image, map_detections_to_original, prepare_frame,
+                        prepare_pixels, read_image_size, to_bgr)
+from registry import ModelHandle, ModelNotFoundError, ModelRegistry
+from schemas import DetectionResponse
+from serialization import COLUMNAR_MEDIA_TYPE, MSGPACK_MEDIA_TYPE, detection_payload, dumps, negotiate_format, render_detections
+from shared_inference import installed_client
+from streaming import StreamStats, serve_frame_stream
+from tiling import MERGE_METHODS, TileOptions, decode_full, detect_tiled, prepare_tile
+from uploads import SNIFF_BYTES, BodySizeLimitMiddleware, OversizedImage, iter_upload_images, sniff_image_format
+from worker_pool import DeadlineExceededError, PoolSaturatedError, WorkerPool
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Worker pool configuration
+DETECT_WORKERS = int(os.environ.get("DETECT_WORKERS", os.cpu_count() or 4))
+DETECT_QUEUE_SIZE = int(os.environ.get("DETECT_QUEUE_SIZE", 32))
+DETECT_POOL_KIND = os.environ.get("DETECT_POOL_KIND", "thread")
+
+# Decode JPEGs at reduced scale when they are much larger than the model input
+DECODE_REDUCED = os.environ.get("DECODE_REDUCED", "1") not in ("0", "false", "False")
+
+# Micro-batching configuration
+DETECT_MAX_BATCH = int(os.environ.get("DETECT_MAX_BATCH", 8))
+DETECT_MAX_WAIT_MS = float(os.environ.get("DETECT_MAX_WAIT_MS", 5))
+
+# Default postprocessing applied to raw detector candidates
+DETECT_CONF = float(os.environ.get("DETECT_CONF", 0.25))
+DETECT_IOU = float(os.environ.get("DETECT_IOU", 0.45))
+DETECT_MAX_DET = int(os.environ.get("DETECT_MAX_DET", 300))
+
+# Request deadlines: clients send their remaining budget as X-Deadline-Ms,
+# otherwise DETECT_DEADLINE_MS applies (0 means no deadline)
+DETECT_DEADLINE_MS = float(os.environ.get("DETECT_DEADLINE_MS", 0))
+
+# Bulk endpoint configuration
+BATCH_MAX_PARALLELISM = int(os.environ.get("BATCH_MAX_PARALLELISM", 4))
+BATCH_MAX_FILES = int(os.environ.get("BATCH_MAX_FILES", 1000))
+
+# Largest side accepted for raw pixel bodies (application/octet-stream)
+RAW_MAX_SIDE = int(os.environ.get("RAW_MAX_SIDE", 8192))
+
+# Upload size limits, enforced while the body streams in; MAX_UPLOAD_BYTES also
+# caps each image inside a batch or job upload, archive members included
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", 25 * 1024 * 1024))
+BATCH_MAX_UPLOAD_BYTES = int(os.environ.get("BATCH_MAX_UPLOAD_BYTES", 1024 * 1024 * 1024))
+
+# Video stream configuration
+STREAM_MAX_CONNECTIONS = int(os.environ.get("STREAM_MAX_CONNECTIONS", 64))
+
+# Result cache configuration (CACHE_MAX_ENTRIES=0 disables the cache)
+CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", 1024))
+CACHE_MAX_BYTES = int(os.environ.get("CACHE_MAX_BYTES", 64 * 1024 * 1024))
+CACHE_TTL_SECONDS = float(os.environ.get("CACHE_TTL_SECONDS", 0))
+# Uploads larger than this are hashed off the event loop
+CACHE_HASH_INLINE_BYTES = 1024 * 1024
+
+# Tiled inference for large images (TILE_SIZE=0 uses the model input width)
+TILE_SIZE = int(os.environ.get("TILE_SIZE", 0))
+TILE_OVERLAP = float(os.environ.get("TILE_OVERLAP", 0.2))
+TILE_MERGE = os.environ.get("TILE_MERGE", "nms")
+TILE_MAX_TILES = int(os.environ.get("TILE_MAX_TILES", 256))
+TILE_PARALLELISM = int(os.environ.get("TILE_PARALLELISM", DETECT_MAX_BATCH * 2))
+
+# Rendered overlays from /api/detect/annotated
+ANNOTATE_MAX_DIM = int(os.environ.get("ANNOTATE_MAX_DIM", 1280))
+ANNOTATE_QUALITY = int(os.environ.get("ANNOTATE_QUALITY", 85))
+
+# Motion-gated sessions: frames sent with ?session=<id> are compared with the
+# session's reference frame and static ones reuse its detections
+MOTION_THRESHOLD = float(os.environ.get("MOTION_THRESHOLD", 0.002))
+MOTION_PIXEL_DELTA = int(os.environ.get("MOTION_PIXEL_DELTA", 25))
+MOTION_GATE_WIDTH = int(os.environ.get("MOTION_GATE_WIDTH", 160))
+MOTION_FULL_INTERVAL = int(os.environ.get("MOTION_FULL_INTERVAL", 30))
+MOTION_MAX_REGION_AREA = float(os.environ.get("MOTION_MAX_REGION_AREA", 0.5))
+MOTION_MAX_SESSIONS = int(os.environ.get("MOTION_MAX_SESSIONS", 256))
+MOTION_SESSION_TTL = float(os.environ.get("MOTION_SESSION_TTL", 300))
+
+# Models loaded at startup, as comma-separated specs; the first is the default
+MODEL_SPECS = [spec.strip() for spec in os.environ.get("MODELS", "mock").split(",") if spec.strip()]
+MODEL_WARMUP_RUNS = int(os.environ.get("MODEL_WARMUP_RUNS", 2))
+# Cold start: with MODEL_LOAD_BACKGROUND the server listens at once and loads
+# MODELS behind it, /api/ready answering 503 until they are warm. Requests
+# arriving meanwhile wait up to WARMUP_WAIT_MS (WARMUP_MODE=wait) or are
+# refused straight away with 503 (WARMUP_MODE=fail).
+MODEL_LOAD_BACKGROUND = os.environ.get("MODEL_LOAD_BACKGROUND", "1") not in ("0", "false", "False")
+WARMUP_MODE = os.environ.get("WARMUP_MODE", "wait")
+WARMUP_WAIT_MS = float(os.environ.get("WARMUP_WAIT_MS", 10000))
+# Token for the model load/activate/unload endpoints; unset disables them
+MODEL_ADMIN_TOKEN = os.environ.get("MODEL_ADMIN_TOKEN")
+
+# Background jobs (/api/jobs); JOB_STORE is memory, sqlite or mongo
+JOB_STORE = os.environ.get("JOB_STORE", "memory")
+JOB_SQLITE_PATH = os.environ.get("JOB_SQLITE_PATH", str(Path(__file__).parent / "jobs.db"))
+JOBS_DIR = os.environ.get("JOBS_DIR", str(Path(__file__).parent / "job_inputs"))
+MONGO_URL = os.environ.get("MONGO_URL")
+DB_NAME = os.environ.get("DB_NAME", "eleven11_detection")
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 2))
+JOB_ITEM_PARALLELISM = int(os.environ.get("JOB_ITEM_PARALLELISM", BATCH_MAX_PARALLELISM))
+JOB_MAX_QUEUED = int(os.environ.get("JOB_MAX_QUEUED", 100))
+JOB_FLUSH_SIZE = int(os.environ.get("JOB_FLUSH_SIZE", 64))
+# Finished jobs and their results are deleted this long after they finish (0 keeps them)
+JOB_RETENTION_SECONDS = float(os.environ.get("JOB_RETENTION_SECONDS", 7 * 24 * 3600))
+
+# Request profiling: requests to /api/detect* carrying X-Profile-Token equal
+# to PROFILE_TOKEN, plus a PROFILE_SAMPLE_RATE fraction of all of them, are
+# profiled into PROFILE_DIR (PROFILE_MODE is sample or cprofile)
+PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN")
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+PROFILE_MODE = os.environ.get("PROFILE_MODE", "sample")
+PROFILE_DIR = os.environ.get("PROFILE_DIR", str(Path(__file__).parent / "profiles"))
+PROFILE_MAX_FILES = int(os.environ.get("PROFILE_MAX_FILES", 100))
+PROFILE_SAMPLE_INTERVAL_MS = float(os.environ.get("PROFILE_SAMPLE_INTERVAL_MS", 5))
+# Recent requests kept for /api/slow-requests
+SLOW_REQUEST_WINDOW = int(os.environ.get("SLOW_REQUEST_WINDOW", 1000))
+
+# Per-stage latency histograms; METRICS_ENABLED=0 turns all timing into no-ops
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") not in ("0", "false", "False")
+
 # Create FastAPI app
 app = FastAPI(title="Eleven11 Space Safety Detection API")
 
@@ -31,146 +162,1056 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Data models
-class BoundingBox(BaseModel):
-    x: float
-    y: float
-    width: float
-    height: float
-
-class Detection(BaseModel):
-    class_name: str
-    confidence: float
-    bbox: List[float]  # [x, y, width, height]
-
-class DetectionResponse(BaseModel):
-    success: bool
-    detections: List[Detection]
-    total_detections: int
-    processing_time: str
-    image_dimensions: Optional[List[int]] = None
-    model_version: str = "YOLOv8n-space-v1.0"
-
-# Mock YOLO detection function (replace with actual model)
-def mock_yolo_detection(image: np.ndarray) -> List[Detection]:
-    """
-    Mock YOLO detection function. Replace this with actual YOLOv8 model inference.
-    """
-    height, width = image.shape[:2]
-    
-    # Mock detections with realistic bounding boxes
-    mock_detections = [
-        {
-            "class_name": "fire_extinguisher",
-            "confidence": 0.942,
-            "bbox": [int(width * 0.15), int(height * 0.25), int(width * 0.12), int(height * 0.3)]
-        },
-        {
-            "class_name": "oxygen_tank", 
-            "confidence": 0.887,
-            "bbox": [int(width * 0.65), int(height * 0.15), int(width * 0.08), int(height * 0.4)]
-        },
-        {
-            "class_name": "toolkit",
-            "confidence": 0.915,
-            "bbox": [int(width * 0.35), int(height * 0.55), int(width * 0.15), int(height * 0.2)]
-        }
-    ]
-    
-    # Randomly select 1-3 detections to simulate real scenarios
-    import random
-    num_detections = random.randint(1, 3)
-    selected_detections = random.sample(mock_detections, num_detections)
-    
-    detections = []
-    for det in selected_detections:
-        detections.append(Detection(
-            class_name=det["class_name"],
-            confidence=det["confidence"] + random.uniform(-0.1, 0.05),  # Add some variation
-            bbox=det["bbox"]
-        ))
-    
-    return detections
-
-def process_image_for_detection(image_bytes: bytes) -> np.ndarray:
-    """Process uploaded image bytes into OpenCV format"""
-    try:
-        # Convert bytes to numpy array
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        
-        # Decode image
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        if image is None:
-            raise ValueError("Could not decode image")
-            
-        return image
+# Reject oversize uploads before they are buffered
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    max_body_bytes=MAX_UPLOAD_BYTES,
+    path_limits={"/api/detect/batch": BATCH_MAX_UPLOAD_BYTES, "/api/jobs": BATCH_MAX_UPLOAD_BYTES},
+)
+
+metrics = MetricsRegistry(enabled=METRICS_ENABLED)
+if METRICS_ENABLED:
+    app.add_middleware(InFlightMiddleware, registry=metrics)
+
+# Opt-in request profiles, and the recent requests behind /api/slow-requests
+profiler = Profiler(PROFILE_DIR, token=PROFILE_TOKEN, sample_rate=PROFILE_SAMPLE_RATE, mode=PROFILE_MODE,
+                    max_files=PROFILE_MAX_FILES, sample_interval=PROFILE_SAMPLE_INTERVAL_MS / 1000)
+slow_requests = SlowRequestLog(window=SLOW_REQUEST_WINDOW)
+app.add_middleware(ProfilingMiddleware, profiler=profiler, slow_log=slow_requests)
+
+def process_image_for_detection(image_bytes: bytes, input_size: Tuple[int, int], keep_decoded: bool = False,
+                                timings=NULL_TIMINGS, decode_size: Optional[Tuple[int, int]] = None
+                                ) -> PreparedFrame:
+    """
+    Decode uploaded image bytes and letterbox them into a model input buffer.
+    Raw pixel arrays skip straight to the letterbox.
+    """
+    try:
+        if isinstance(image_bytes, np.ndarray):
+            return prepare_pixels(image_bytes, get_frame_buffers(input_size), keep_decoded, timings)
+        return prepare_frame(image_bytes, get_frame_buffers(input_size), keep_decoded=keep_decoded,
+                             reduced_decode=DECODE_REDUCED, timings=timings, decode_size=decode_size)
         
+    except PoolSaturatedError:
+        raise
     except Exception as e:
         logger.error(f"Error processing image: {str(e)}")
         raise HTTPException(status_code=400, detail=f"Error processing image: {str(e)}")
 
-@api_router.post("/detect", response_model=DetectionResponse)
-async def detect_objects(image: UploadFile = File(...)):
+# Under prefork.py, inference runs in shared worker processes fed through
+# shared memory; this process only decodes, letterboxes and serializes
+shared_client = installed_client()
+if shared_client is not None and DETECT_POOL_KIND == "process":
+    logger.warning("DETECT_POOL_KIND=process is ignored under prefork serving, using threads")
+    DETECT_POOL_KIND = "thread"
+
+def refuse_under_prefork(feature: str, hint: str = ""):
     """
-    Detect space safety equipment in uploaded image using YOLOv8 model
+    Motion sessions, model administration and jobs on the memory store keep
+    their state in this process. Under prefork serving every front-end holds
+    its own copy and answers would depend on which one accepted the
+    connection, so these are refused there instead.
     """
+    if shared_client is not None:
+        raise HTTPException(status_code=501, detail=f"{feature} is unavailable under prefork serving{hint}")
+
+# Decode and inference run here so they never block the event loop
+worker_pool = WorkerPool(max_workers=DETECT_WORKERS, max_queue=DETECT_QUEUE_SIZE, kind=DETECT_POOL_KIND)
+
+# Resident models, each with its own batch scheduler (loaded on startup)
+model_registry = ModelRegistry(
+    shared_client.create_detector if shared_client else create_detector,
+    worker_pool,
+    max_batch_size=DETECT_MAX_BATCH,
+    max_wait_ms=DETECT_MAX_WAIT_MS,
+    warmup_runs=MODEL_WARMUP_RUNS,
+    scheduler_factory=shared_client.scheduler if shared_client else None,
+)
+
+# Reusable letterbox buffers, one pool per model input size (shared-memory
+# slots under prefork serving)
+_frame_buffer_pools: Dict[Tuple[int, int], FrameBufferPool] = {}
+
+def get_frame_buffers(input_size: Tuple[int, int]) -> FrameBufferPool:
+    buffers = _frame_buffer_pools.get(input_size)
+    if buffers is None:
+        if shared_client is not None:
+            buffers = shared_client.buffers(input_size)
+        else:
+            buffers = FrameBufferPool((input_size[1], input_size[0], 3),
+                                      capacity=DETECT_MAX_BATCH * (DETECT_WORKERS + 1))
+        buffers = _frame_buffer_pools.setdefault(input_size, buffers)
+    return buffers
+
+# Detection results keyed by upload content and model version
+result_cache = ResultCache(max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES,
+                           ttl_seconds=CACHE_TTL_SECONDS)
+
+# Per-stream motion gate state for session requests
+motion_sessions = MotionSessions(
+    MotionOptions(threshold=MOTION_THRESHOLD, pixel_delta=MOTION_PIXEL_DELTA, gate_width=MOTION_GATE_WIDTH,
+                  full_interval=MOTION_FULL_INTERVAL, max_region_area=MOTION_MAX_REGION_AREA),
+    max_sessions=MOTION_MAX_SESSIONS,
+    ttl_seconds=MOTION_SESSION_TTL,
+)
+
+def _detections_size(result: Tuple[DetectionSet, int, int]) -> int:
+    """Approximate memory held by a cached detection result"""
+    return 256 + result[0].nbytes
+
+def postprocess_options(
+    conf: float = Query(DETECT_CONF, ge=0.0, le=1.0, description="Minimum confidence"),
+    iou: float = Query(DETECT_IOU, ge=0.0, le=1.0, description="NMS IoU threshold"),
+    max_det: int = Query(DETECT_MAX_DET, ge=1, le=DETECT_MAX_DET, description="Maximum detections"),
+) -> PostprocessOptions:
+    return PostprocessOptions(conf=conf, iou=iou, max_det=max_det)
+
+def tile_options(
+    tiled: bool = Query(False, description="Split large images into overlapping tiles"),
+    tile_size: int = Query(TILE_SIZE, ge=0, le=4096, description="Tile edge in pixels, 0 for the model input size"),
+    tile_overlap: float = Query(TILE_OVERLAP, ge=0.0, lt=0.9, description="Fraction shared by adjacent tiles"),
+    tile_merge: str = Query(TILE_MERGE, description="How boxes from overlapping tiles are merged: nms or wbf"),
+) -> Optional[TileOptions]:
+    if not tiled:
+        return None
+    if tile_merge not in MERGE_METHODS:
+        raise HTTPException(status_code=422, detail=f"tile_merge must be one of {', '.join(MERGE_METHODS)}")
+    if 0 < tile_size < 32:
+        raise HTTPException(status_code=422, detail="tile_size must be at least 32 pixels")
+    return TileOptions(size=tile_size, overlap=tile_overlap, merge=tile_merge)
+
+def annotate_options(
+    output_format: str = Query("jpeg", alias="format", description="Output encoding: jpeg or webp"),
+    quality: int = Query(ANNOTATE_QUALITY, ge=1, le=100, description="Encoder quality"),
+    max_dim: int = Query(ANNOTATE_MAX_DIM, ge=64, le=8192, description="Longest output side in pixels"),
+) -> AnnotateOptions:
+    if output_format not in ANNOTATED_FORMATS:
+        raise HTTPException(status_code=422, detail=f"format must be one of {', '.join(ANNOTATED_FORMATS)}")
+    return AnnotateOptions(format=output_format, quality=quality, max_dim=max_dim)
+
+def request_deadline(
+    request: Request,
+    x_deadline_ms: Optional[float] = Header(None, gt=0, description="Milliseconds the client will wait"),
+) -> Optional[float]:
+    """Absolute time.time() deadline, counted from when the request arrived"""
+    budget_ms = x_deadline_ms or DETECT_DEADLINE_MS
+    if not budget_ms:
+        return None
+    request_start = request.scope.get("state", {}).get("request_start")
+    arrived = time.time()
+    if request_start is not None:
+        arrived -= time.perf_counter() - request_start
+    return arrived + budget_ms / 1000
+
+def admit(model: ModelHandle, deadline: Optional[float]):
+    """Shed work whose deadline would pass while it waits in the queues anyway"""
+    if deadline is None:
+        return
+    remaining = deadline - time.time()
+    wait = worker_pool.estimated_wait() + model.scheduler.estimated_wait()
+    if wait > remaining:
+        metrics.inc("shed_total", 1, "Requests rejected because their deadline could not be met")
+        raise HTTPException(status_code=503,
+                            detail=f"Estimated queue wait of {wait * 1000:.0f} ms exceeds the "
+                                   f"remaining deadline of {max(0.0, remaining) * 1000:.0f} ms",
+                            headers={"Retry-After": "1"})
+
+async def _wait_for_disconnect(request: Request):
+    # The body has already been read, so the next message is the disconnect
+    while (await request.receive())["type"] != "http.disconnect":
+        pass
+
+async def cancel_on_disconnect(request: Request, awaitable):
+    """Await `awaitable`, cancelling it if the client disconnects first"""
+    work = asyncio.ensure_future(awaitable)
+    watcher = asyncio.ensure_future(_wait_for_disconnect(request))
     try:
-        start_time = time.time()
-        
-        # Validate file type
-        if not image.content_type.startswith('image/'):
-            raise HTTPException(status_code=400, detail="File must be an image")
-        
-        # Read image data
-        image_data = await image.read()
-        
-        # Process image
-        cv_image = process_image_for_detection(image_data)
-        height, width = cv_image.shape[:2]
-        
+        await asyncio.wait({work, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        work.cancel()
+        raise
+    finally:
+        watcher.cancel()
+    if not work.done():
+        work.cancel()
+        # Let the work unwind (and release its buffers) before answering
+        await asyncio.wait({work})
+        metrics.inc("client_disconnects_total", 1, "Requests whose work was cancelled by a client disconnect")
+        # 499: client closed request; nobody is left to read the response
+        raise HTTPException(status_code=499, detail="Client disconnected")
+    return work.result()
+
+async def wait_for_warmup():
+    """Hold a request that arrived while startup models load, or refuse it per WARMUP_MODE"""
+    if model_registry.started:
+        return
+    if WARMUP_MODE == "wait" and await model_registry.wait_started(WARMUP_WAIT_MS / 1000):
+        return
+    metrics.inc("warmup_rejected_total", 1, "Requests refused because models were still loading")
+    raise HTTPException(status_code=503, detail="Models are still warming up, retry later",
+                        headers={"Retry-After": "1"})
+
+@asynccontextmanager
+async def use_model(version: Optional[str] = None):
+    """Pin a resident model for one request; unknown versions are a 404"""
+    await wait_for_warmup()
+    try:
+        handle = model_registry.get(version)
+    except ModelNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    async with model_registry.acquire(handle.version) as handle:
+        yield handle
+
+async def run_detection(model: ModelHandle, image_bytes, options: PostprocessOptions = PostprocessOptions(),
+                        timings=NULL_TIMINGS, tiling: Optional[TileOptions] = None,
+                        deadline: Optional[float] = None) -> Tuple[DetectionSet, int, int]:
+    """
+    Serve detections from the result cache, computing them on a miss.
+    image_bytes is an encoded image or a raw HxWxC pixel array.
+    """
+    metrics.inc("bytes_processed_total", _input_nbytes(image_bytes), "Image bytes received for detection")
+    if tiling is not None:
+        compute = lambda: _run_tiled_detection(model, image_bytes, options, tiling, timings, deadline)
+    else:
+        compute = lambda: _run_detection_uncached(model, image_bytes, options, timings, deadline)
+    if not result_cache.enabled:
+        return await compute()
+
+    key = await _content_key(model, image_bytes)
+    tag = options.cache_tag() if tiling is None else f"{options.cache_tag()}:{tiling.cache_tag()}"
+    result, hit = await result_cache.get_or_compute(f"{key}:{tag}", compute, _detections_size)
+    metrics.inc("cache_lookups_total", 1, "Result cache lookups", result="hit" if hit else "miss")
+    return result
+
+def _input_nbytes(image_bytes) -> int:
+    return image_bytes.nbytes if isinstance(image_bytes, np.ndarray) else len(image_bytes)
+
+async def _content_key(model: ModelHandle, image_bytes) -> str:
+    # Keys carry the model version, so resident models never share results
+    if _input_nbytes(image_bytes) > CACHE_HASH_INLINE_BYTES:
+        key = await run_in_threadpool(content_key, image_bytes, model.version)
+    else:
+        key = content_key(image_bytes, model.version)
+    if isinstance(image_bytes, np.ndarray):
+        # The same pixel bytes mean a different image under another shape
+        key += ":raw" + "x".join(str(dim) for dim in image_bytes.shape)
+    return key
+
+def _pool_saturated(e: PoolSaturatedError) -> HTTPException:
+    logger.warning(str(e))
+    metrics.inc("rejected_total", 1, "Requests rejected because the worker pool was full")
+    return HTTPException(status_code=503, detail="Detection queue is full, retry later", headers={"Retry-After": "1"})
+
+def _deadline_exceeded(e: DeadlineExceededError) -> HTTPException:
+    logger.warning(str(e))
+    metrics.inc("deadline_exceeded_total", 1, "Requests dropped from a queue after their deadline passed")
+    return HTTPException(status_code=504, detail="Deadline exceeded before the image was processed")
+
+async def _run_detection_uncached(model: ModelHandle, image_bytes, options: PostprocessOptions,
+                                  timings=NULL_TIMINGS, deadline: Optional[float] = None
+                                  ) -> Tuple[DetectionSet, int, int]:
+    """Decode on the worker pool, then detect through the batch scheduler"""
+    admit(model, deadline)
+    if worker_pool.kind == "process" and not isinstance(image_bytes, np.ndarray):
+        # Upload buffers (memoryviews, mmaps) cannot be pickled to a worker process
+        image_bytes = bytes(image_bytes)
+    try:
+        frame = await worker_pool.run(process_image_for_detection, image_bytes, model.detector.input_size,
+                                      False, timings, deadline=deadline)
+        width, height = frame.original_size
+
         logger.info(f"Processing image: {width}x{height}")
+
+        try:
+            detections = await model.scheduler.detect(frame.input, options, timings, deadline)
+        finally:
+            get_frame_buffers(model.detector.input_size).release(frame.input)
+    except DeadlineExceededError as e:
+        raise _deadline_exceeded(e)
+    except PoolSaturatedError as e:
+        raise _pool_saturated(e)
+
+    return map_detections_to_original(detections, frame), width, height
+
+async def _run_tiled_detection(model: ModelHandle, image_bytes, options: PostprocessOptions,
+                               tiling: TileOptions, timings=NULL_TIMINGS, deadline: Optional[float] = None
+                               ) -> Tuple[DetectionSet, int, int]:
+    """Decode at full resolution, then detect on overlapping tiles and merge the boxes"""
+    admit(model, deadline)
+    # Tiles are views of one decoded image, so they are cut on threads even
+    # when the worker pool is process-based
+    if worker_pool.kind == "thread":
+        run = lambda fn, *args: worker_pool.run(fn, *args, deadline=deadline)
+    else:
+        run = run_in_threadpool
+    try:
+        try:
+            image, (width, height) = await run(decode_full, image_bytes, timings)
+        except (ValueError, cv2.error) as e:
+            raise HTTPException(status_code=400, detail=f"Error processing image: {str(e)}")
+
+        try:
+            detections, tiles = await detect_tiled(
+                image,
+                lambda frame: model.scheduler.detect(frame, options, timings, deadline),
+                run,
+                get_frame_buffers(model.detector.input_size),
+                tile=tiling.size or model.detector.input_size[0],
+                overlap=tiling.overlap,
+                options=options,
+                merge=tiling.merge,
+                parallelism=TILE_PARALLELISM,
+                max_tiles=TILE_MAX_TILES,
+                timings=timings,
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    except DeadlineExceededError as e:
+        raise _deadline_exceeded(e)
+    except PoolSaturatedError as e:
+        raise _pool_saturated(e)
+
+    logger.info(f"Tiled detection on {width}x{height} image: {tiles} tiles, {len(detections)} objects")
+    return detections, width, height
+
+def _source_size(image_bytes) -> Optional[Tuple[int, int]]:
+    """Frame size known without decoding, so a session notices a resolution change"""
+    if isinstance(image_bytes, np.ndarray):
+        return image_bytes.shape[1], image_bytes.shape[0]
+    return read_image_size(image_bytes)
+
+def _decode_session_frame(image_bytes, input_size: Tuple[int, int], timings=NULL_TIMINGS
+                          ) -> Tuple[np.ndarray, Tuple[int, int]]:
+    if isinstance(image_bytes, np.ndarray):
+        image = to_bgr(image_bytes)
+        return image, (image.shape[1], image.shape[0])
+    with timings.stage("decode"):
+        return decode_image(image_bytes, input_size if DECODE_REDUCED else None)
+
+async def run_session_detection(model: ModelHandle, session: MotionSession, image_bytes,
+                                options: PostprocessOptions, timings=NULL_TIMINGS,
+                                deadline: Optional[float] = None) -> Tuple[DetectionSet, int, int, str, float]:
+    """
+    Detect on one frame of a motion-gated session. A frame that barely
+    differs from the session's reference reuses its detections; localised
+    motion re-detects only the box around the change, at most one inference
+    like a full pass; anything else, or every MOTION_FULL_INTERVAL frames,
+    runs a full pass. Returns the detections, size, decision and the
+    fraction of the gate frame that changed.
+    """
+    metrics.inc("bytes_processed_total", _input_nbytes(image_bytes), "Image bytes received for detection")
+    # The gate and the decoded frame stay in this process with the session
+    if worker_pool.kind == "thread":
+        run = lambda fn, *args: worker_pool.run(fn, *args, deadline=deadline)
+    else:
+        run = run_in_threadpool
+    key = f"{model.version}:{options.cache_tag()}"
+    buffers = get_frame_buffers(model.detector.input_size)
+
+    async with session.lock:
+        started = time.perf_counter()
+        try:
+            try:
+                gate = await run(gate_frame, image_bytes, session.options.gate_width, timings)
+            except (ValueError, cv2.error) as e:
+                raise HTTPException(status_code=400, detail=f"Error processing image: {str(e)}")
+            source_size = _source_size(image_bytes)
+            decision, changed, box = session.decide(gate, source_size, key)
+
+            if decision == "skip":
+                detections, (width, height) = session.detections, session.image_size
+                session.record_skip(time.perf_counter() - started)
+            else:
+                admit(model, deadline)
+                try:
+                    image, (width, height) = await run(_decode_session_frame, image_bytes,
+                                                       model.detector.input_size, timings)
+                except (ValueError, cv2.error) as e:
+                    raise HTTPException(status_code=400, detail=f"Error processing image: {str(e)}")
+                if decision == "full":
+                    region = np.array([0, 0, image.shape[1], image.shape[0]])
+                else:
+                    region = motion_region(box, gate.shape, image.shape, min(model.detector.input_size) // 2)
+
+                frame = await run(prepare_tile, image, region, buffers, timings)
+                try:
+                    detections = await model.scheduler.detect(frame.input, options, timings, deadline)
+                finally:
+                    buffers.release(frame.input)
+                # Region pixels -> decoded image -> original image
+                detections = map_detections_to_original(detections, frame)
+                scale = np.array([width / image.shape[1], height / image.shape[0]] * 2, dtype=np.float32)
+                offset = np.array([region[0], region[1]] * 2, dtype=np.float32)
+                detections = DetectionSet((detections.boxes + offset) * scale, detections.scores,
+                                          detections.class_ids)
+
+                seconds = time.perf_counter() - started
+                if decision == "full":
+                    session.record_full(gate, detections, (width, height), source_size, key, seconds)
+                else:
+                    detections = merge_partial(session.detections, detections, region * scale, options.iou,
+                                               options.max_det)
+                    session.record_partial(gate, box, detections, seconds)
+        except DeadlineExceededError as e:
+            raise _deadline_exceeded(e)
+        except PoolSaturatedError as e:
+            raise _pool_saturated(e)
+
+    metrics.inc("motion_frames_total", 1, "Session frames by motion gate decision", decision=decision)
+    return detections, width, height, decision, changed
+
+def build_detection_payload(model: ModelHandle, detections: DetectionSet, width: int, height: int,
+                            start_time: float) -> dict:
+    """The DetectionResponse shape as a plain dict, ready for fast encoding"""
+    return detection_payload(detections, model.detector.classes, width, height, time.time() - start_time,
+                             model.version)
+
+@api_router.post(
+    "/detect",
+    response_model=DetectionResponse,
+    responses={200: {"content": {COLUMNAR_MEDIA_TYPE: {}, MSGPACK_MEDIA_TYPE: {}}}},
+)
+async def detect_objects(request: Request, image: Optional[UploadFile] = File(None),
+                         options: PostprocessOptions = Depends(postprocess_options),
+                         tiling: Optional[TileOptions] = Depends(tile_options),
+                         deadline: Optional[float] = Depends(request_deadline),
+                         model: Optional[str] = Query(None, description="Model version, default if omitted"),
+                         session: Optional[str] = Query(None, min_length=1, max_length=128,
+                                                        description="Camera stream id for motion gating")):
+    """
+    Detect space safety equipment in uploaded image using YOLOv8 model.
+
+    The image is a multipart `image` part; edge devices holding decoded
+    frames can instead POST raw uint8 HWC BGR pixels as
+    application/octet-stream with an `X-Image-Shape: H,W,C` header, and
+    browsers can POST JSON `{"image": "<base64 or data: URL>"}`.
+
+    Pass `model` to pick one of the versions listed by /api/models, and
+    `tiled=true` to detect small objects in large images on overlapping tiles.
+    Frames of a mostly static camera sent with the same `session` id are
+    motion-gated: unchanged frames reuse the previous detections and the
+    X-Motion header says whether the frame was a full, partial or skip pass.
+    With an `X-Deadline-Ms` header (or DETECT_DEADLINE_MS), requests that
+    cannot finish in time are rejected with 503 up front or 504 once queued.
+    Send `Accept: application/vnd.eleven11.columnar+json` or
+    `Accept: application/msgpack` for detections as parallel arrays; an
+    Accept header allowing none of the formats is refused with 406.
+    """
+    try:
+        start_time = time.time()
+        timings = metrics.new_timings()
+        # Picked up by ProfilingMiddleware for the slow request log
+        request.state.timings = timings
+        request_start = request.scope.get("state", {}).get("request_start")
+        if request_start is not None:
+            # Receiving and parsing the multipart body happens before the endpoint runs
+            timings.record("upload_read", time.perf_counter() - request_start)
         
-        # Perform detection (replace with actual YOLO model)
-        detections = mock_yolo_detection(cv_image)
-        
-        # Calculate processing time
-        processing_time = time.time() - start_time
-        
-        # Prepare response
-        response = DetectionResponse(
-            success=True,
-            detections=detections,
-            total_detections=len(detections),
-            processing_time=f"{processing_time:.3f}s",
-            image_dimensions=[width, height]
-        )
+        if session is not None and tiling is not None:
+            raise HTTPException(status_code=422, detail="session cannot be combined with tiled=true")
+        if session is not None:
+            refuse_under_prefork("Motion gating (session)")
+        response_format = negotiate_format(request.headers.get("accept"))
+        if response_format is None:
+            raise HTTPException(status_code=406, detail=f"Accept one of application/json, {COLUMNAR_MEDIA_TYPE} "
+                                                        f"or {MSGPACK_MEDIA_TYPE}")
+
+        async with use_model(model) as handle:
+            async with read_request_image(request, image, RAW_MAX_SIDE) as image_input:
+                # Decode and detect off the event loop; a client that hangs up
+                # stops its queued work
+                if session is not None:
+                    detections, width, height, decision, changed = await cancel_on_disconnect(
+                        request, run_session_detection(handle, motion_sessions.get_or_create(session),
+                                                       image_input.data, options, timings, deadline))
+                else:
+                    detections, width, height = await cancel_on_disconnect(
+                        request, run_detection(handle, image_input.data, options, timings, tiling, deadline))
+            
+            # Prepare response, skipping Pydantic revalidation of trusted results
+            processing_time = time.time() - start_time
+            with timings.stage("serialize"):
+                response = render_detections(response_format, detections, handle.detector.classes, width,
+                                             height, processing_time, handle.version)
+        if session is not None:
+            response.headers["X-Motion"] = decision
+            response.headers["X-Motion-Changed"] = f"{changed:.4f}"
+        if timings.enabled:
+            response.headers["Server-Timing"] = timings.server_timing()
+            metrics.observe_request(timings, time.time() - start_time)
+        metrics.inc("requests_total", 1, "Detection requests by outcome", endpoint="detect", status="200")
         
         logger.info(f"Detection completed: {len(detections)} objects found in {processing_time:.3f}s")
         
         return response
         
-    except HTTPException:
+    except HTTPException as e:
+        metrics.inc("requests_total", 1, "Detection requests by outcome", endpoint="detect", status=str(e.status_code))
         raise
     except Exception as e:
         logger.error(f"Detection error: {str(e)}")
+        metrics.inc("requests_total", 1, "Detection requests by outcome", endpoint="detect", status="500")
         raise HTTPException(status_code=500, detail=f"Detection failed: {str(e)}")
 
+async def run_annotated(model: ModelHandle, image_bytes, options: PostprocessOptions, annotate: AnnotateOptions,
+                        key: Optional[str], timings=NULL_TIMINGS, deadline: Optional[float] = None
+                        ) -> Tuple[bytes, DetectionSet, int, int]:
+    """Serve an encoded overlay from the result cache, rendering it on a miss"""
+    metrics.inc("bytes_processed_total", _input_nbytes(image_bytes), "Image bytes received for detection")
+    compute = lambda: _render_annotated(model, image_bytes, options, annotate, timings, deadline)
+    if key is None:
+        return await compute()
+    result, hit = await result_cache.get_or_compute(
+        f"{key}:{options.cache_tag()}:annotated-{annotate.cache_tag()}", compute,
+        lambda result: 256 + len(result[0]) + result[1].nbytes,
+    )
+    metrics.inc("cache_lookups_total", 1, "Result cache lookups", result="hit" if hit else "miss")
+    return result
+
+async def _render_annotated(model: ModelHandle, image_bytes, options: PostprocessOptions, annotate: AnnotateOptions,
+                            timings=NULL_TIMINGS, deadline: Optional[float] = None
+                            ) -> Tuple[bytes, DetectionSet, int, int]:
+    """Detect as usual, keeping the decoded frame, then draw on it and encode"""
+    admit(model, deadline)
+    # Decode large enough for the output, not just the model input
+    if isinstance(image_bytes, np.ndarray):
+        decode_size = None
+    else:
+        size = read_image_size(image_bytes)
+        decode_size = annotate.output_size(*size) if size else None
+        if worker_pool.kind == "process":
+            image_bytes = bytes(image_bytes)
+    try:
+        frame = await worker_pool.run(process_image_for_detection, image_bytes, model.detector.input_size,
+                                      True, timings, decode_size, deadline=deadline)
+        try:
+            detections = await model.scheduler.detect(frame.input, options, timings, deadline)
+        finally:
+            get_frame_buffers(model.detector.input_size).release(frame.input)
+        detections = map_detections_to_original(detections, frame)
+        encoded = await worker_pool.run(render_annotated, frame.decoded, detections, frame.original_size,
+                                        model.detector.classes, annotate, timings)
+    except DeadlineExceededError as e:
+        raise _deadline_exceeded(e)
+    except PoolSaturatedError as e:
+        raise _pool_saturated(e)
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    width, height = frame.original_size
+    return encoded, detections, width, height
+
+def _multipart_mixed(parts: List[Tuple[str, bytes]]) -> Tuple[bytes, str]:
+    """Encode (content type, body) parts as a multipart/mixed body"""
+    boundary = uuid.uuid4().hex
+    chunks = []
+    for content_type, body in parts:
+        chunks.append(f"--{boundary}\r\nContent-Type: {content_type}\r\n\r\n".encode())
+        chunks.append(body)
+        chunks.append(b"\r\n")
+    chunks.append(f"--{boundary}--\r\n".encode())
+    return b"".join(chunks), f"multipart/mixed; boundary={boundary}"
+
+@api_router.post(
+    "/detect/annotated",
+    response_class=Response,
+    responses={200: {"content": {"image/jpeg": {}, "image/webp": {}, "multipart/mixed": {}}}},
+)
+async def detect_annotated(request: Request, image: Optional[UploadFile] = File(None),
+                           options: PostprocessOptions = Depends(postprocess_options),
+                           annotate: AnnotateOptions = Depends(annotate_options),
+                           detections_in: str = Query("header", alias="detections",
+                                                      description="Return detections in the X-Detections "
+                                                                  "header or as a multipart part"),
+                           deadline: Optional[float] = Depends(request_deadline),
+                           if_none_match: Optional[str] = Header(None),
+                           model: Optional[str] = Query(None, description="Model version, default if omitted")):
+    """
+    Detect objects and return the image with boxes and labels drawn on it,
+    as JPEG or WebP no larger than `max_dim` on its longer side. The image
+    is sent in any of the forms /api/detect accepts.
+
+    Detections (the /api/detect JSON) come back in an `X-Detections` header,
+    or with `detections=multipart` as the first part of a multipart/mixed
+    response followed by the image. Rendered images are cached by content
+    hash and sent with an ETag, so repeat views cost no extra CPU.
+    """
+    if detections_in not in ("header", "multipart"):
+        raise HTTPException(status_code=422, detail="detections must be header or multipart")
+    start_time = time.time()
+    timings = metrics.new_timings()
+    request.state.timings = timings
+    async with use_model(model) as handle:
+        async with read_request_image(request, image, RAW_MAX_SIDE) as image_input:
+            image_data = image_input.data
+            etag = None
+            key = None
+            if result_cache.enabled:
+                key = await _content_key(handle, image_data)
+                variant = f"{key}:{options.cache_tag()}:{annotate.cache_tag()}".encode()
+                etag = f'"{hashlib.blake2b(variant, digest_size=16).hexdigest()}"'
+                if if_none_match == etag:
+                    return Response(status_code=304, headers={"ETag": etag})
+
+            encoded, detections, width, height = await cancel_on_disconnect(
+                request, run_annotated(handle, image_data, options, annotate, key, timings, deadline))
+
+        payload = build_detection_payload(handle, detections, width, height, start_time)
+    # json escapes non-ASCII, which keeps the header latin-1 safe
+    detections_json = json.dumps(payload, separators=(",", ":"))
+    if detections_in == "multipart":
+        body, media_type = _multipart_mixed([("application/json", detections_json.encode()),
+                                             (annotate.media_type, encoded)])
+        response = Response(body, media_type=media_type)
+    else:
+        response = Response(encoded, media_type=annotate.media_type,
+                            headers={"X-Detections": detections_json,
+                                     "Access-Control-Expose-Headers": "X-Detections, ETag"})
+    if etag is not None:
+        response.headers["ETag"] = etag
+    if timings.enabled:
+        response.headers["Server-Timing"] = timings.server_timing()
+        metrics.observe_request(timings, time.time() - start_time)
+    metrics.inc("requests_total", 1, "Detection requests by outcome", endpoint="annotated", status="200")
+    return response
+
+async def _detect_batch_item(model: ModelHandle, index: int, filename: str, image_data: Union[bytes, OversizedImage],
+                             options: PostprocessOptions) -> dict:
+    """Run one image from a bulk upload, turning failures into an error line"""
+    start_time = time.time()
+    timings = metrics.new_timings()
+    try:
+        if isinstance(image_data, OversizedImage):
+            raise HTTPException(status_code=413, detail=str(image_data))
+        detections, width, height = await run_detection(model, image_data, options, timings)
+        result = build_detection_payload(model, detections, width, height, start_time)
+        metrics.observe_request(timings, time.time() - start_time)
+    except HTTPException as e:
+        result = {"success": False, "status_code": e.status_code, "error": e.detail}
+    except Exception as e:
+        logger.error(f"Batch item {filename} failed: {str(e)}")
+        result = {"success": False, "status_code": 500, "error": f"Detection failed: {str(e)}"}
+    return {"index": index, "filename": filename, **result}
+
+async def _stream_batch_results(form, parallelism: int, options: PostprocessOptions, model: ModelHandle):
+    """
+    Yield one NDJSON line per image in completion order.
+
+    At most `parallelism` images are read and in flight at a time, so memory
+    stays flat regardless of how many images the upload contains.
+    """
+    images = [part for part in form.getlist("images") if isinstance(part, StarletteUploadFile)]
+    source = iter_upload_images(images, MAX_UPLOAD_BYTES)
+    pending = set()
+    index = 0
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and len(pending) < parallelism:
+                try:
+                    item = await run_in_threadpool(next, source, None)
+                except Exception as e:
+                    logger.error(f"Could not read batch upload: {str(e)}")
+                    yield dumps({"index": index, "success": False, "status_code": 400,
+                                 "error": f"Could not read upload: {str(e)}"}) + b"\n"
+                    item = None
+                if item is None:
+                    exhausted = True
+                    break
+                filename, image_data = item
+                pending.add(asyncio.create_task(_detect_batch_item(model, index, filename, image_data, options)))
+                index += 1
+
+            if not pending:
+                break
+
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield dumps(task.result()) + b"\n"
+    finally:
+        # Client went away or the stream failed; drop work nobody will read
+        for task in pending:
+            task.cancel()
+        await form.close()
+
+async def _stream_batch_results_pinned(form, parallelism: int, options: PostprocessOptions, version: str):
+    """Hold the chosen model for as long as the response is streaming"""
+    async with model_registry.acquire(version) as handle:
+        async for line in _stream_batch_results(form, parallelism, options, handle):
+            yield line
+
+@api_router.post("/detect/batch")
+async def detect_objects_batch(request: Request, parallelism: int = Query(BATCH_MAX_PARALLELISM, ge=1),
+                               options: PostprocessOptions = Depends(postprocess_options),
+                               model: Optional[str] = Query(None, description="Model version, default if omitted")):
+    """
+    Detect objects in many images, sent as multipart `images` parts which may
+    be plain images or zip/tar archives. Results are streamed back as NDJSON,
+    one line per image, as they complete.
+    """
+    await wait_for_warmup()
+    try:
+        version = model_registry.get(model).version
+    except ModelNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    # Parse the form here rather than declaring File params: FastAPI closes
+    # declared uploads when the endpoint returns, before the stream is read
+    try:
+        form = await request.form(max_files=BATCH_MAX_FILES)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid multipart upload: {str(e)}")
+    if not form.getlist("images"):
+        await form.close()
+        raise HTTPException(status_code=422, detail="No images uploaded")
+
+    parallelism = min(parallelism, BATCH_MAX_PARALLELISM)
+    return StreamingResponse(_stream_batch_results_pinned(form, parallelism, options, version),
+                             media_type="application/x-ndjson")
+
+@asynccontextmanager
+async def _job_item_runner(job: Job):
+    """Pin the job's model for its whole run and analyse items like a bulk upload"""
+    options = PostprocessOptions(**job.options)
+    # Jobs are not in a hurry: wait out startup loading whatever WARMUP_MODE says
+    await model_registry.wait_started()
+    async with model_registry.acquire(job.model) as handle:
+        yield lambda index, filename, data: _detect_batch_item(handle, index, filename, data, options)
+
+job_manager = JobManager(
+    create_job_store(JOB_STORE, sqlite_path=JOB_SQLITE_PATH, mongo_url=MONGO_URL, mongo_db=DB_NAME),
+    _job_item_runner,
+    input_dir=JOBS_DIR,
+    workers=JOB_WORKERS,
+    item_parallelism=JOB_ITEM_PARALLELISM,
+    max_queued=JOB_MAX_QUEUED,
+    flush_size=JOB_FLUSH_SIZE,
+    max_image_bytes=MAX_UPLOAD_BYTES,
+    retention=JOB_RETENTION_SECONDS or None,
+    # Prefork front-ends share the (sqlite or mongo) store: one of them
+    # requeues interrupted jobs, and each watches for cancellations made
+    # through the others
+    recover=shared_client is None or shared_client.index == 0,
+    poll_cancellation=shared_client is not None,
+)
+
+def require_shared_job_store():
+    if JOB_STORE == "memory":
+        refuse_under_prefork("The job API with JOB_STORE=memory", "; use sqlite or mongo")
+
+async def _get_job(job_id: str) -> Job:
+    try:
+        return await job_manager.get(job_id)
+    except JobNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@api_router.post("/jobs", status_code=202, dependencies=[Depends(require_shared_job_store)])
+async def submit_job(request: Request, priority: int = Query(0, ge=0, le=9, description="Higher runs first"),
+                     options: PostprocessOptions = Depends(postprocess_options),
+                     model: Optional[str] = Query(None, description="Model version, default if omitted")):
+    """
+    Queue a background analysis of multipart `images` parts (plain images or
+    zip/tar archives). The uploads are stored before this returns, so the
+    job keeps running after the client disconnects.
+    """
+    await wait_for_warmup()
+    try:
+        version = model_registry.get(model).version
+    except ModelNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    try:
+        form = await request.form(max_files=BATCH_MAX_FILES)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid multipart upload: {str(e)}")
+    try:
+        images = [part for part in form.getlist("images") if isinstance(part, StarletteUploadFile)]
+        if not images:
+            raise HTTPException(status_code=422, detail="No images uploaded")
+        job = await job_manager.submit(images, priority=priority, model=version,
+                                       options={"conf": options.conf, "iou": options.iou, "max_det": options.max_det})
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    finally:
+        await form.close()
+    return job.as_dict()
+
+@api_router.get("/jobs", dependencies=[Depends(require_shared_job_store)])
+async def list_jobs(status: Optional[str] = Query(None, description="Only jobs in this status"),
+                    limit: int = Query(100, ge=1, le=1000)):
+    """Most recently submitted jobs first"""
+    if status is not None and status not in JOB_STATUSES:
+        raise HTTPException(status_code=422, detail=f"status must be one of {', '.join(JOB_STATUSES)}")
+    jobs = await job_manager.list([status] if status else None, limit)
+    return {"jobs": [job.as_dict() for job in jobs]}
+
+@api_router.get("/jobs/{job_id}", dependencies=[Depends(require_shared_job_store)])
+async def get_job(job_id: str):
+    """Job status and progress"""
+    return (await _get_job(job_id)).as_dict()
+
+async def _stream_job_results(job_id: str, start: int, follow: bool):
+    seq = start
+    finished = False
+    while True:
+        # Take the update event before reading so a flush in between is not missed
+        updated = job_manager.updates(job_id)
+        rows = await job_manager.results(job_id, seq)
+        for row in rows:
+            yield dumps(row) + b"\n"
+            seq = row["seq"] + 1
+        if rows:
+            continue
+        # The final flush lands before the status changes, so after seeing
+        # the job finished, one more empty read means everything was sent
+        if finished or not follow:
+            break
+        finished = (await job_manager.get(job_id)).finished
+        if not finished:
+            try:
+                await asyncio.wait_for(updated.wait(), timeout=5)
+            except asyncio.TimeoutError:
+                pass
+
+@api_router.get("/jobs/{job_id}/results", dependencies=[Depends(require_shared_job_store)])
+async def get_job_results(job_id: str, start: int = Query(0, ge=0, description="First result seq to return"),
+                          follow: bool = Query(False, description="Keep streaming until the job finishes")):
+    """
+    Results written so far as NDJSON, one line per image in completion order,
+    each with a `seq` to resume from. With follow=true the response stays
+    open and streams new results until the job finishes.
+    """
+    await _get_job(job_id)
+    return StreamingResponse(_stream_job_results(job_id, start, follow), media_type="application/x-ndjson")
+
+@api_router.delete("/jobs/{job_id}", dependencies=[Depends(require_shared_job_store)])
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job; results already written are kept"""
+    try:
+        job = await job_manager.cancel(job_id)
+    except JobNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return job.as_dict()
+
+# Stats for every open /api/stream connection
+active_streams: List[StreamStats] = []
+
+async def _detect_stream_frame(frame_data: bytes, model: Optional[str] = None,
+                               session: Optional[MotionSession] = None) -> dict:
+    """Run one encoded video frame through the shared detection pipeline"""
+    start_time = time.time()
+    if sniff_image_format(frame_data[:SNIFF_BYTES]) is None:
+        raise HTTPException(status_code=400, detail="Frame must be an encoded image")
+    # Pinned per frame, so a stream on the default model follows hot swaps
+    async with use_model(model) as handle:
+        if session is None:
+            detections, width, height = await run_detection(handle, frame_data)
+            return build_detection_payload(handle, detections, width, height, start_time)
+        detections, width, height, decision, changed = await run_session_detection(
+            handle, session, frame_data, PostprocessOptions())
+        payload = build_detection_payload(handle, detections, width, height, start_time)
+        payload["motion"] = {"decision": decision, "changed": round(changed, 4)}
+        return payload
+
+@api_router.websocket("/stream")
+async def detect_stream(websocket: WebSocket):
+    """
+    Detect objects in a live stream of encoded frames sent over a WebSocket.
+    Only the newest frame is processed; frames that arrive while inference is
+    busy replace the waiting one and are reported as dropped. A `model` query
+    parameter selects the model version, and a `session` id turns on motion
+    gating for the stream (it survives reconnects under the same id).
+    """
+    if len(active_streams) >= STREAM_MAX_CONNECTIONS:
+        # 1013: try again later
+        await websocket.close(code=1013)
+        return
+    try:
+        await wait_for_warmup()
+    except HTTPException:
+        await websocket.close(code=1013)
+        return
+    model = websocket.query_params.get("model")
+    if model is not None and model not in model_registry.versions():
+        # 1008: policy violation
+        await websocket.close(code=1008)
+        return
+    session_id = websocket.query_params.get("session")
+    if session_id is not None and (shared_client is not None or not 0 < len(session_id) <= 128):
+        await websocket.close(code=1008)
+        return
+
+    await websocket.accept()
+    client = f"{websocket.client.host}:{websocket.client.port}" if websocket.client else "unknown"
+    stats = StreamStats(client)
+    active_streams.append(stats)
+    logger.info(f"Stream opened from {client}")
+    try:
+        session = motion_sessions.get_or_create(session_id) if session_id is not None else None
+        await serve_frame_stream(websocket, lambda frame: _detect_stream_frame(frame, model, session), stats,
+                                 MAX_UPLOAD_BYTES)
+    finally:
+        active_streams.remove(stats)
+        logger.info(f"Stream from {client} closed: {stats.as_dict()}")
+
+def require_process_local_sessions():
+    refuse_under_prefork("Motion sessions")
+
+@api_router.get("/sessions", dependencies=[Depends(require_process_local_sessions)])
+async def list_sessions():
+    """Motion-gated sessions with their skip ratios and estimated time saved"""
+    return {**motion_sessions.stats(), "sessions": [session.as_dict() for session in motion_sessions.sessions()]}
+
+@api_router.get("/sessions/{session_id}", dependencies=[Depends(require_process_local_sessions)])
+async def get_session(session_id: str):
+    session = motion_sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
+    return session.as_dict()
+
+@api_router.delete("/sessions/{session_id}", dependencies=[Depends(require_process_local_sessions)])
+async def delete_session(session_id: str):
+    """Forget a session; its next frame starts over with a full pass"""
+    if not motion_sessions.remove(session_id):
+        raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
+    return {"deleted": session_id}
+
+def require_profile_token(x_profile_token: Optional[str] = Header(None)):
+    """Profile downloads need PROFILE_TOKEN set and sent as X-Profile-Token"""
+    if not PROFILE_TOKEN:
+        raise HTTPException(status_code=403, detail="Profile downloads are disabled")
+    if not profiler.check_token(x_profile_token):
+        raise HTTPException(status_code=401, detail="Invalid profile token")
+
+@api_router.get("/profiles", dependencies=[Depends(require_profile_token)])
+async def list_profiles():
+    """Stored request profiles, newest first"""
+    return {**profiler.stats(), "profiles": await asyncio.to_thread(profiler.list)}
+
+@api_router.get("/profiles/{name}", dependencies=[Depends(require_profile_token)])
+async def download_profile(name: str):
+    """
+    One stored profile: .prof files are pstats dumps (python -m pstats,
+    snakeviz), .collapsed.txt files are stacks for flamegraph.pl or speedscope.
+    """
+    path = profiler.path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"Profile {name} not found")
+    media_type = "application/octet-stream" if path.suffix == ".prof" else "text/plain"
+    return FileResponse(path, media_type=media_type, filename=name)
+
+@api_router.get("/slow-requests")
+async def get_slow_requests(limit: int = Query(20, ge=1, le=1000)):
+    """The slowest of the last SLOW_REQUEST_WINDOW detection requests, with stage breakdowns"""
+    return {"window": SLOW_REQUEST_WINDOW, "requests": slow_requests.slowest(limit)}
+
 @api_router.get("/health")
 async def health_check():
-    """Health check endpoint"""
-    return {"status": "healthy", "service": "Eleven11 Detection API", "version": "1.0.0"}
+    """Liveness: the process is up and serving HTTP, whether or not models are loaded yet"""
+    return {"status": "healthy", "service": "Eleven11 Detection API", "version": "1.0.0",
+            "models_ready": model_registry.ready}
+
+@api_router.get("/ready")
+async def readiness_check():
+    """Readiness: 200 once every configured model is loaded and warmed up, 503 before"""
+    # Startup loading decides readiness; a hot load of another model does not
+    ready = model_registry.started and model_registry.startup_error is None and model_registry.ready
+    body = {
+        "ready": ready,
+        "pending": list(model_registry.pending),
+        "error": model_registry.startup_error,
+        "startup_seconds": round(model_registry.startup_seconds, 3) if model_registry.started else None,
+    }
+    return JSONResponse(body, status_code=200 if ready else 503)
 
 @api_router.get("/model-info")
-async def get_model_info():
+async def get_model_info(model: Optional[str] = Query(None, description="Model version, default if omitted")):
     """Get information about the detection model"""
+    await wait_for_warmup()
+    try:
+        handle = model_registry.get(model)
+    except ModelNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {
+        **handle.detector.info(),
+        "description": "Specialized model for detecting space station safety equipment",
+        "default": handle is model_registry.default,
+        "loaded_models": model_registry.versions(),
+    }
+
+def require_model_admin(x_admin_token: Optional[str] = Header(None)):
+    """Model administration needs MODEL_ADMIN_TOKEN set and sent as X-Admin-Token"""
+    # The inference workers load MODELS once; changing them means a restart
+    refuse_under_prefork("Model administration", "; change MODELS and restart instead")
+    if not MODEL_ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Model administration is disabled")
+    if x_admin_token != MODEL_ADMIN_TOKEN:
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+@api_router.get("/models")
+async def list_models():
+    """Resident model versions, the default, and per-model load and batching stats"""
+    return model_registry.stats()
+
+@api_router.post("/models", dependencies=[Depends(require_model_admin)])
+async def load_model(spec: str = Query(..., description="Model spec, e.g. 'mock:YOLOv8n-space-v1.1'"),
+                     make_default: bool = Query(False)):
+    """Load and warm up another model version alongside the resident ones"""
+    try:
+        handle = await model_registry.load(spec, make_default=make_default)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"loaded": handle.version, **model_registry.stats()}
+
+@api_router.post("/models/{version}/activate", dependencies=[Depends(require_model_admin)])
+async def activate_model(version: str):
+    """Make `version` the default; in-flight requests finish on the previous one"""
+    try:
+        model_registry.set_default(version)
+    except ModelNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return model_registry.stats()
+
+@api_router.delete("/models/{version}", dependencies=[Depends(require_model_admin)])
+async def unload_model(version: str):
+    """Unload a non-default model once its in-flight requests have finished"""
+    try:
+        await model_registry.unload(version)
+    except ModelNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    result_cache.invalidate(version)
+    return model_registry.stats()
+
+@api_router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus text-format metrics"""
+    if not metrics.enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@api_router.get("/stats")
+async def get_stats():
+    """Worker pool, batch scheduler, result cache, job, motion gate and stream statistics"""
     return {
-        "model_name": "YOLOv8n-space-v1.0",
-        "model_type": "Object Detection",
-        "framework": "YOLOv8",
-        "classes": ["fire_extinguisher", "oxygen_tank", "toolkit"],
-        "input_size": [640, 640],
-        "description": "Specialized model for detecting space station safety equipment"
+        "pool": worker_pool.stats(),
+        "default_deadline_ms": DETECT_DEADLINE_MS or None,
+        "models": model_registry.stats(),
+        "cache": result_cache.stats(),
+        "jobs": job_manager.stats(),
+        "motion": motion_sessions.stats(),
+        "profiling": profiler.stats(),
+        "streams": {
+            "active": len(active_streams),
+            "max_connections": STREAM_MAX_CONNECTIONS,
+            "connections": [stats.as_dict() for stats in active_streams],
+        },
     }
 
 # Root endpoint
@@ -181,14 +1222,65 @@ async def root():
         "version": "1.0.0",
         "endpoints": {
             "detection": "/api/detect",
+            "batch_detection": "/api/detect/batch",
+            "annotated_detection": "/api/detect/annotated",
+            "jobs": "/api/jobs",
+            "stream": "/api/stream",
+            "sessions": "/api/sessions",
+            "slow_requests": "/api/slow-requests",
+            "profiles": "/api/profiles",
             "health": "/api/health",
-            "model_info": "/api/model-info"
+            "ready": "/api/ready",
+            "model_info": "/api/model-info",
+            "models": "/api/models",
+            "stats": "/api/stats",
+            "metrics": "/api/metrics"
         }
     }
 
 # Include router
 app.include_router(api_router)
 
+# Gauges sampled when /api/metrics is scraped
+metrics.gauge("requests_in_flight", "HTTP requests currently being handled", lambda: metrics.in_flight)
+metrics.gauge("queue_depth", "Jobs waiting for a worker", lambda: worker_pool.stats()["queue_depth"])
+metrics.gauge("workers_busy", "Workers currently running a job", lambda: worker_pool.stats()["in_flight"])
+metrics.gauge("batch_queue_depth", "Images waiting to be batched",
+              lambda: sum(handle.scheduler.stats()["queued"] for handle in model_registry.handles()))
+metrics.gauge("active_streams", "Open /api/stream connections", lambda: len(active_streams))
+
+# Background startup work, kept referenced until it finishes
+startup_tasks: List[asyncio.Task] = []
+
+async def _load_models_in_background(loading):
+    try:
+        await loading
+        logger.info(f"Ready: {len(MODEL_SPECS)} models loaded in {model_registry.startup_seconds:.3f}s")
+    except Exception as e:
+        logger.error(f"Model startup failed: {str(e)}")
+
+@app.on_event("startup")
+async def load_models():
+    await worker_pool.start()
+    if MODEL_LOAD_BACKGROUND:
+        # Start listening right away; /api/ready flips once the models are warm
+        startup_tasks.append(asyncio.create_task(_load_models_in_background(model_registry.load_all(MODEL_SPECS))))
+    else:
+        # Load and warm every configured model before the server accepts traffic
+        await model_registry.load_all(MODEL_SPECS)
+    await job_manager.start()
+
+@app.on_event("shutdown")
+async def shutdown_worker_pool():
+    for task in startup_tasks:
+        task.cancel()
+    await asyncio.gather(*startup_tasks, return_exceptions=True)
+    await job_manager.stop()
+    await model_registry.stop()
+    if shared_client is not None:
+        await shared_client.stop()
+    worker_pool.shutdown(wait=False)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
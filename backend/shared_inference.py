@@ -0,0 +1,394 @@
+import asyncio
+import logging
+import queue
+import signal
+import threading
+import time
+from collections import Counter
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from batching import detect_and_postprocess
+from detections import DetectionSet, PostprocessOptions
+from detector import Detector, create_detector
+from metrics import NULL_TIMINGS
+from worker_pool import DeadlineExceededError, PoolSaturatedError
+
+logger = logging.getLogger(__name__)
+
+# Slot offsets are aligned so frame views start on cache-line boundaries
+_ALIGN = 64
+# Result rows are [x1, y1, x2, y2, score, class_id] float32
+_RESULT_COLUMNS = 6
+# Error reported for frames an inference worker dropped past their deadline
+_DEADLINE_EXCEEDED = "deadline exceeded"
+
+
+def _aligned(size: int) -> int:
+    return (size + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+class SharedFrameRing:
+    """
+    Fixed slots in one shared-memory block, each holding a model-input frame
+    followed by a result area for up to max_results detections.
+
+    The front-end letterboxes straight into a slot and sends only the slot
+    index to an inference worker, which reads the frame in place and writes
+    its detections back into the same slot. acquire()/release() give the
+    FrameBufferPool interface; a slot released while inference on it is still
+    outstanding is only recycled once the result has arrived.
+    """
+
+    def __init__(self, slots: int, frame_bytes: int, max_results: int, name: Optional[str] = None):
+        self.slots = slots
+        self.frame_bytes = _aligned(frame_bytes)
+        self.max_results = max_results
+        self.result_bytes = _aligned(max_results * _RESULT_COLUMNS * 4)
+        self.stride = self.frame_bytes + self.result_bytes
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=self.stride * slots)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self._base = np.frombuffer(self.shm.buf, dtype=np.uint8)
+        self._address = self._base.ctypes.data
+        self._free = list(range(slots - 1, -1, -1))
+        self._in_flight: Set[int] = set()
+        self._deferred: Set[int] = set()
+        self._lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def frame(self, slot: int, shape: Tuple[int, ...]) -> np.ndarray:
+        offset = slot * self.stride
+        size = int(np.prod(shape))
+        return self._base[offset:offset + size].reshape(shape)
+
+    def results(self, slot: int) -> np.ndarray:
+        offset = slot * self.stride + self.frame_bytes
+        return self._base[offset:offset + self.max_results * _RESULT_COLUMNS * 4].view(np.float32).reshape(
+            self.max_results, _RESULT_COLUMNS)
+
+    def slot_of(self, array: np.ndarray) -> Optional[int]:
+        """The slot an array is a frame view of, or None if it lives elsewhere"""
+        offset = array.__array_interface__["data"][0] - self._address
+        if 0 <= offset < self.stride * self.slots and offset % self.stride == 0:
+            return offset // self.stride
+        return None
+
+    def acquire_slot(self) -> int:
+        with self._lock:
+            if not self._free:
+                raise PoolSaturatedError(f"All {self.slots} shared frame slots are in use")
+            return self._free.pop()
+
+    def release_slot(self, slot: int):
+        with self._lock:
+            if slot in self._in_flight:
+                self._deferred.add(slot)
+            else:
+                self._free.append(slot)
+
+    def mark_in_flight(self, slot: int):
+        with self._lock:
+            self._in_flight.add(slot)
+
+    def mark_done(self, slot: int):
+        with self._lock:
+            self._in_flight.discard(slot)
+            if slot in self._deferred:
+                self._deferred.discard(slot)
+                self._free.append(slot)
+
+    @property
+    def free_slots(self) -> int:
+        return len(self._free)
+
+    def write_results(self, slot: int, detections: DetectionSet) -> int:
+        count = min(len(detections), self.max_results)
+        rows = self.results(slot)
+        rows[:count, :4] = detections.boxes[:count]
+        rows[:count, 4] = detections.scores[:count]
+        rows[:count, 5] = detections.class_ids[:count]
+        return count
+
+    def read_results(self, slot: int, count: int) -> DetectionSet:
+        rows = self.results(slot)[:count].copy()
+        return DetectionSet.from_arrays(rows[:, :4], rows[:, 4], rows[:, 5])
+
+    def close(self):
+        del self._base
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+
+class _RingBuffers:
+    """A SharedFrameRing seen as a FrameBufferPool for one input shape"""
+
+    def __init__(self, ring: SharedFrameRing, shape: Tuple[int, ...]):
+        if int(np.prod(shape)) > ring.frame_bytes:
+            raise ValueError(f"Frame shape {shape} does not fit a {ring.frame_bytes} byte shared slot")
+        self.ring = ring
+        self.shape = shape
+
+    def acquire(self) -> np.ndarray:
+        return self.ring.frame(self.ring.acquire_slot(), self.shape)
+
+    def release(self, buffer: np.ndarray):
+        slot = self.ring.slot_of(buffer)
+        if slot is not None:
+            self.ring.release_slot(slot)
+
+
+class RemoteDetector(Detector):
+    """Metadata of a model that runs in the inference worker processes"""
+
+    def __init__(self, spec: str, metadata: Dict[str, Any]):
+        self.spec = spec
+        self.name = metadata["name"]
+        self.version = metadata["version"]
+        self.framework = metadata["framework"]
+        self.classes = list(metadata["classes"])
+        self.input_size = tuple(metadata["input_size"])
+
+    def detect_batch(self, images: List[np.ndarray]) -> List[DetectionSet]:
+        raise RuntimeError(f"Model {self.version} runs in the inference worker processes")
+
+
+def detector_metadata(detector: Detector) -> Dict[str, Any]:
+    return {
+        "name": detector.name,
+        "version": detector.version,
+        "framework": detector.framework,
+        "classes": list(detector.classes),
+        "input_size": list(detector.input_size),
+    }
+
+
+class SharedMemoryScheduler:
+    """BatchScheduler stand-in that hands frames to the inference workers"""
+
+    def __init__(self, client: "SharedInferenceClient", detector: Detector):
+        self.client = client
+        self.detector = detector
+        self.requests = 0
+
+    async def start(self):
+        await self.client.start()
+
+    async def stop(self):
+        pass
+
+    async def detect(self, image: np.ndarray, options: PostprocessOptions = PostprocessOptions(),
+                     timings=NULL_TIMINGS, deadline: Optional[float] = None) -> DetectionSet:
+        self.requests += 1
+        detections, inference, postprocess = await self.client.submit(self.detector, image, options, deadline)
+        timings.record("inference", inference)
+        timings.record("postprocess", postprocess)
+        return detections
+
+    def estimated_wait(self) -> float:
+        # The inference queue is shared by every front-end and not visible
+        # from here; expired frames are still dropped by the workers
+        return 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": "shared_memory",
+            "queued": self.client.pending_for(self.detector.version),
+            "requests": self.requests,
+        }
+
+
+class SharedInferenceClient:
+    """
+    Front-end side of the shared-memory handoff: owns this process's ring,
+    submits slot indices to the shared request queue and resolves futures
+    from its own response queue on a reader thread.
+    """
+
+    def __init__(self, index: int, ring: SharedFrameRing, requests, responses,
+                 models: Dict[str, Dict[str, Any]]):
+        self.index = index
+        self.ring = ring
+        self.requests = requests
+        self.responses = responses
+        self.models = models
+        self._pending: Dict[int, Tuple[asyncio.Future, str]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._reader: Optional[threading.Thread] = None
+
+    def create_detector(self, spec: str) -> Detector:
+        metadata = self.models.get(spec)
+        if metadata is None:
+            raise ValueError(f"Model spec '{spec}' is not loaded by the inference workers; "
+                             f"prefork serving only offers the specs in MODELS")
+        return RemoteDetector(spec, metadata)
+
+    def buffers(self, input_size: Tuple[int, int]) -> _RingBuffers:
+        return _RingBuffers(self.ring, (input_size[1], input_size[0], 3))
+
+    def scheduler(self, detector: Detector) -> SharedMemoryScheduler:
+        return SharedMemoryScheduler(self, detector)
+
+    def pending_for(self, version: str) -> int:
+        return sum(1 for _, pending_version in self._pending.values() if pending_version == version)
+
+    async def start(self):
+        if self._reader is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._reader = threading.Thread(target=self._read_responses, name="shm-responses", daemon=True)
+        self._reader.start()
+
+    async def stop(self):
+        for future, _ in self._pending.values():
+            if not future.done():
+                future.set_exception(RuntimeError("Shared inference client stopped"))
+        self._pending.clear()
+
+    async def submit(self, detector: Detector, image: np.ndarray, options: PostprocessOptions,
+                     deadline: Optional[float] = None) -> Tuple[DetectionSet, float, float]:
+        slot = self.ring.slot_of(image)
+        owned = slot is None
+        if owned:
+            # Frames prepared outside the ring (e.g. warmup) are copied into a slot
+            slot = self.ring.acquire_slot()
+            self.ring.frame(slot, image.shape)[...] = image
+        future = self._loop.create_future()
+        self._pending[slot] = (future, detector.version)
+        self.ring.mark_in_flight(slot)
+        try:
+            self.requests.put((self.index, slot, detector.version, image.shape,
+                               options.conf, options.iou, options.max_det, deadline))
+            return await future
+        finally:
+            if owned:
+                self.ring.release_slot(slot)
+
+    def _read_responses(self):
+        while True:
+            message = self.responses.get()
+            if message is None:
+                return
+            self._loop.call_soon_threadsafe(self._complete, *message)
+
+    def _complete(self, slot: int, count: int, inference: float, postprocess: float, error: Optional[str]):
+        future, _ = self._pending.pop(slot, (None, None))
+        try:
+            if future is None or future.done():
+                return
+            if error == _DEADLINE_EXCEEDED:
+                future.set_exception(DeadlineExceededError("Deadline passed while waiting for an inference worker"))
+            elif error is not None:
+                future.set_exception(RuntimeError(error))
+            else:
+                future.set_result((self.ring.read_results(slot, count), inference, postprocess))
+        finally:
+            self.ring.mark_done(slot)
+
+
+# Set in each front-end process by prefork.py before server is imported
+_client: Optional[SharedInferenceClient] = None
+
+
+def install_client(client: SharedInferenceClient):
+    global _client
+    _client = client
+
+
+def installed_client() -> Optional[SharedInferenceClient]:
+    return _client
+
+
+def inference_worker_main(index: int, specs: List[str], requests, responses, ready, rings_conn,
+                          max_batch_size: int, max_wait_ms: float, warmup_runs: int):
+    """
+    Inference worker process: load every model once, warm it up, report its
+    metadata, attach to the front-ends' rings and serve micro-batches until a
+    None sentinel arrives.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    detectors: Dict[str, Detector] = {}
+    metadata: Dict[str, Dict[str, Any]] = {}
+    for spec in specs:
+        detector = create_detector(spec)
+        width, height = detector.input_size
+        for _ in range(warmup_runs):
+            for size in sorted({1, max_batch_size}):
+                detector.detect_batch([np.zeros((height, width, 3), dtype=np.uint8)] * size)
+        detectors[detector.version] = detector
+        metadata[spec] = detector_metadata(detector)
+    ready.put((index, metadata))
+
+    ring_names, frame_bytes, max_results = rings_conn.recv()
+    rings = [SharedFrameRing(slots, frame_bytes, max_results, name=name) for name, slots in ring_names]
+    max_wait = max_wait_ms / 1000
+    batches: Counter = Counter()
+
+    running = True
+    while running:
+        item = requests.get()
+        if item is None:
+            break
+        batch = [item]
+        deadline = time.monotonic() + max_wait
+        while len(batch) < max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                running = False
+                break
+            batch.append(item)
+
+        # One detector call per model version present in the batch
+        by_version: Dict[str, list] = {}
+        for item in batch:
+            by_version.setdefault(item[2], []).append(item)
+        for version, items in by_version.items():
+            batches[len(items)] += 1
+            _run_shared_batch(detectors.get(version), version, items, rings, responses)
+
+    for ring in rings:
+        ring.close()
+    logger.info(f"Inference worker {index} stopped after {sum(batches.values())} batches")
+
+
+def _run_shared_batch(detector: Optional[Detector], version: str, items: list, rings: List[SharedFrameRing],
+                      responses):
+    now = time.time()
+    live = []
+    for item in items:
+        frontend, slot, *_, deadline = item
+        if deadline is not None and now > deadline:
+            responses[frontend].put((slot, 0, 0.0, 0.0, _DEADLINE_EXCEEDED))
+        else:
+            live.append(item)
+    items = live
+    if not items:
+        return
+    try:
+        if detector is None:
+            raise RuntimeError(f"Model {version} is not loaded by this inference worker")
+        images = [rings[frontend].frame(slot, shape) for frontend, slot, _, shape, _, _, _, _ in items]
+        options = [PostprocessOptions(conf=conf, iou=iou, max_det=max_det)
+                   for _, _, _, _, conf, iou, max_det, _ in items]
+        results, inference, postprocess = detect_and_postprocess(detector, images, options)
+    except Exception as e:
+        for frontend, slot, *_ in items:
+            responses[frontend].put((slot, 0, 0.0, 0.0, str(e)))
+        return
+    for (frontend, slot, *_), detections, post in zip(items, results, postprocess):
+        count = rings[frontend].write_results(slot, detections)
+        responses[frontend].put((slot, count, inference, post, None))
@@ -0,0 +1,146 @@
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from fastapi import HTTPException, WebSocket, WebSocketDisconnect
+
+from serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+
+class LatestFrameSlot:
+    """
+    Single-slot mailbox that always holds the newest unprocessed frame.
+
+    Putting a frame while another is still waiting replaces it, so inference
+    never falls behind the camera: stale frames are dropped, not queued.
+    """
+
+    def __init__(self):
+        self._frame: Optional[Tuple[int, bytes]] = None
+        self._ready = asyncio.Event()
+
+    def put(self, frame_id: int, data: bytes) -> bool:
+        """Store a frame, returning True if an unprocessed frame was dropped"""
+        dropped = self._frame is not None
+        self._frame = (frame_id, data)
+        self._ready.set()
+        return dropped
+
+    async def take(self) -> Tuple[int, bytes]:
+        while self._frame is None:
+            self._ready.clear()
+            await self._ready.wait()
+        frame, self._frame = self._frame, None
+        return frame
+
+
+class StreamStats:
+    """Per-connection counters plus FPS over the most recent frames"""
+
+    def __init__(self, client: str, window: int = 60):
+        self.client = client
+        self.started_at = time.time()
+        self.received = 0
+        self.processed = 0
+        self.dropped = 0
+        self.failed = 0
+        self._completed: Deque[float] = deque(maxlen=window)
+
+    def record_processed(self):
+        self.processed += 1
+        self._completed.append(time.monotonic())
+
+    @property
+    def fps(self) -> float:
+        if len(self._completed) < 2:
+            return 0.0
+        span = self._completed[-1] - self._completed[0]
+        return (len(self._completed) - 1) / span if span > 0 else 0.0
+
+    @property
+    def drop_rate(self) -> float:
+        return self.dropped / self.received if self.received else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "client": self.client,
+            "uptime_s": round(time.time() - self.started_at, 3),
+            "received": self.received,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "fps": round(self.fps, 2),
+            "drop_rate": round(self.drop_rate, 4),
+        }
+
+
+async def serve_frame_stream(
+    websocket: WebSocket,
+    detect: Callable[[bytes], Awaitable[Dict[str, Any]]],
+    stats: StreamStats,
+    max_frame_bytes: int,
+):
+    """
+    Run a latest-frame-wins detection loop on an accepted WebSocket.
+
+    Clients send encoded frames as binary messages. A text message of the
+    form {"frame_id": n} tags the next binary frame; untagged frames are
+    numbered sequentially. Every processed frame gets a JSON reply carrying
+    its frame_id, the detections and the connection's FPS / drop rate.
+    """
+    slot = LatestFrameSlot()
+
+    async def receive_frames():
+        next_id = 0
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("text") is not None:
+                try:
+                    next_id = int(json.loads(message["text"])["frame_id"])
+                except (ValueError, KeyError, TypeError):
+                    await websocket.send_json({"success": False, "error": "Expected {\"frame_id\": <int>}"})
+                continue
+
+            data = message.get("bytes") or b""
+            frame_id, next_id = next_id, next_id + 1
+            stats.received += 1
+            if len(data) > max_frame_bytes:
+                stats.failed += 1
+                await websocket.send_json({"frame_id": frame_id, "success": False,
+                                           "error": f"Frame exceeds {max_frame_bytes} bytes"})
+                continue
+            if slot.put(frame_id, data):
+                stats.dropped += 1
+
+    async def process_frames():
+        while True:
+            frame_id, data = await slot.take()
+            try:
+                result = await detect(data)
+                stats.record_processed()
+            except HTTPException as e:
+                stats.failed += 1
+                result = {"success": False, "status_code": e.status_code, "error": e.detail}
+            except Exception as e:
+                stats.failed += 1
+                logger.error(f"Stream frame {frame_id} failed: {str(e)}")
+                result = {"success": False, "status_code": 500, "error": f"Detection failed: {str(e)}"}
+            await websocket.send_text(dumps({"frame_id": frame_id, **result, "stream": stats.as_dict()}).decode())
+
+    tasks = [asyncio.create_task(receive_frames()), asyncio.create_task(process_frames())]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.exception() is not None and not isinstance(task.exception(), WebSocketDisconnect):
+                raise task.exception()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,147 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Tuple
+
+import numpy as np
+
+from detections import DetectionSet, PostprocessOptions
+from metrics import NULL_TIMINGS
+from preprocess import FrameBufferPool, PreparedFrame, decode_image, letterbox, map_detections_to_original, to_bgr
+
+MERGE_METHODS = ("nms", "wbf")
+
+
+@dataclass(frozen=True)
+class TileOptions:
+    """
+    Opt-in tiled inference. size is the tile edge in original-image pixels
+    (0 means the model input width); overlap is the fraction shared by
+    neighbouring tiles.
+    """
+
+    size: int = 0
+    overlap: float = 0.2
+    merge: str = "nms"
+
+    def cache_tag(self) -> str:
+        return f"t{self.size}-o{self.overlap:g}-{self.merge}"
+
+
+def _tile_starts(length: int, tile: int, stride: int) -> List[int]:
+    if length <= tile:
+        return [0]
+    starts = list(range(0, length - tile, stride))
+    # The last tile is flush with the far edge instead of hanging over it
+    starts.append(length - tile)
+    return starts
+
+
+def tile_grid(width: int, height: int, tile: int, overlap: float) -> np.ndarray:
+    """(N, 4) int [x1, y1, x2, y2] tiles covering the image with the given overlap"""
+    stride = max(1, int(tile * (1 - overlap)))
+    xs = np.asarray(_tile_starts(width, tile, stride))
+    ys = np.asarray(_tile_starts(height, tile, stride))
+    x1, y1 = (grid.ravel() for grid in np.meshgrid(xs, ys))
+    return np.stack([x1, y1, np.minimum(x1 + tile, width), np.minimum(y1 + tile, height)], axis=1)
+
+
+def decode_full(data, timings=NULL_TIMINGS) -> Tuple[np.ndarray, Tuple[int, int]]:
+    """Decode at full resolution; tiling exists to keep the small-object detail"""
+    if isinstance(data, np.ndarray):
+        image = to_bgr(data)
+        return image, (image.shape[1], image.shape[0])
+    with timings.stage("decode"):
+        return decode_image(data)
+
+
+def prepare_tile(image: np.ndarray, tile: np.ndarray, buffers: FrameBufferPool,
+                 timings=NULL_TIMINGS) -> PreparedFrame:
+    """Letterbox one tile (a view of the decoded image) into a model input buffer"""
+    x1, y1, x2, y2 = (int(v) for v in tile)
+    out = buffers.acquire()
+    try:
+        with timings.stage("preprocess"):
+            scale, pad_x, pad_y = letterbox(image[y1:y2, x1:x2], out)
+    except Exception:
+        buffers.release(out)
+        raise
+    return PreparedFrame(input=out, original_size=(x2 - x1, y2 - y1), scale_x=scale, scale_y=scale,
+                         pad_x=pad_x, pad_y=pad_y)
+
+
+def merge_tile_detections(results: List[DetectionSet], tiles: np.ndarray, options: PostprocessOptions,
+                          method: str = "nms") -> DetectionSet:
+    """
+    Shift per-tile detections (in tile pixels) into image coordinates and
+    merge duplicates from overlapping tiles with per-class NMS or WBF.
+    """
+    shifted = []
+    for detections, tile in zip(results, tiles):
+        if len(detections):
+            offset = np.array([tile[0], tile[1], tile[0], tile[1]], dtype=np.float32)
+            shifted.append(DetectionSet(detections.boxes + offset, detections.scores, detections.class_ids))
+    combined = DetectionSet.concatenate(shifted)
+    if len(combined) == 0:
+        return combined
+
+    # Each tile was already NMS'd, and a box inside a single tile cannot
+    # overlap a box from another tile, so only boxes reaching into an
+    # overlap band take part in the cross-tile merge
+    tiles = tiles.astype(np.float32)
+    boxes = combined.boxes
+    inter_w = np.minimum(boxes[:, None, 2], tiles[None, :, 2]) - np.maximum(boxes[:, None, 0], tiles[None, :, 0])
+    inter_h = np.minimum(boxes[:, None, 3], tiles[None, :, 3]) - np.maximum(boxes[:, None, 1], tiles[None, :, 1])
+    shared = ((inter_w > 0) & (inter_h > 0)).sum(axis=1) > 1
+
+    border = combined.select(shared)
+    border = border.wbf(options.iou) if method == "wbf" else border.nms(options.iou)
+    return DetectionSet.concatenate([combined.select(~shared), border]).topk(options.max_det)
+
+
+async def detect_tiled(
+    image: np.ndarray,
+    detect: Callable[[np.ndarray], Awaitable[DetectionSet]],
+    run: Callable[..., Awaitable],
+    buffers: FrameBufferPool,
+    tile: int,
+    overlap: float,
+    options: PostprocessOptions,
+    merge: str = "nms",
+    parallelism: int = 16,
+    max_tiles: int = 256,
+    timings=NULL_TIMINGS,
+) -> Tuple[DetectionSet, int]:
+    """
+    Run every tile of a decoded image through `detect` and merge the boxes.
+
+    Tiles are letterboxed on `run` (a worker pool) and submitted together, so
+    the batch scheduler packs them into full batches; at most `parallelism`
+    tiles hold an input buffer at a time. Returns the merged detections in
+    image pixels and the number of tiles.
+    """
+    tiles = tile_grid(image.shape[1], image.shape[0], tile, overlap)
+    if len(tiles) > max_tiles:
+        raise ValueError(f"Image needs {len(tiles)} tiles of {tile}px, more than the limit of {max_tiles}")
+    slots = asyncio.Semaphore(parallelism)
+
+    async def run_tile(box: np.ndarray) -> DetectionSet:
+        async with slots:
+            frame = await run(prepare_tile, image, box, buffers, timings)
+            try:
+                detections = await detect(frame.input)
+            finally:
+                buffers.release(frame.input)
+            return map_detections_to_original(detections, frame)
+
+    tasks = [asyncio.ensure_future(run_tile(box)) for box in tiles]
+    try:
+        results = await asyncio.gather(*tasks)
+    except BaseException:
+        # One failed tile (or a cancelled request) stops the rest
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    with timings.stage("postprocess"):
+        merged = merge_tile_detections(results, tiles, options, merge)
+    return merged, len(tiles)
@@ -0,0 +1,223 @@
+import logging
+import mmap
+import os
+import tarfile
+import zipfile
+from contextlib import contextmanager
+from pathlib import PurePosixPath
+from tempfile import SpooledTemporaryFile
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple, Union
+
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+# Leading bytes that identify each supported image format
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+    (b"BM", "bmp"),
+    (b"II*\x00", "tiff"),
+    (b"MM\x00*", "tiff"),
+)
+
+SNIFF_BYTES = 16
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff", ".gif"}
+
+
+def sniff_image_format(head: bytes) -> Optional[str]:
+    """Identify the image format from its first bytes, or None if it is not an image"""
+    if len(head) >= 12 and head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    for signature, image_format in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return image_format
+    return None
+
+
+def _archive_kind(upload: UploadFile) -> str:
+    """Classify an upload as 'zip', 'tar' or 'image' from its leading bytes"""
+    upload.file.seek(0)
+    head = upload.file.read(512)
+    upload.file.seek(0)
+    if head.startswith(b"PK\x03\x04"):
+        return "zip"
+    # gzip/bzip2/xz-compressed tarballs, or a plain tar with the ustar magic
+    if head.startswith((b"\x1f\x8b", b"BZh", b"\xfd7zXZ\x00")) or head[257:262] == b"ustar":
+        return "tar"
+    return "image"
+
+
+def _is_image_name(name: str) -> bool:
+    return PurePosixPath(name).suffix.lower() in IMAGE_EXTENSIONS
+
+
+class OversizedImage:
+    """Stands in for an archive member or part over the per-image limit, which is never read"""
+
+    def __init__(self, size: int, limit: int):
+        self.size = size
+        self.limit = limit
+
+    def __str__(self):
+        return f"Image exceeds {self.limit} bytes"
+
+
+def _read_bounded(fileobj: BinaryIO, limit: Optional[int]):
+    """Read at most limit bytes; more than that (e.g. a lying archive header) is OversizedImage"""
+    if limit is None:
+        return fileobj.read()
+    data = fileobj.read(limit + 1)
+    return OversizedImage(len(data), limit) if len(data) > limit else data
+
+
+def _iter_zip(fileobj: BinaryIO, limit: Optional[int]) -> Iterator[Tuple[str, Union[bytes, OversizedImage]]]:
+    with zipfile.ZipFile(fileobj) as archive:
+        for info in archive.infolist():
+            if info.is_dir() or not _is_image_name(info.filename):
+                continue
+            # Refuse before decompressing: a few hundred KB can inflate to gigabytes
+            if limit is not None and info.file_size > limit:
+                yield info.filename, OversizedImage(info.file_size, limit)
+                continue
+            with archive.open(info) as member:
+                yield info.filename, _read_bounded(member, limit)
+
+
+def _iter_tar(fileobj: BinaryIO, limit: Optional[int]) -> Iterator[Tuple[str, Union[bytes, OversizedImage]]]:
+    # Stream mode reads members sequentially, so the archive is never indexed in memory
+    with tarfile.open(fileobj=fileobj, mode="r|*") as archive:
+        for member in archive:
+            if not member.isfile() or not _is_image_name(member.name):
+                continue
+            if limit is not None and member.size > limit:
+                yield member.name, OversizedImage(member.size, limit)
+                continue
+            extracted = archive.extractfile(member)
+            if extracted is not None:
+                yield member.name, _read_bounded(extracted, limit)
+
+
+def iter_upload_images(uploads: List[UploadFile], max_image_bytes: Optional[int] = None
+                       ) -> Iterator[Tuple[str, Union[bytes, OversizedImage]]]:
+    """
+    Yield (name, image bytes) for every image in the uploads, one at a time.
+
+    Plain image parts are yielded as-is; zip and tar (optionally compressed)
+    parts are expanded member by member. Images over max_image_bytes are not
+    read (or decompressed) at all and come out as an OversizedImage instead,
+    for the caller to report per item. This is blocking file IO, so callers
+    on the event loop should advance it from a thread.
+    """
+    for upload in uploads:
+        kind = _archive_kind(upload)
+        if kind == "zip":
+            yield from _iter_zip(upload.file, max_image_bytes)
+        elif kind == "tar":
+            yield from _iter_tar(upload.file, max_image_bytes)
+        else:
+            yield upload.filename or "image", _read_bounded(upload.file, max_image_bytes)
+
+
+@contextmanager
+def upload_buffer(upload: UploadFile) -> Iterator[memoryview]:
+    """
+    Expose an already-received upload as a read-only buffer.
+
+    Uploads spooled to disk are memory-mapped so the decoder reads the page
+    cache instead of a fresh bytes object. Small uploads still in memory
+    (below the spool threshold, 1 MiB) are copied out: a view into the
+    BytesIO would stop it from being closed for as long as anything holds
+    the view, e.g. the traceback of a decode error turned into a 400.
+    """
+    spooled = upload.file
+    if not isinstance(spooled, SpooledTemporaryFile):
+        spooled.seek(0)
+        yield memoryview(spooled.read())
+        return
+
+    spooled.flush()
+    if not getattr(spooled, "_rolled", False):
+        yield memoryview(spooled._file.getvalue())
+        return
+
+    if os.fstat(spooled.fileno()).st_size == 0:
+        yield memoryview(b"")
+        return
+    mapped = mmap.mmap(spooled.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mapped)
+    try:
+        yield view
+    finally:
+        _release_mapping(view, mapped)
+
+
+def _release_mapping(view: memoryview, mapped: mmap.mmap):
+    """
+    Unmap an upload unless something still exports it, e.g. a decoder still
+    running for a request that was cancelled. The mapping is then freed with
+    its last reference instead; the spooled file itself closes either way.
+    """
+    try:
+        view.release()
+        mapped.close()
+    except BufferError:
+        logger.warning("Upload mapping still in use after its request, leaving it to be freed later")
+
+
+class BodySizeLimitMiddleware:
+    """
+    ASGI middleware capping request body size while it streams in.
+
+    Requests whose Content-Length is already over the limit are answered with
+    413 before any of the body is read; chunked or under-declared bodies are
+    cut off with 413 as soon as the running total passes the limit. Limits
+    are chosen by the longest matching path prefix.
+    """
+
+    def __init__(self, app, max_body_bytes: int, path_limits: Optional[Dict[str, int]] = None):
+        self.app = app
+        self.max_body_bytes = max_body_bytes
+        self.path_limits = sorted((path_limits or {}).items(), key=lambda item: len(item[0]), reverse=True)
+
+    def limit_for(self, path: str) -> int:
+        for prefix, limit in self.path_limits:
+            if path.startswith(prefix):
+                return limit
+        return self.max_body_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        limit = self.limit_for(scope["path"])
+        for name, value in scope.get("headers", []):
+            if name == b"content-length":
+                try:
+                    declared = int(value)
+                except ValueError:
+                    declared = 0
+                if declared > limit:
+                    logger.warning(f"Rejecting {declared}-byte request to {scope['path']} (limit {limit})")
+                    response = JSONResponse({"detail": f"Request body exceeds {limit} bytes"}, status_code=413)
+                    await response(scope, receive, send)
+                    return
+                break
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise HTTPException(status_code=413, detail=f"Request body exceeds {limit} bytes")
+            return message
+
+        await self.app(scope, limited_receive, send)
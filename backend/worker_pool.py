@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+from profiling import current_profile
+
+logger = logging.getLogger(__name__)
+
+
+class PoolSaturatedError(Exception):
+    """Raised when the worker pool queue is full and new work is rejected"""
+
+
+class DeadlineExceededError(Exception):
+    """Raised when queued work is dropped because its request deadline has passed"""
+
+
+def _timed_call(fn: Callable, submitted_at: float, deadline: Optional[float], *args) -> Tuple[float, float, Any]:
+    """
+    Run fn in a worker and report how long it waited before starting and how
+    long it ran. Work whose deadline passed while it was queued is dropped.
+    """
+    started_at = time.time()
+    if deadline is not None and started_at > deadline:
+        raise DeadlineExceededError(f"Deadline passed {(started_at - deadline) * 1000:.0f} ms before a worker was free")
+    result = fn(*args)
+    return started_at - submitted_at, time.time() - started_at, result
+
+
+def _worker_ready(hold: float) -> int:
+    time.sleep(hold)
+    return os.getpid()
+
+
+class WorkerPool:
+    """
+    Bounded pool that runs CPU-bound work (decode, inference) off the event loop.
+
+    At most `max_workers` jobs run at once and at most `max_queue` more wait
+    for a worker. Anything beyond that is rejected immediately with
+    PoolSaturatedError so callers can answer 503 instead of piling up latency.
+    """
+
+    def __init__(self, max_workers: int = 4, max_queue: int = 32, kind: str = "thread"):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown worker pool kind: {kind}")
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self.kind = kind
+        self._executor: Executor = self._create_executor()
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._completed = 0
+        self._rejected = 0
+        self._waits: Deque[float] = deque(maxlen=512)
+        self._wait_total = 0.0
+        self._expired = 0
+        # Moving average of how long one job runs, for queue wait estimates
+        self._service_seconds = 0.0
+
+    def _create_executor(self) -> Executor:
+        if self.kind == "process":
+            # Spawned, not forked: by the time the first job is submitted the
+            # server runs several threads, and a forked child can inherit a
+            # lock one of them held and block on it forever
+            return ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+        return ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="detect-worker")
+
+    async def start(self):
+        """
+        Start every process worker now rather than on first use, so the
+        first requests do not pay for interpreter start-up. A no-op for
+        thread pools.
+        """
+        if self.kind != "process":
+            return
+        started = time.perf_counter()
+        # One call per worker, all submitted before any can finish, makes
+        # the executor launch every process
+        await asyncio.gather(*(asyncio.wrap_future(self._executor.submit(_worker_ready, 0.05))
+                               for _ in range(self.max_workers)))
+        logger.info(f"Started {self.max_workers} worker processes in {time.perf_counter() - started:.3f}s")
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue
+
+    async def run(self, fn: Callable, *args, deadline: Optional[float] = None) -> Any:
+        """
+        Run fn(*args) on a worker, rejecting the call if the queue is full.
+        With a deadline (a time.time() value), the call is dropped with
+        DeadlineExceededError if no worker picked it up in time.
+
+        Cancelling the caller drops the call if it is still queued; if it is
+        already running, run() waits for it to finish so its arguments (for
+        example an mmapped upload) stay valid until the worker is done.
+        """
+        with self._lock:
+            if self._pending >= self.capacity:
+                self._rejected += 1
+                raise PoolSaturatedError(
+                    f"Worker pool saturated ({self._pending} pending, capacity {self.capacity})"
+                )
+            self._pending += 1
+
+        profile = current_profile()
+        if profile is not None and self.kind == "thread":
+            # Profiled requests run their work under the request's profiler
+            fn, args = profile.call, (fn, *args)
+        try:
+            future = self._executor.submit(_timed_call, fn, time.time(), deadline, *args)
+            try:
+                wait, service, result = await asyncio.wrap_future(future)
+            except asyncio.CancelledError:
+                if not future.cancel():
+                    await asyncio.wait([asyncio.wrap_future(future)])
+                raise
+        except DeadlineExceededError:
+            with self._lock:
+                self._expired += 1
+            raise
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self._completed += 1
+
+        with self._lock:
+            self._waits.append(wait)
+            self._wait_total += wait
+            self._service_seconds += 0.2 * (service - self._service_seconds)
+        return result
+
+    def estimated_wait(self) -> float:
+        """Seconds a job submitted now would likely wait for a worker"""
+        with self._lock:
+            ahead = self._pending - self.max_workers + 1
+            service = self._service_seconds
+        return max(0, ahead) / self.max_workers * service
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and wait-time figures for sizing replicas"""
+        with self._lock:
+            pending = self._pending
+            waits = sorted(self._waits)
+            completed = self._completed
+            rejected = self._rejected
+            wait_total = self._wait_total
+            expired = self._expired
+
+        def percentile(p: float) -> float:
+            if not waits:
+                return 0.0
+            return waits[min(len(waits) - 1, int(p * len(waits)))] * 1000
+
+        return {
+            "kind": self.kind,
+            "workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": min(pending, self.max_workers),
+            "queue_depth": max(0, pending - self.max_workers),
+            "completed": completed,
+            "rejected": rejected,
+            "expired": expired,
+            "estimated_wait_ms": round(self.estimated_wait() * 1000, 3),
+            "wait_ms": {
+                "avg": round(wait_total / completed * 1000, 3) if completed else 0.0,
+                "p50": round(percentile(0.50), 3),
+                "p95": round(percentile(0.95), 3),
+                "max": round(waits[-1] * 1000, 3) if waits else 0.0,
+            },
+        }
+
+    def shutdown(self, wait: bool = True):
+        logger.info(f"Shutting down {self.kind} worker pool")
+        self._executor.shutdown(wait=wait)
@@ -13,7 +13,9 @@ from PIL import Image
 import numpy as np
 
 # Get backend URL from environment
-BACKEND_URL = "https://760af87b-6614-45f9-a27d-7a84efac691e.preview.emergentagent.com/api"
+BACKEND_URL = os.environ.get(
+    "BACKEND_URL", "https://760af87b-6614-45f9-a27d-7a84efac691e.preview.emergentagent.com/api"
+)
 
 class BackendTester:
     def __init__(self):
@@ -0,0 +1,18 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# The backend modules import each other flat, as they do under `uvicorn server:app`
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+
+@pytest.fixture(scope="session")
+def client():
+    """The app with its startup hooks run, shared by every test: it is a module-level singleton"""
+    from fastapi.testclient import TestClient
+
+    import server
+
+    with TestClient(server.app) as test_client:
+        yield test_client
@@ -0,0 +1,80 @@
+import asyncio
+import threading
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+import server
+from worker_pool import DeadlineExceededError, PoolSaturatedError, WorkerPool
+
+_seeds = iter(range(1000, 2000))
+
+
+def _files():
+    # A fresh image per request, so no answer comes from the result cache
+    image = np.random.default_rng(next(_seeds)).integers(0, 255, (64, 80, 3), dtype=np.uint8)
+    return {"image": ("a.jpg", cv2.imencode(".jpg", image)[1].tobytes(), "image/jpeg")}
+
+
+def test_pool_rejects_work_beyond_its_capacity():
+    release = threading.Event()
+
+    async def main():
+        pool = WorkerPool(max_workers=1, max_queue=0)
+        try:
+            running = asyncio.ensure_future(pool.run(release.wait))
+            await asyncio.sleep(0.05)
+            with pytest.raises(PoolSaturatedError):
+                await pool.run(time.sleep, 0)
+            release.set()
+            await running
+            # Nobody picks it up before the deadline passes
+            with pytest.raises(DeadlineExceededError):
+                await pool.run(time.sleep, 0, deadline=time.time() - 1)
+            return pool.stats()
+        finally:
+            pool.shutdown()
+
+    stats = asyncio.run(main())
+    assert stats["rejected"] == 1 and stats["expired"] == 1
+
+
+def test_request_whose_deadline_cannot_be_met_is_shed_with_503(client, monkeypatch):
+    monkeypatch.setattr(server.worker_pool, "estimated_wait", lambda: 5.0)
+    response = client.post("/api/detect", files=_files(), headers={"X-Deadline-Ms": "500"})
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+    assert "exceeds the remaining deadline" in response.json()["detail"]
+
+    # Without a deadline the same estimate does not shed anything
+    assert client.post("/api/detect", files=_files()).status_code == 200
+
+
+def test_default_deadline_applies_without_a_header(client, monkeypatch):
+    monkeypatch.setattr(server, "DETECT_DEADLINE_MS", 100)
+    monkeypatch.setattr(server.worker_pool, "estimated_wait", lambda: 5.0)
+    assert client.post("/api/detect", files=_files()).status_code == 503
+
+
+def test_deadline_passing_in_the_queue_is_a_504(client, monkeypatch):
+    decode = server.process_image_for_detection
+
+    def slow_decode(*args, **kwargs):
+        time.sleep(0.3)
+        return decode(*args, **kwargs)
+
+    monkeypatch.setattr(server, "process_image_for_detection", slow_decode)
+    response = client.post("/api/detect", files=_files(), headers={"X-Deadline-Ms": "100"})
+    assert response.status_code == 504
+
+
+def test_saturated_pool_is_a_503_with_retry_after(client, monkeypatch):
+    async def saturated(*args, **kwargs):
+        raise PoolSaturatedError("Worker pool saturated")
+
+    monkeypatch.setattr(server.worker_pool, "run", saturated)
+    response = client.post("/api/detect", files=_files())
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
@@ -0,0 +1,55 @@
+import json
+from email import message_from_bytes
+
+import cv2
+import numpy as np
+
+
+def _jpeg(seed: int, shape=(300, 400, 3)) -> bytes:
+    image = np.random.default_rng(seed).integers(0, 255, shape, dtype=np.uint8)
+    return cv2.imencode(".jpg", image)[1].tobytes()
+
+
+def _post(client, data: bytes, params=None, headers=None):
+    return client.post("/api/detect/annotated", params=params, headers=headers,
+                       files={"image": ("a.jpg", data, "image/jpeg")})
+
+
+def test_header_mode_returns_the_image_with_detections_in_a_header(client):
+    response = _post(client, _jpeg(30), params={"max_dim": 200})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/jpeg"
+    detections = json.loads(response.headers["x-detections"])
+    assert detections["success"] is True and detections["image_dimensions"] == [400, 300]
+    rendered = cv2.imdecode(np.frombuffer(response.content, np.uint8), cv2.IMREAD_COLOR)
+    assert rendered.shape == (150, 200, 3)
+
+
+def test_multipart_mode_returns_detections_then_the_image(client):
+    response = _post(client, _jpeg(31), params={"detections": "multipart", "format": "webp"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("multipart/mixed; boundary=")
+    message = message_from_bytes(b"Content-Type: " + response.headers["content-type"].encode() + b"\r\n\r\n"
+                                 + response.content)
+    first, second = message.get_payload()
+    assert first.get_content_type() == "application/json"
+    assert json.loads(first.get_payload(decode=True))["image_dimensions"] == [400, 300]
+    assert second.get_content_type() == "image/webp"
+    assert second.get_payload(decode=True)[8:12] == b"WEBP"
+    assert "x-detections" not in response.headers
+
+
+def test_unchanged_image_revalidates_with_304(client):
+    image = _jpeg(32)
+    first = _post(client, image)
+    etag = first.headers["etag"]
+
+    assert _post(client, image, headers={"If-None-Match": etag}).status_code == 304
+    # Another rendering of the same upload is another representation
+    other = _post(client, image, params={"max_dim": 320}, headers={"If-None-Match": etag})
+    assert other.status_code == 200 and other.headers["etag"] != etag
+    assert _post(client, _jpeg(33), headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_unknown_detections_mode_is_rejected(client):
+    assert _post(client, _jpeg(34), params={"detections": "body"}).status_code == 422
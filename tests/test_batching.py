@@ -0,0 +1,87 @@
+import asyncio
+import time
+
+import numpy as np
+import pytest
+
+from batching import BatchScheduler
+from detections import DetectionSet
+from detector import Detector
+from worker_pool import DeadlineExceededError, WorkerPool
+
+
+class RecordingDetector(Detector):
+    """Returns one box per image, tagged with the image's fill value, and records batch sizes"""
+
+    def __init__(self, fail: bool = False):
+        self.batches = []
+        self.fail = fail
+
+    def detect_batch(self, images):
+        self.batches.append(len(images))
+        if self.fail:
+            raise RuntimeError("inference failed")
+        return [DetectionSet.from_arrays([[0, 0, 10, 10]], [0.9], [int(image[0, 0, 0])]) for image in images]
+
+
+def _image(value: int) -> np.ndarray:
+    return np.full((8, 8, 3), value, np.uint8)
+
+
+def _run(detector, calls, **scheduler_options):
+    async def main():
+        pool = WorkerPool(max_workers=1, max_queue=16)
+        scheduler = BatchScheduler(detector, pool, **scheduler_options)
+        try:
+            return await calls(scheduler)
+        finally:
+            await scheduler.stop()
+            pool.shutdown()
+
+    return asyncio.run(main())
+
+
+def test_concurrent_calls_are_coalesced_up_to_max_batch_size():
+    detector = RecordingDetector()
+    results = _run(detector, lambda scheduler: asyncio.gather(*(scheduler.detect(_image(i)) for i in range(10))),
+                   max_batch_size=4, max_wait_ms=50, max_concurrent_batches=1)
+    assert detector.batches == [4, 4, 2]
+    # Every caller gets its own image's result back
+    assert [int(result.class_ids[0]) for result in results] == list(range(10))
+
+
+def test_partial_batch_flushes_after_the_wait_window():
+    detector = RecordingDetector()
+
+    async def calls(scheduler):
+        started = time.perf_counter()
+        result = await scheduler.detect(_image(1))
+        return result, time.perf_counter() - started
+
+    result, seconds = _run(detector, calls, max_batch_size=8, max_wait_ms=50)
+    assert len(result) == 1 and detector.batches == [1]
+    assert 0.04 <= seconds < 1.0
+
+
+def test_batch_errors_reach_every_waiter():
+    detector = RecordingDetector(fail=True)
+
+    async def calls(scheduler):
+        return await asyncio.gather(*(scheduler.detect(_image(i)) for i in range(3)), return_exceptions=True)
+
+    results = _run(detector, calls, max_batch_size=4, max_wait_ms=20)
+    assert detector.batches == [3]
+    assert all(isinstance(result, RuntimeError) and str(result) == "inference failed" for result in results)
+
+
+def test_images_past_their_deadline_are_dropped_before_inference():
+    detector = RecordingDetector()
+
+    async def calls(scheduler):
+        with pytest.raises(DeadlineExceededError):
+            await scheduler.detect(_image(1), deadline=time.time() + 0.01)
+        return scheduler.stats()
+
+    stats = _run(detector, calls, max_batch_size=8, max_wait_ms=50)
+    assert detector.batches == []
+    assert stats["expired"] == 1
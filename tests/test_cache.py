@@ -0,0 +1,80 @@
+import asyncio
+
+from cache import ResultCache, content_key
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def test_concurrent_misses_share_one_computation():
+    cache = ResultCache()
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "value"
+
+    async def main():
+        return await asyncio.gather(*(cache.get_or_compute("k", compute, len) for _ in range(5)))
+
+    results = _run(main())
+    assert calls == 1
+    assert results[0] == ("value", False)
+    assert all(result == ("value", True) for result in results[1:])
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["coalesced"] == 4
+    assert cache.stats()["entries"] == 1
+
+
+def test_evicts_least_recently_used_by_entry_count():
+    cache = ResultCache(max_entries=2)
+    cache.put("a", 1, 1)
+    cache.put("b", 2, 1)
+    assert cache.get("a") == (True, 1)  # "b" is now the oldest
+    cache.put("c", 3, 1)
+    assert cache.get("b") == (False, None)
+    assert cache.get("a") == (True, 1)
+    assert cache.get("c") == (True, 3)
+    assert cache.evictions == 1
+
+
+def test_evicts_by_total_bytes_and_skips_oversized_values():
+    cache = ResultCache(max_entries=10, max_bytes=10)
+    cache.put("a", 1, 4)
+    cache.put("b", 2, 4)
+    cache.put("c", 3, 4)
+    assert cache.get("a") == (False, None)
+    assert cache.stats()["bytes"] == 8
+    cache.put("huge", 4, 11)
+    assert cache.get("huge") == (False, None)
+    assert cache.stats()["entries"] == 2
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr("cache.time.monotonic", lambda: now)
+    cache = ResultCache(ttl_seconds=5)
+    cache.put("k", "value", 1)
+    now += 4.9
+    assert cache.get("k") == (True, "value")
+    now += 0.2
+    assert cache.get("k") == (False, None)
+    assert cache.expirations == 1
+    assert cache.stats()["entries"] == 0
+
+
+def test_keys_and_invalidation_are_per_model_version():
+    data = b"same image bytes"
+    v1, v2 = content_key(data, "v1"), content_key(data, "v2")
+    assert v1 != v2
+    assert content_key(data, "v1") == v1
+
+    cache = ResultCache()
+    cache.put(v1, "from v1", 1)
+    cache.put(v2, "from v2", 1)
+    cache.invalidate("v1")
+    assert cache.get(v1) == (False, None)
+    assert cache.get(v2) == (True, "from v2")
@@ -0,0 +1,70 @@
+import numpy as np
+
+from detections import DetectionSet, PostprocessOptions, box_iou
+
+
+def _set(boxes, scores, class_ids):
+    return DetectionSet.from_arrays(boxes, scores, class_ids)
+
+
+def test_box_iou():
+    ious = box_iou(np.array([0, 0, 10, 10], np.float32),
+                   np.array([[0, 0, 10, 10], [5, 0, 15, 10], [20, 20, 30, 30]], np.float32))
+    np.testing.assert_allclose(ious, [1.0, 50 / 150, 0.0], rtol=1e-6)
+
+
+def test_nms_suppresses_overlaps_within_a_class_only():
+    detections = _set(
+        [[0, 0, 10, 10], [1, 0, 11, 10], [0, 0, 10, 10], [50, 50, 60, 60]],
+        [0.6, 0.9, 0.8, 0.5],
+        [0, 0, 1, 0],
+    )
+    kept = detections.nms(0.5)
+    # The 0.6 box overlaps the better 0.9 box of its class; the class 1 box survives
+    np.testing.assert_allclose(kept.scores, [0.9, 0.8, 0.5])
+    np.testing.assert_array_equal(kept.class_ids, [0, 1, 0])
+    np.testing.assert_allclose(kept.boxes[0], [1, 0, 11, 10])
+
+
+def test_class_agnostic_nms_suppresses_across_classes():
+    detections = _set([[0, 0, 10, 10], [0, 0, 10, 10]], [0.9, 0.8], [0, 1])
+    assert len(detections.nms(0.5)) == 2
+    kept = detections.nms(0.5, class_agnostic=True)
+    np.testing.assert_array_equal(kept.class_ids, [0])
+
+
+def test_wbf_averages_overlapping_boxes_by_score():
+    detections = _set([[0, 0, 10, 10], [2, 0, 12, 10], [0, 0, 10, 10]], [0.75, 0.25, 0.5], [0, 0, 1])
+    fused = detections.wbf(0.5)
+    assert len(fused) == 2
+    np.testing.assert_allclose(fused.boxes[0], [0.5, 0, 10.5, 10], atol=1e-5)
+    np.testing.assert_allclose(fused.scores, [0.75, 0.5])
+    np.testing.assert_array_equal(fused.class_ids, [0, 1])
+    # The class 1 box is not fused into the class 0 cluster it overlaps
+    np.testing.assert_allclose(fused.boxes[1], [0, 0, 10, 10], atol=1e-5)
+
+
+def test_topk_keeps_the_best_in_descending_order():
+    detections = _set(np.zeros((5, 4)), [0.1, 0.5, 0.3, 0.9, 0.7], [0, 1, 2, 3, 4])
+    top = detections.topk(3)
+    np.testing.assert_allclose(top.scores, [0.9, 0.7, 0.5])
+    np.testing.assert_array_equal(top.class_ids, [3, 4, 1])
+    np.testing.assert_allclose(detections.topk(10).scores, [0.9, 0.7, 0.5, 0.3, 0.1])
+
+
+def test_postprocess_thresholds_then_suppresses_then_truncates():
+    detections = _set(
+        [[0, 0, 10, 10], [1, 0, 11, 10], [20, 0, 30, 10], [40, 0, 50, 10]],
+        [0.9, 0.8, 0.7, 0.1],
+        [0, 0, 0, 0],
+    )
+    result = detections.postprocess(PostprocessOptions(conf=0.25, iou=0.5, max_det=1))
+    np.testing.assert_allclose(result.scores, [0.9])
+    assert len(detections.postprocess(PostprocessOptions(conf=0.25, iou=0.5))) == 2
+
+
+def test_empty_set_passes_through():
+    empty = DetectionSet.empty()
+    assert len(empty.nms(0.5)) == 0
+    assert len(empty.wbf(0.5)) == 0
+    assert len(empty.topk(3)) == 0
@@ -0,0 +1,89 @@
+import base64
+import json
+
+import cv2
+import numpy as np
+import pytest
+from fastapi import HTTPException
+
+from image_inputs import decode_base64_payload, raw_shape, validate_pixels
+
+
+@pytest.mark.parametrize("headers, shape", [
+    ({"x-image-shape": "480,640,3"}, (480, 640, 3)),
+    ({"x-image-shape": "480x640x1"}, (480, 640, 1)),
+    ({"x-image-shape": "480,640"}, (480, 640, 3)),
+    ({"x-image-height": "480", "x-image-width": "640"}, (480, 640, 3)),
+    ({"x-image-height": "480", "x-image-width": "640", "x-image-channels": "4"}, (480, 640, 4)),
+])
+def test_raw_shape(headers, shape):
+    assert raw_shape(headers) == shape
+
+
+@pytest.mark.parametrize("headers", [
+    {}, {"x-image-shape": "480"}, {"x-image-shape": "1,2,3,4"}, {"x-image-shape": "a,b"},
+    {"x-image-height": "480"}, {"x-image-height": "480", "x-image-width": "640", "x-image-channels": "rgb"},
+])
+def test_raw_shape_rejects_incomplete_headers(headers):
+    with pytest.raises(HTTPException) as error:
+        raw_shape(headers)
+    assert error.value.status_code == 422
+
+
+def test_validate_pixels_views_the_body_without_copying():
+    body = bytes(range(24))
+    image = validate_pixels(body, (2, 4, 3), max_side=64)
+    assert image.raw and image.data.shape == (2, 4, 3)
+    assert image.data.tobytes() == body and not image.data.flags.owndata
+
+
+@pytest.mark.parametrize("length, shape, status", [
+    (24, (2, 4, 3), None),
+    (23, (2, 4, 3), 400),
+    (25, (2, 4, 3), 400),
+    (16, (2, 4, 2), 422),
+    (0, (0, 4, 3), 422),
+    (65 * 3, (1, 65, 3), 422),
+])
+def test_validate_pixels_checks_shape_and_length(length, shape, status):
+    if status is None:
+        validate_pixels(b"\0" * length, shape, max_side=64)
+        return
+    with pytest.raises(HTTPException) as error:
+        validate_pixels(b"\0" * length, shape, max_side=64)
+    assert error.value.status_code == status
+
+
+def _png() -> bytes:
+    return cv2.imencode(".png", np.zeros((8, 8, 3), np.uint8))[1].tobytes()
+
+
+@pytest.mark.parametrize("text", [
+    base64.b64encode(_png()).decode(),
+    "data:image/png;base64," + base64.b64encode(_png()).decode(),
+])
+def test_decode_base64_payload(text):
+    image = decode_base64_payload(json.dumps({"image": text}).encode())
+    assert image.source == "base64" and bytes(image.data) == _png()
+
+
+@pytest.mark.parametrize("body, status", [
+    (b"{not json", 400),
+    (b'["image"]', 422),
+    (b'{"image": 5}', 422),
+    (b'{"image": "data:image/png,abc"}', 400),
+    (b'{"image": "not base64!"}', 400),
+    (json.dumps({"image": base64.b64encode(b"plain text").decode()}).encode(), 400),
+])
+def test_decode_base64_payload_rejects_bad_bodies(body, status):
+    with pytest.raises(HTTPException) as error:
+        decode_base64_payload(body)
+    assert error.value.status_code == status
+
+
+def test_detect_accepts_raw_pixels_with_a_two_dimensional_shape(client):
+    pixels = np.random.default_rng(18).integers(0, 255, (48, 64, 3), dtype=np.uint8)
+    response = client.post("/api/detect", content=pixels.tobytes(),
+                           headers={"Content-Type": "application/octet-stream", "X-Image-Shape": "48,64"})
+    assert response.status_code == 200, response.text
+    assert response.json()["image_dimensions"] == [64, 48]
@@ -0,0 +1,157 @@
+import asyncio
+import io
+import json
+import time
+from contextlib import asynccontextmanager
+
+import cv2
+import numpy as np
+import pytest
+from starlette.datastructures import UploadFile
+
+from job_store import Job, MemoryJobStore, SQLiteJobStore
+from jobs import JobManager
+
+
+def _jpeg(seed: int) -> bytes:
+    image = np.random.default_rng(seed).integers(0, 255, (48, 64, 3), dtype=np.uint8)
+    return cv2.imencode(".jpg", image)[1].tobytes()
+
+
+def _uploads(count: int):
+    return [UploadFile(io.BytesIO(_jpeg(i)), filename=f"{i}.jpg") for i in range(count)]
+
+
+def _runner(gate: asyncio.Event = None):
+    """Item runner reporting each image's size, held at `gate` until it is set"""
+
+    @asynccontextmanager
+    async def item_runner(job: Job):
+        async def run_item(index, filename, data):
+            if gate is not None:
+                await gate.wait()
+            return {"index": index, "filename": filename, "success": True, "bytes": len(data)}
+
+        yield run_item
+
+    return item_runner
+
+
+async def _wait_for(manager: JobManager, job_id: str, done) -> Job:
+    while True:
+        updated = manager.updates(job_id)
+        job = await manager.get(job_id)
+        if done(job):
+            return job
+        await asyncio.wait_for(updated.wait(), timeout=5)
+
+
+def test_submitted_job_runs_and_stores_every_result(tmp_path):
+    async def main():
+        manager = JobManager(MemoryJobStore(), _runner(), str(tmp_path), flush_size=2)
+        await manager.start()
+        try:
+            job = await manager.submit(_uploads(5), options={"conf": 0.5})
+            assert job.status == "queued"
+            job = await _wait_for(manager, job.id, lambda job: job.finished)
+            return job, await manager.results(job.id), await manager.results(job.id, start=3)
+        finally:
+            await manager.stop()
+
+    job, results, tail = asyncio.run(main())
+    assert (job.status, job.processed, job.failed, job.total) == ("succeeded", 5, 0, 5)
+    assert [row["seq"] for row in results] == [0, 1, 2, 3, 4]
+    assert sorted(row["filename"] for row in results) == [f"{i}.jpg" for i in range(5)]
+    assert [row["seq"] for row in tail] == [3, 4]
+    # Inputs are removed once the job has finished
+    assert not (tmp_path / job.id).exists()
+
+
+def test_cancel_stops_a_running_job(tmp_path):
+    async def main():
+        gate = asyncio.Event()
+        manager = JobManager(MemoryJobStore(), _runner(gate), str(tmp_path))
+        await manager.start()
+        try:
+            job = await manager.submit(_uploads(3))
+            await _wait_for(manager, job.id, lambda job: job.status == "running")
+            cancelled = await manager.cancel(job.id)
+            with pytest.raises(ValueError):
+                await manager.cancel(job.id)
+            return cancelled
+        finally:
+            await manager.stop()
+
+    job = asyncio.run(main())
+    assert job.status == "cancelled" and job.finished_at is not None
+    assert not (tmp_path / job.id).exists()
+
+
+def test_sqlite_jobs_interrupted_by_a_restart_are_rerun(tmp_path):
+    store_path, inputs = str(tmp_path / "jobs.db"), str(tmp_path / "inputs")
+
+    async def interrupted():
+        manager = JobManager(SQLiteJobStore(store_path), _runner(asyncio.Event()), inputs)
+        await manager.start()
+        job = await manager.submit(_uploads(4))
+        await _wait_for(manager, job.id, lambda job: job.status == "running")
+        await manager.stop()
+        return job.id
+
+    async def restarted(job_id):
+        manager = JobManager(SQLiteJobStore(store_path), _runner(), inputs)
+        await manager.start()
+        try:
+            job = await _wait_for(manager, job_id, lambda job: job.finished)
+            return job, await manager.results(job_id)
+        finally:
+            await manager.stop()
+
+    job_id = asyncio.run(interrupted())
+    job, results = asyncio.run(restarted(job_id))
+    assert (job.status, job.processed) == ("succeeded", 4)
+    assert [row["seq"] for row in results] == [0, 1, 2, 3]
+
+
+@pytest.mark.parametrize("kind", ["memory", "sqlite"])
+def test_finished_jobs_are_pruned_after_retention(tmp_path, kind):
+    now = time.time()
+
+    async def main():
+        store = MemoryJobStore() if kind == "memory" else SQLiteJobStore(str(tmp_path / "jobs.db"))
+        manager = JobManager(store, _runner(), str(tmp_path / "inputs"), retention=3600)
+        # Not started, so the periodic pruner does not race the explicit prune
+        await store.open()
+        try:
+            jobs = [Job(id="old", status="succeeded", finished_at=now - 7200),
+                    Job(id="recent", status="failed", finished_at=now - 60),
+                    Job(id="running", status="running", created_at=now - 7200)]
+            for job in jobs:
+                await store.save_job(job)
+                await store.add_results(job.id, [{"seq": 0, "success": True}])
+            pruned = await manager.prune()
+            remaining = sorted(job.id for job in await manager.list())
+            return pruned, remaining, await store.get_results("old"), await store.get_results("recent")
+        finally:
+            await store.close()
+
+    pruned, remaining, old_results, recent_results = asyncio.run(main())
+    assert pruned == 1
+    assert remaining == ["recent", "running"]
+    assert old_results == [] and len(recent_results) == 1
+
+
+def test_job_results_follow_until_finished(client):
+    files = [("images", (f"{i}.jpg", _jpeg(i), "image/jpeg")) for i in range(3)]
+    submitted = client.post("/api/jobs", files=files)
+    assert submitted.status_code == 202
+    job_id = submitted.json()["id"]
+
+    followed = client.get(f"/api/jobs/{job_id}/results", params={"follow": "true"})
+    rows = [json.loads(line) for line in followed.text.splitlines()]
+    assert [row["seq"] for row in rows] == [0, 1, 2]
+    assert all(row["success"] for row in rows)
+    status = client.get(f"/api/jobs/{job_id}").json()
+    assert status["status"] == "succeeded" and status["processed"] == 3
+    assert client.delete(f"/api/jobs/{job_id}").status_code == 409
+    assert client.get("/api/jobs/unknown").status_code == 404
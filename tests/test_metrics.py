@@ -0,0 +1,36 @@
+import threading
+
+import pytest
+
+from metrics import NULL_TIMINGS, MetricsRegistry, RequestTimings
+
+
+def test_request_timings_add_up_across_threads():
+    timings = RequestTimings()
+
+    def work():
+        for _ in range(10_000):
+            timings.record("preprocess", 0.001)
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert timings.snapshot()["preprocess"] == pytest.approx(80.0)
+
+
+def test_server_timing_and_histograms():
+    timings = RequestTimings()
+    timings.record("decode", 0.002)
+    timings.record("decode", 0.001)
+    with timings.stage("inference"):
+        pass
+    assert timings.server_timing().startswith("decode;dur=3.00, inference;dur=")
+
+    registry = MetricsRegistry()
+    registry.observe_request(timings, 0.01)
+    counts, total, count = registry.stage_histograms["decode"].snapshot()
+    assert count == 1 and total == pytest.approx(0.003)
+    assert NULL_TIMINGS.snapshot() == {} and NULL_TIMINGS.server_timing() == ""
@@ -0,0 +1,115 @@
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from detections import DetectionSet
+from motion import MotionOptions, MotionSession, MotionSessions, gate_frame, merge_partial, motion_region
+
+OPTIONS = MotionOptions(full_interval=5)
+
+
+def _frame(*boxes) -> np.ndarray:
+    """A flat grey 320x480 frame with a white rectangle for each [x1, y1, x2, y2]"""
+    image = np.full((320, 480, 3), 90, np.uint8)
+    for x1, y1, x2, y2 in boxes:
+        image[y1:y2, x1:x2] = 255
+    return image
+
+
+def _decide(session: MotionSession, image: np.ndarray, key: str = "model"):
+    return session.decide(gate_frame(image, OPTIONS.gate_width), (480, 320), key)
+
+
+def _started_session() -> MotionSession:
+    session = MotionSession("cam", OPTIONS)
+    image = _frame([40, 40, 80, 80])
+    decision, fraction, box = _decide(session, image)
+    assert (decision, fraction, box) == ("full", 1.0, None)
+    session.record_full(gate_frame(image, OPTIONS.gate_width), DetectionSet.empty(), (480, 320), (480, 320),
+                        "model", 0.05)
+    return session
+
+
+def test_static_frames_are_skipped():
+    session = _started_session()
+    decision, fraction, box = _decide(session, _frame([40, 40, 80, 80]))
+    assert decision == "skip" and fraction == 0 and box is None
+
+
+def test_localised_change_is_a_partial_pass_over_its_box():
+    session = _started_session()
+    decision, fraction, box = _decide(session, _frame([40, 40, 80, 80], [300, 200, 340, 240]))
+    assert decision == "partial" and fraction > OPTIONS.threshold
+    # Gate pixels are a third of the frame's
+    x1, y1, x2, y2 = box * 3
+    assert x1 <= 300 < 340 <= x2 + 3 and y1 <= 200 < 240 <= y2 + 3
+
+
+def test_large_changes_and_new_keys_get_a_full_pass():
+    session = _started_session()
+    assert _decide(session, _frame([0, 0, 400, 300]))[0] == "full"
+    assert _decide(session, _frame([40, 40, 80, 80]), key="other-model")[0] == "full"
+
+
+def test_full_pass_is_forced_every_full_interval_frames():
+    session = _started_session()
+    decisions = []
+    for _ in range(OPTIONS.full_interval):
+        decision = _decide(session, _frame([40, 40, 80, 80]))[0]
+        decisions.append(decision)
+        if decision == "skip":
+            session.record_skip(0.001)
+    assert decisions == ["skip"] * (OPTIONS.full_interval - 1) + ["full"]
+    assert session.saved_seconds == pytest.approx((OPTIONS.full_interval - 1) * 0.049)
+
+
+def test_motion_region_is_scaled_padded_and_clipped():
+    region = motion_region(np.array([10, 10, 20, 20]), (100, 160), (320, 480), min_side=64)
+    assert region.tolist() == [13, 16, 77, 80]
+    # Grown to min_side around its centre, but never past the image
+    assert motion_region(np.array([150, 90, 160, 100]), (100, 160), (320, 480), min_side=64).tolist() == [
+        433, 272, 480, 320]
+
+
+def test_merge_partial_replaces_detections_inside_the_region():
+    previous = DetectionSet.from_arrays([[0, 0, 20, 20], [100, 100, 120, 120], [95, 50, 125, 70]],
+                                        [0.9, 0.8, 0.7], [0, 1, 2])
+    fresh = DetectionSet.from_arrays([[102, 101, 121, 119]], [0.85], [1])
+    merged = merge_partial(previous, fresh, np.array([90, 90, 200, 200]), iou=0.5, max_det=10)
+    # The stale box inside the region is replaced; the one only touching it stays
+    assert sorted(merged.boxes.tolist()) == [[0, 0, 20, 20], [95, 50, 125, 70], [102, 101, 121, 119]]
+
+
+def test_idle_sessions_expire_and_keep_their_totals():
+    sessions = MotionSessions(OPTIONS, max_sessions=2, ttl_seconds=60)
+    stale = sessions.get_or_create("stale")
+    stale.record_skip(0.0)
+    stale.last_used -= 120
+    assert sessions.get("stale") is None
+
+    for session_id in ("a", "b", "c"):
+        sessions.get_or_create(session_id)
+    # The least recently used is evicted past max_sessions
+    assert [session.id for session in sessions.sessions()] == ["b", "c"]
+    stats = sessions.stats()
+    assert (stats["active"], stats["evicted"], stats["created"], stats["skip"]) == (2, 2, 4, 1)
+
+
+def _jpeg(image: np.ndarray) -> bytes:
+    return cv2.imencode(".jpg", image)[1].tobytes()
+
+
+def test_session_frames_are_gated_and_cannot_be_tiled(client):
+    session = f"cam-{time.monotonic_ns()}"
+    files = lambda image: {"image": ("frame.jpg", _jpeg(image), "image/jpeg")}
+    first = client.post("/api/detect", params={"session": session}, files=files(_frame([40, 40, 80, 80])))
+    second = client.post("/api/detect", params={"session": session}, files=files(_frame([40, 40, 80, 80])))
+    assert (first.headers["x-motion"], second.headers["x-motion"]) == ("full", "skip")
+    assert second.json()["detections"] == first.json()["detections"]
+    assert client.get(f"/api/sessions/{session}").json()["skip"] == 1
+
+    tiled = client.post("/api/detect", params={"session": session, "tiled": "true"},
+                        files=files(_frame([40, 40, 80, 80])))
+    assert tiled.status_code == 422
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("onnx")
+pytest.importorskip("onnxruntime")
+
+from benchmarks.make_tiny_onnx import build_tiny_yolo  # noqa: E402
+from detections import DetectionSet, PostprocessOptions  # noqa: E402
+from detector import CLASS_NAMES, MockDetector, create_detector  # noqa: E402
+from onnx_detector import OnnxDetector  # noqa: E402
+from serialization import detection_payload  # noqa: E402
+
+SIZE = 64
+
+
+@pytest.fixture(scope="module")
+def tiny_model(tmp_path_factory):
+    return build_tiny_yolo(str(tmp_path_factory.mktemp("onnx") / "tiny-yolo.onnx"), size=SIZE)
+
+
+def _frames(count):
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 255, (SIZE, SIZE, 3), dtype=np.uint8) for _ in range(count)]
+
+
+def _assert_detection_set(detections: DetectionSet):
+    assert detections.boxes.dtype == np.float32 and detections.boxes.shape == (len(detections), 4)
+    assert detections.scores.dtype == np.float32 and detections.scores.shape == (len(detections),)
+    assert detections.class_ids.dtype == np.int32 and detections.class_ids.shape == (len(detections),)
+
+
+@pytest.mark.parametrize("precision", ["fp32", "int8"])
+def test_output_matches_the_yolo_detector_format(tiny_model, precision):
+    detector = OnnxDetector(tiny_model, precision=precision, intra_op_threads=1, inter_op_threads=1)
+    reference = MockDetector()
+    assert detector.input_size == (SIZE, SIZE)
+    assert detector.classes == reference.classes == CLASS_NAMES
+    assert detector.info().keys() >= reference.info().keys()
+
+    frames = _frames(3)
+    results = detector.detect_batch(frames)
+    assert len(results) == len(frames)
+    for detections, expected in zip(results, reference.detect_batch(frames)):
+        _assert_detection_set(detections)
+        _assert_detection_set(expected)
+        # Raw candidates: one per anchor above min_score, corner boxes in input pixels
+        assert 0 < len(detections) <= (SIZE // 8) ** 2
+        assert np.all(detections.boxes[:, 2:] >= detections.boxes[:, :2])
+        assert set(detections.class_ids.tolist()) <= set(range(len(CLASS_NAMES)))
+
+    kept = results[0].postprocess(PostprocessOptions(conf=0.0, max_det=5))
+    payload = detection_payload(kept, detector.classes, SIZE, SIZE, 0.0, detector.version)
+    assert {row["class_name"] for row in payload["detections"]} <= set(CLASS_NAMES)
+
+
+def test_batched_and_single_image_results_agree(tiny_model):
+    detector = OnnxDetector(tiny_model, intra_op_threads=1, inter_op_threads=1)
+    frames = _frames(2)
+    batched = detector.detect_batch(frames)
+    for frame, detections in zip(frames, batched):
+        single = detector.detect(frame)
+        np.testing.assert_allclose(single.boxes, detections.boxes, rtol=1e-4, atol=1e-3)
+        np.testing.assert_array_equal(single.class_ids, detections.class_ids)
+
+
+def test_class_names_come_from_model_metadata(tmp_path):
+    classes = ["person", "car", "bicycle", "dog"]
+    detector = OnnxDetector(build_tiny_yolo(str(tmp_path / "custom.onnx"), size=SIZE, classes=classes))
+    assert detector.classes == classes
+    assert detector.detect(_frames(1)[0]).class_ids.max() < len(classes)
+
+
+def test_model_specs_select_precision(tiny_model):
+    fp32 = create_detector(f"onnx:{tiny_model}")
+    int8 = create_detector(f"onnx-int8:{tiny_model}")
+    assert (fp32.precision, int8.precision) == ("fp32", "int8")
+    assert int8.version == f"{fp32.version}-int8"
+    with pytest.raises(ValueError):
+        create_detector("onnx:/does/not/exist.onnx")
@@ -0,0 +1,16 @@
+from profiling import Profiler
+
+
+def test_token_check_handles_non_ascii_header_values(tmp_path):
+    profiler = Profiler(str(tmp_path), token="sécret")
+    # Header values arrive decoded as latin-1
+    assert profiler.check_token("sécret".encode().decode("latin-1"))
+    assert not profiler.check_token("\xff\xfe")
+    assert not profiler.check_token("secret")
+    assert not profiler.check_token(None)
+
+
+def test_non_matching_token_is_counted_and_not_profiled(tmp_path):
+    profiler = Profiler(str(tmp_path), token="token")
+    assert profiler.begin("\xe9", None) is None
+    assert profiler.rejected_tokens == 1
@@ -0,0 +1,61 @@
+import asyncio
+import threading
+
+from detector import create_detector
+from registry import ModelRegistry
+from worker_pool import WorkerPool
+
+
+def test_hot_load_keeps_the_registry_ready_and_shows_as_pending():
+    gate = threading.Event()
+
+    def factory(spec):
+        if spec == "mock:v2":
+            gate.wait(5)
+        return create_detector(spec)
+
+    async def main():
+        pool = WorkerPool(max_workers=2, max_queue=16)
+        registry = ModelRegistry(factory, pool, warmup_runs=1)
+        try:
+            startup = registry.load_all(["mock"])
+            # Pending from the call, before the coroutine first runs
+            assert registry.pending == ["mock"] and not registry.ready
+            await startup
+            assert registry.started and registry.ready and registry.pending == []
+
+            loading = asyncio.create_task(registry.load("mock:v2"))
+            await asyncio.sleep(0.05)
+            assert registry.ready
+            assert registry.pending == ["mock:v2"]
+
+            gate.set()
+            await loading
+            assert registry.ready and registry.pending == []
+            assert sorted(registry.versions()) == ["YOLOv8n-space-v1.0", "v2"]
+        finally:
+            gate.set()
+            await registry.stop()
+            pool.shutdown()
+
+    asyncio.run(main())
+
+
+def test_failed_startup_load_is_reported():
+    async def main():
+        pool = WorkerPool(max_workers=1, max_queue=4)
+        registry = ModelRegistry(create_detector, pool, warmup_runs=1)
+        try:
+            try:
+                await registry.load_all(["mock", "unknown:model"])
+            except ValueError:
+                pass
+            assert registry.started
+            assert registry.pending == ["unknown:model"]
+            assert "unknown:model" in registry.startup_error
+            assert await registry.wait_started(0)
+        finally:
+            await registry.stop()
+            pool.shutdown()
+
+    asyncio.run(main())
@@ -0,0 +1,78 @@
+import json
+
+import cv2
+import msgpack
+import numpy as np
+import pytest
+
+from detections import DetectionSet
+from serialization import (COLUMNAR_MEDIA_TYPE, MSGPACK_MEDIA_TYPE, columnar_payload, detection_payload, dumps,
+                           negotiate_format)
+
+
+@pytest.mark.parametrize("accept, fmt", [
+    (None, "json"),
+    ("", "json"),
+    ("*/*", "json"),
+    ("text/html,application/xhtml+xml,*/*;q=0.8", "json"),
+    (COLUMNAR_MEDIA_TYPE, "columnar"),
+    ("application/x-msgpack", "msgpack"),
+    (f"application/json;q=0.5, {MSGPACK_MEDIA_TYPE}", "msgpack"),
+    (f"{COLUMNAR_MEDIA_TYPE};q=0.9, application/json", "json"),
+    # Equal quality goes to the first listed
+    (f"{COLUMNAR_MEDIA_TYPE}, application/json", "columnar"),
+    ("image/png", None),
+    ("application/json;q=0", None),
+])
+def test_negotiate_format(accept, fmt):
+    assert negotiate_format(accept) == fmt
+
+
+def _detections() -> DetectionSet:
+    return DetectionSet.from_arrays([[10, 20, 50, 60], [0, 0, 5, 5]], [0.9, 0.4], [1, 0])
+
+
+def test_dumps_matches_the_standard_encoder():
+    payload = detection_payload(_detections(), ["helmet", "vest"], 640, 480, 0.0123, "v1")
+    assert json.loads(dumps(payload)) == json.loads(json.dumps(payload))
+    assert payload["detections"][0] == {"class_name": "vest", "confidence": pytest.approx(0.9),
+                                        "bbox": [10.0, 20.0, 40.0, 40.0]}
+    assert payload["processing_time"] == "0.012s"
+
+
+def test_columnar_payload_binary_columns_round_trip():
+    detections = _detections()
+    text = columnar_payload(detections, ["helmet", "vest"], 640, 480, 0.01, "v1")["detections"]
+    binary = columnar_payload(detections, ["helmet", "vest"], 640, 480, 0.01, "v1", binary=True)["detections"]
+    assert np.frombuffer(binary["class_id"], "<i4").tolist() == text["class_id"] == [1, 0]
+    bbox = np.frombuffer(binary["bbox"], "<f4").reshape(-1, 4)
+    assert bbox[:, 2].tolist() == text["width"] == [40.0, 5.0]
+    assert np.frombuffer(binary["confidence"], "<f4") == pytest.approx(text["confidence"])
+
+
+def _jpeg() -> bytes:
+    image = np.random.default_rng(9).integers(0, 255, (96, 128, 3), dtype=np.uint8)
+    return cv2.imencode(".jpg", image)[1].tobytes()
+
+
+def test_detect_negotiates_the_response_format(client):
+    files = {"image": ("a.jpg", _jpeg(), "image/jpeg")}
+    default = client.post("/api/detect", files=files)
+    columnar = client.post("/api/detect", files=files, headers={"Accept": COLUMNAR_MEDIA_TYPE})
+    packed = client.post("/api/detect", files=files, headers={"Accept": MSGPACK_MEDIA_TYPE})
+
+    assert default.headers["content-type"] == "application/json"
+    assert columnar.headers["content-type"] == COLUMNAR_MEDIA_TYPE
+    assert packed.headers["content-type"] == MSGPACK_MEDIA_TYPE
+    assert default.headers["vary"] == "Accept"
+    total = default.json()["total_detections"]
+    assert columnar.json()["total_detections"] == total == len(columnar.json()["detections"]["class_id"])
+    unpacked = msgpack.unpackb(packed.content)
+    assert unpacked["total_detections"] == total
+    assert len(unpacked["detections"]["bbox"]) == total * 4 * 4
+
+
+def test_detect_refuses_unservable_accept_with_406(client):
+    response = client.post("/api/detect", files={"image": ("a.jpg", _jpeg(), "image/jpeg")},
+                           headers={"Accept": "image/png"})
+    assert response.status_code == 406
@@ -0,0 +1,22 @@
+import cv2
+import numpy as np
+
+
+def _jpeg(seed: int) -> bytes:
+    image = np.random.default_rng(seed).integers(0, 255, (120, 160, 3), dtype=np.uint8)
+    return cv2.imencode(".jpg", image)[1].tobytes()
+
+
+def test_repeat_detect_request_is_served_from_the_cache(client):
+    image = _jpeg(12)
+    before = client.get("/api/stats").json()["cache"]
+
+    first = client.post("/api/detect", files={"image": ("a.jpg", image, "image/jpeg")})
+    second = client.post("/api/detect", files={"image": ("a.jpg", image, "image/jpeg")})
+
+    assert first.status_code == second.status_code == 200
+    assert first.json()["detections"] == second.json()["detections"]
+    after = client.get("/api/stats").json()["cache"]
+    assert after["misses"] == before["misses"] + 1
+    assert after["hits"] == before["hits"] + 1
+    assert after["entries"] == before["entries"] + 1
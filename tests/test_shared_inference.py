@@ -0,0 +1,105 @@
+import asyncio
+import queue
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import server
+from detections import DetectionSet, PostprocessOptions
+from detector import MockDetector
+from shared_inference import SharedFrameRing, SharedInferenceClient, _run_shared_batch, detector_metadata
+from worker_pool import DeadlineExceededError, PoolSaturatedError
+
+
+@pytest.fixture
+def ring():
+    ring = SharedFrameRing(slots=2, frame_bytes=64 * 64 * 3, max_results=4)
+    yield ring
+    ring.close()
+    ring.unlink()
+
+
+def test_ring_slots_are_recycled_only_after_inference(ring):
+    first, second = ring.acquire_slot(), ring.acquire_slot()
+    with pytest.raises(PoolSaturatedError):
+        ring.acquire_slot()
+
+    frame = ring.frame(first, (64, 64, 3))
+    assert ring.slot_of(frame) == first and ring.slot_of(np.zeros((64, 64, 3), np.uint8)) is None
+
+    # Released while a worker still reads it: held back until the result arrives
+    ring.mark_in_flight(first)
+    ring.release_slot(first)
+    assert ring.free_slots == 0
+    ring.mark_done(first)
+    ring.release_slot(second)
+    assert ring.free_slots == 2
+
+
+def test_ring_results_round_trip_and_truncate(ring):
+    detections = MockDetector().detect_batch([np.zeros((64, 64, 3), np.uint8)] * 5)[0]
+    slot = ring.acquire_slot()
+    count = ring.write_results(slot, detections)
+    assert count == min(len(detections), ring.max_results)
+    restored = ring.read_results(slot, count)
+    np.testing.assert_allclose(restored.boxes, detections.boxes[:count], rtol=1e-6)
+    assert restored.class_ids.tolist() == detections.class_ids[:count].tolist()
+
+
+class FixedDetector(MockDetector):
+    """Boxes derived from the frame's pixels, so a result shows which frame the worker read"""
+
+    def detect_batch(self, images):
+        return [DetectionSet.from_arrays([[0, 0, 10, 10], [5, 5, 20, int(image[0, 0, 0]) + 6]], [0.9, 0.8], [0, 1])
+                for image in images]
+
+
+def _serve(ring: SharedFrameRing, detector, requests: queue.Queue, responses: queue.Queue):
+    """One inference worker loop, on a thread instead of a process"""
+    while (item := requests.get()) is not None:
+        _run_shared_batch(detector, item[2], [item], [ring], [responses])
+    responses.put(None)
+
+
+def test_frames_are_detected_in_place_through_the_ring(ring):
+    detector = FixedDetector()
+    requests, responses = queue.Queue(), queue.Queue()
+    worker = threading.Thread(target=_serve, args=(ring, detector, requests, responses))
+    worker.start()
+    client = SharedInferenceClient(0, ring, requests, responses, {"mock": detector_metadata(detector)})
+    remote = client.create_detector("mock")
+    image = np.random.default_rng(0).integers(0, 255, (64, 64, 3), dtype=np.uint8)
+    options = PostprocessOptions(max_det=4)
+
+    async def main():
+        await client.start()
+        buffers = client.buffers((64, 64))
+        frame = buffers.acquire()
+        frame[...] = image
+        try:
+            detections, _, _ = await client.submit(remote, frame, options)
+        finally:
+            buffers.release(frame)
+            # A live view into the ring would stop it from being closed
+            del frame
+        with pytest.raises(DeadlineExceededError):
+            await client.submit(remote, image, options, deadline=time.time() - 1)
+        return detections
+
+    try:
+        detections = asyncio.run(main())
+    finally:
+        requests.put(None)
+        worker.join()
+
+    expected = detector.detect_batch([image])[0].postprocess(options)
+    np.testing.assert_allclose(detections.boxes, expected.boxes, rtol=1e-6)
+    assert ring.free_slots == ring.slots
+
+
+def test_process_local_state_is_refused_under_prefork(client, monkeypatch):
+    monkeypatch.setattr(server, "shared_client", object())
+    assert client.get("/api/sessions").status_code == 501
+    assert client.post("/api/models", json={"spec": "mock:v2"}).status_code == 501
@@ -0,0 +1,49 @@
+import numpy as np
+
+from detections import DetectionSet, PostprocessOptions
+from tiling import merge_tile_detections, tile_grid
+
+# Two 120px tiles of a 200x100 image, sharing the band x = 80..120
+TILES = np.array([[0, 0, 120, 100], [80, 0, 200, 100]])
+
+
+def _set(boxes, scores, class_ids):
+    return DetectionSet.from_arrays(boxes, scores, class_ids)
+
+
+def test_tile_grid_covers_the_image_with_overlap():
+    tiles = tile_grid(200, 100, 120, 0.25)
+    np.testing.assert_array_equal(tiles, [[0, 0, 120, 100], [80, 0, 200, 100]])
+    assert len(tile_grid(100, 100, 120, 0.25)) == 1
+
+
+def test_box_across_the_seam_is_merged_once_with_nms():
+    # The same object at x = 90..110 in image pixels, seen by both tiles
+    left = _set([[90, 40, 110, 60]], [0.9], [0])
+    right = _set([[11, 40, 31, 60]], [0.8], [0])
+    merged = merge_tile_detections([left, right], TILES, PostprocessOptions(iou=0.5))
+    assert len(merged) == 1
+    np.testing.assert_allclose(merged.boxes[0], [90, 40, 110, 60])
+    np.testing.assert_allclose(merged.scores, [0.9])
+
+
+def test_box_across_the_seam_is_fused_with_wbf():
+    left = _set([[90, 40, 110, 60]], [0.75], [0])
+    right = _set([[12, 40, 32, 60]], [0.25], [0])
+    merged = merge_tile_detections([left, right], TILES, PostprocessOptions(iou=0.5), method="wbf")
+    assert len(merged) == 1
+    np.testing.assert_allclose(merged.boxes[0], [90.5, 40, 110.5, 60], atol=1e-4)
+
+
+def test_different_classes_across_the_seam_are_both_kept():
+    left = _set([[90, 40, 110, 60]], [0.9], [0])
+    right = _set([[10, 40, 30, 60]], [0.8], [1])
+    merged = merge_tile_detections([left, right], TILES, PostprocessOptions(iou=0.5))
+    assert sorted(merged.class_ids.tolist()) == [0, 1]
+
+
+def test_boxes_inside_one_tile_are_kept_and_shifted():
+    left = _set([[10, 10, 30, 30]], [0.9], [0])
+    right = _set([[90, 10, 110, 30]], [0.8], [0])
+    merged = merge_tile_detections([left, right], TILES, PostprocessOptions(iou=0.5))
+    np.testing.assert_allclose(merged.boxes, [[10, 10, 30, 30], [170, 10, 190, 30]])
@@ -0,0 +1,132 @@
+import io
+import json
+import tarfile
+import zipfile
+
+import cv2
+import numpy as np
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from starlette.datastructures import UploadFile
+
+import server
+from cache import ResultCache
+from uploads import BodySizeLimitMiddleware, OversizedImage, iter_upload_images, sniff_image_format
+
+
+def _jpeg(seed: int, size: int = 64) -> bytes:
+    image = np.random.default_rng(seed).integers(0, 255, (size, size, 3), dtype=np.uint8)
+    return cv2.imencode(".jpg", image)[1].tobytes()
+
+
+def _zip(members) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members:
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def _tar_gz(members) -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        for name, data in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+def _upload(data: bytes, filename: str) -> UploadFile:
+    return UploadFile(io.BytesIO(data), filename=filename)
+
+
+def test_archive_members_over_the_limit_are_not_read():
+    small, bomb = _jpeg(1), b"\0" * 1_000_000
+    for archive in (_zip([("a.jpg", small), ("bomb.png", bomb)]), _tar_gz([("a.jpg", small), ("bomb.png", bomb)])):
+        items = list(iter_upload_images([_upload(archive, "images")], max_image_bytes=len(small)))
+        assert [name for name, _ in items] == ["a.jpg", "bomb.png"]
+        assert items[0][1] == small
+        assert isinstance(items[1][1], OversizedImage) and items[1][1].limit == len(small)
+
+
+def test_archive_members_that_are_not_images_are_skipped():
+    archive = _zip([("a.jpg", _jpeg(2)), ("notes.txt", b"hello"), ("dir/b.png", _jpeg(3))])
+    assert [name for name, _ in iter_upload_images([_upload(archive, "images.zip")])] == ["a.jpg", "dir/b.png"]
+
+
+def test_plain_image_part_over_the_limit_is_oversized():
+    (name, data), = iter_upload_images([_upload(_jpeg(4), "big.jpg")], max_image_bytes=100)
+    assert name == "big.jpg" and isinstance(data, OversizedImage)
+
+
+def test_batch_reports_oversized_archive_members_per_line(client, monkeypatch):
+    small = _jpeg(5)
+    monkeypatch.setattr(server, "MAX_UPLOAD_BYTES", len(small) * 2)
+    archive = _zip([("a.jpg", small), ("bomb.png", b"\0" * (len(small) * 4))])
+
+    response = client.post("/api/detect/batch", files=[("images", ("images.zip", archive, "application/zip"))])
+
+    assert response.status_code == 200
+    lines = sorted((json.loads(line) for line in response.text.splitlines()), key=lambda line: line["index"])
+    assert [line["filename"] for line in lines] == ["a.jpg", "bomb.png"]
+    assert lines[0]["success"] is True
+    assert lines[1]["success"] is False and lines[1]["status_code"] == 413
+
+
+def test_batch_rejects_too_many_parts(client, monkeypatch):
+    monkeypatch.setattr(server, "BATCH_MAX_FILES", 2)
+    files = [("images", (f"{i}.jpg", _jpeg(i), "image/jpeg")) for i in range(3)]
+    assert client.post("/api/detect/batch", files=files).status_code == 400
+
+
+def _limited_app() -> TestClient:
+    app = FastAPI()
+    app.add_middleware(BodySizeLimitMiddleware, max_body_bytes=100, path_limits={"/bulk": 1000})
+
+    @app.post("/{path}")
+    async def echo(request: Request):
+        return {"received": len(await request.body())}
+
+    return TestClient(app)
+
+
+def test_body_limit_refuses_declared_length_up_front():
+    client = _limited_app()
+    assert client.post("/one", content=b"x" * 100).json() == {"received": 100}
+    assert client.post("/one", content=b"x" * 101).status_code == 413
+    # The longest matching prefix sets the limit
+    assert client.post("/bulk", content=b"x" * 500).json() == {"received": 500}
+
+
+def test_body_limit_cuts_off_chunked_bodies():
+    client = _limited_app()
+    chunks = lambda count: iter([b"x" * 40] * count)
+    assert client.post("/one", content=chunks(2)).json() == {"received": 80}
+    assert client.post("/one", content=chunks(3)).status_code == 413
+
+
+@pytest.mark.parametrize("head, image_format", [
+    (b"\xff\xd8\xff\xe0", "jpeg"), (b"\x89PNG\r\n\x1a\n", "png"), (b"GIF89a", "gif"), (b"BM", "bmp"),
+    (b"RIFF\0\0\0\0WEBPVP8 ", "webp"), (b"II*\x00", "tiff"), (b"%PDF-1.7", None), (b"RIFF\0\0\0\0WAVE", None),
+])
+def test_sniff_image_format(head, image_format):
+    assert sniff_image_format(head) == image_format
+
+
+def test_upload_is_sniffed_not_trusted(client):
+    response = client.post("/api/detect", files={"image": ("a.jpg", b"%PDF-1.7 not an image", "image/jpeg")})
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("path", ["/api/detect", "/api/detect/annotated", "/api/detect?tiled=true"])
+@pytest.mark.parametrize("cached", [True, False])
+def test_corrupt_image_that_passes_the_sniff_is_a_400(client, monkeypatch, path, cached):
+    if not cached:
+        monkeypatch.setattr(server, "result_cache", ResultCache(max_entries=0))
+    truncated_jpeg = _jpeg(6)[:200]
+    # The last one is past the in-memory spool threshold, so it is memory-mapped
+    for data in (b"GIF89a" + b"\0" * 100, truncated_jpeg, b"BM" + b"\0" * 100, b"GIF89a" + b"\0" * 2_000_000):
+        response = client.post(path, files={"image": ("image", data, "application/octet-stream")})
+        assert response.status_code == 400, response.text
@@ -0,0 +1,28 @@
+import asyncio
+
+import numpy as np
+
+from batching import BatchScheduler
+from detections import DetectionSet
+from detector import MockDetector
+from worker_pool import WorkerPool, _worker_ready
+
+
+def test_detect_runs_under_the_process_pool():
+    async def main():
+        pool = WorkerPool(max_workers=2, max_queue=8, kind="process")
+        scheduler = BatchScheduler(MockDetector(), pool, max_batch_size=4)
+        try:
+            await pool.start()
+            # Both workers are up before any real work arrives
+            pids = await asyncio.gather(*(pool.run(_worker_ready, 0.2) for _ in range(2)))
+            assert len(set(pids)) == 2
+            images = [np.zeros((64, 64, 3), np.uint8) for _ in range(6)]
+            return await asyncio.gather(*(scheduler.detect(image) for image in images))
+        finally:
+            await scheduler.stop()
+            pool.shutdown()
+
+    results = asyncio.run(main())
+    assert len(results) == 6
+    assert all(isinstance(detections, DetectionSet) and len(detections) for detections in results)